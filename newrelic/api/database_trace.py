@@ -19,7 +19,7 @@ from newrelic.api.time_trace import TimeTrace, current_trace
 from newrelic.common.async_wrapper import async_wrapper as get_async_wrapper
 from newrelic.common.object_wrapper import FunctionWrapper, wrap_object
 from newrelic.core.database_node import DatabaseNode
-from newrelic.core.stack_trace import current_stack
+from newrelic.core.stack_trace import current_stack_trace
 
 _logger = logging.getLogger(__name__)
 
@@ -169,7 +169,7 @@ class DatabaseTrace(TimeTrace):
         if tt.enabled and settings.collect_traces and tt.record_sql != "off":
             if self.duration >= tt.stack_trace_threshold:
                 if transaction._stack_trace_count < agent_limits.slow_sql_stack_trace:
-                    self.stack_trace = [transaction._intern_string(x) for x in current_stack(skip=2)]
+                    self.stack_trace = current_stack_trace(skip=2)
                     transaction._stack_trace_count += 1
 
             if self.is_async_mode and tt.explain_enabled:
@@ -86,6 +86,80 @@ class MessageTransaction(BackgroundTask):
         super(MessageTransaction, self)._update_agent_attributes()
 
 
+class MessageBatchTransaction(MessageTransaction):
+    """A message transaction covering a batch of messages received
+    together, rather than a single message. The number and size of the
+    messages received are counted for each destination as they are added,
+    and recorded as metrics when the transaction ends.
+
+    The transaction is named for the destination it is created with. Where
+    a batch holds messages from more than one destination, such as the
+    records returned by a Kafka consumer's poll() or consume() for several
+    topics, the Kafka hooks create it for the topic of the first record,
+    so the transaction is named for that topic only. The message metrics
+    are still recorded for every destination in the batch.
+
+    """
+
+    def __init__(self, library, destination_type, destination_name, application, byte_count_attribute=None, **kwargs):
+        super(MessageBatchTransaction, self).__init__(
+            library, destination_type, destination_name, application, **kwargs
+        )
+
+        self.library = library
+        self.destination_type = destination_type
+        self.byte_count_attribute = byte_count_attribute
+
+        self.message_count = 0
+        self.byte_count = 0
+
+        # The counts for each destination are held as the count, total,
+        # min, max and sum of squares of the message sizes.
+
+        self._destination_counts = {}
+
+    def add_message(self, destination_name, byte_count):
+        self.message_count += 1
+        self.byte_count += byte_count
+
+        counts = self._destination_counts.get(destination_name)
+        if counts is None:
+            self._destination_counts[destination_name] = [1, byte_count, byte_count, byte_count, byte_count**2]
+            return
+
+        counts[0] += 1
+        counts[1] += byte_count
+        if byte_count < counts[2]:
+            counts[2] = byte_count
+        if byte_count > counts[3]:
+            counts[3] = byte_count
+        counts[4] += byte_count**2
+
+    def __exit__(self, exc, value, tb):
+        # The metrics are the same as would be recorded for receiving each
+        # message on its own.
+
+        group = "Message/%s/%s" % (self.library, self.destination_type)
+
+        for destination_name, (count, total, _min, _max, sum_of_squares) in self._destination_counts.items():
+            name = "%s/Named/%s/Received" % (group, destination_name)
+            self.record_custom_metric(
+                "%s/Bytes" % name,
+                {"count": count, "total": total, "min": _min, "max": _max, "sum_of_squares": sum_of_squares},
+            )
+            self.record_custom_metric(
+                "%s/Messages" % name,
+                {"count": count, "total": count, "min": 1, "max": 1, "sum_of_squares": count},
+            )
+
+        self._destination_counts = {}
+
+        if self.byte_count_attribute:
+            self._add_agent_attribute(self.byte_count_attribute, self.byte_count)
+
+        return super(MessageBatchTransaction, self).__exit__(exc, value, tb)
+
+
 def MessageTransactionWrapper(
     wrapped,
     library,
@@ -1738,6 +1738,60 @@ class Transaction(object):
         if event:
             self._ml_events.add(event, priority=self.priority)
 
+    def record_ml_events(self, event_type, num_events, event_params, sample_limit=0):
+        """Record a batch of machine learning events of the same type.
+        The params for each event are only created, by calling
+        event_params() with the index of the event in the batch, if the
+        event would be kept in the reservoir for the transaction. Where a
+        sample limit is given, no more than that many events, chosen at
+        random, are kept from the batch.
+
+        """
+
+        settings = self._settings
+
+        if not settings:
+            return
+
+        if not settings.ml_insights_events.enabled:
+            return
+
+        ml_events = self._ml_events
+
+        if ml_events.capacity <= 0:
+            ml_events.num_seen += num_events
+            return
+
+        if 0 < sample_limit < num_events:
+            indexes = sorted(random.sample(range(num_events), sample_limit))  # nosec
+        else:
+            indexes = range(num_events)
+
+        # Events not chosen for the sample are still counted as seen.
+
+        ml_events.num_seen += num_events - len(indexes)
+
+        for index in indexes:
+            priority = self.priority
+            if priority is None:
+                priority = random.random()  # nosec
+
+            # Decide whether the event would be kept before creating it,
+            # as most events in a large batch will not be.
+
+            if not ml_events.should_sample(priority):
+                ml_events.num_seen += 1
+                continue
+
+            # Events which could not be created are counted as seen, the
+            # same as those which were not kept.
+
+            event = create_custom_event(event_type, event_params(index), settings=settings, is_ml_event=True)
+            if event:
+                ml_events.add(event, priority=priority)
+            else:
+                ml_events.num_seen += 1
+
     def _intern_string(self, value):
         return self._string_cache.setdefault(value, value)
 
@@ -16,6 +16,7 @@ from __future__ import print_function
 
 import os
 import sys
+import threading
 import time
 import zlib
 from pprint import pprint
@@ -26,6 +27,7 @@ from newrelic.common import certs
 from newrelic.common.encoding_utils import (
     json_decode,
     json_encode,
+    json_encode_chunks,
     obfuscate_license_key,
 )
 from newrelic.common.object_names import callable_name
@@ -100,6 +102,7 @@ class BaseClient(object):
         max_payload_size_in_bytes=1000000,
         audit_log_fp=None,
         default_content_encoding_header="Identity",
+        connection_pool_size=1,
     ):
         self._audit_log_fp = audit_log_fp
 
@@ -116,12 +119,23 @@ class BaseClient(object):
         pass
 
     @staticmethod
-    def _supportability_request(params, payload, body, compression_time):
+    def _supportability_request(params, payload, body, compression_time, payload_size=None):
         pass
 
     @classmethod
-    def log_request(cls, fp, method, url, params, payload, headers, body=None, compression_time=None):
-        cls._supportability_request(params, payload, body, compression_time)
+    def log_request(
+        cls,
+        fp,
+        method,
+        url,
+        params,
+        payload,
+        headers,
+        body=None,
+        compression_time=None,
+        payload_size=None,
+    ):
+        cls._supportability_request(params, payload, body, compression_time, payload_size)
 
         if not fp:
             return
@@ -228,6 +242,22 @@ class BaseClient(object):
     ):
         return 202, b""
 
+    def send_json_request(
+        self,
+        method="POST",
+        path="/agent_listener/invoke_raw_method",
+        params=None,
+        headers=None,
+        payload=None,
+    ):
+        return self.send_request(
+            method=method,
+            path=path,
+            params=params,
+            headers=headers,
+            payload=json_encode(payload).encode("utf-8"),
+        )
+
 
 class HttpClient(BaseClient):
     CONNECTION_CLS = urllib3.HTTPSConnectionPool
@@ -252,6 +282,7 @@ class HttpClient(BaseClient):
         max_payload_size_in_bytes=1000000,
         audit_log_fp=None,
         default_content_encoding_header="Identity",
+        connection_pool_size=1,
     ):
         self._host = host
         port = self._port = port
@@ -267,6 +298,7 @@ class HttpClient(BaseClient):
         self._headers = dict(self.BASE_HEADERS)
         self._connection_kwargs = connection_kwargs = {
             "timeout": timeout,
+            "maxsize": connection_pool_size,
         }
         self._urlopen_kwargs = urlopen_kwargs = {}
 
@@ -314,6 +346,7 @@ class HttpClient(BaseClient):
         self._proxy = proxy
 
         self._connection_attr = None
+        self._connection_lock = threading.Lock()
 
     @staticmethod
     def _parse_proxy(scheme, host, port, username, password):
@@ -356,11 +389,19 @@ class HttpClient(BaseClient):
         if self._connection_attr:
             return self._connection_attr
 
-        retries = urllib3.Retry(total=False, connect=None, read=None, redirect=0, status=None)
-        self._connection_attr = self.CONNECTION_CLS(
-            self._host, self._port, strict=True, retries=retries, **self._connection_kwargs
-        )
-        return self._connection_attr
+        # Requests may be made from more than one thread at a time when
+        # harvest data is being sent concurrently, so only one thread
+        # should create the connection pool.
+
+        with self._connection_lock:
+            if self._connection_attr:
+                return self._connection_attr
+
+            retries = urllib3.Retry(total=False, connect=None, read=None, redirect=0, status=None)
+            self._connection_attr = self.CONNECTION_CLS(
+                self._host, self._port, strict=True, retries=retries, **self._connection_kwargs
+            )
+            return self._connection_attr
 
     def close_connection(self):
         if self._connection_attr:
@@ -377,11 +418,14 @@ class HttpClient(BaseClient):
         headers,
         body=None,
         compression_time=None,
+        payload_size=None,
     ):
         if not self._prefix:
             url = self.CONNECTION_CLS.scheme + "://" + self._host + url
 
-        return super(HttpClient, self).log_request(fp, method, url, params, payload, headers, body, compression_time)
+        return super(HttpClient, self).log_request(
+            fp, method, url, params, payload, headers, body, compression_time, payload_size
+        )
 
     @staticmethod
     def _compress(data, method="gzip", level=None):
@@ -397,6 +441,57 @@ class HttpClient(BaseClient):
 
         return data, compression_time
 
+    @staticmethod
+    def _compress_chunks(chunks, threshold, method="gzip", level=None):
+        # Encoded chunks are held back until there is more than the
+        # threshold, as below that the payload is sent uncompressed.
+        # After that they are passed to the compressor in batches, so
+        # only the compressed data is kept. Only the time spent in the
+        # compressor is counted as the compression time.
+
+        buffered = []
+        buffered_size = 0
+        payload_size = 0
+
+        compressor = None
+        compressed = []
+        compression_time = 0.0
+
+        batch_size = threshold
+
+        for chunk in chunks:
+            chunk = chunk.encode("utf-8")
+            buffered.append(chunk)
+            buffered_size += len(chunk)
+
+            if buffered_size > batch_size:
+                if compressor is None:
+                    level = level or zlib.Z_DEFAULT_COMPRESSION
+                    wbits = 31 if method == "gzip" else 15
+                    compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+                    batch_size = 64 * 1024
+
+                compression_start = time.time()
+                compressed.append(compressor.compress(b"".join(buffered)))
+                compression_time += max(time.time(), compression_start) - compression_start
+
+                payload_size += buffered_size
+                buffered = []
+                buffered_size = 0
+
+        payload_size += buffered_size
+
+        if compressor is None:
+            payload = b"".join(buffered)
+            return payload, payload, payload_size, None
+
+        compression_start = time.time()
+        compressed.append(compressor.compress(b"".join(buffered)))
+        compressed.append(compressor.flush())
+        compression_time += max(time.time(), compression_start) - compression_start
+
+        return None, b"".join(compressed), payload_size, compression_time
+
     def send_request(
         self,
         method="POST",
@@ -404,6 +499,52 @@ class HttpClient(BaseClient):
         params=None,
         headers=None,
         payload=None,
+    ):
+        body = payload
+        compression_time = None
+        if payload is not None and len(payload) > self._compression_threshold:
+            body, compression_time = self._compress(
+                payload,
+                method=self._compression_method,
+                level=self._compression_level,
+            )
+
+        return self._send_body(method, path, params, headers, payload, body, compression_time)
+
+    def send_json_request(
+        self,
+        method="POST",
+        path="/agent_listener/invoke_raw_method",
+        params=None,
+        headers=None,
+        payload=None,
+    ):
+        # The audit log records the uncompressed payload, so only when it
+        # is disabled is the encoded JSON streamed into the compressor
+        # rather than first being built as a complete string.
+
+        if self._audit_log_fp:
+            return super(HttpClient, self).send_json_request(method, path, params, headers, payload)
+
+        payload, body, payload_size, compression_time = self._compress_chunks(
+            json_encode_chunks(payload),
+            self._compression_threshold,
+            method=self._compression_method,
+            level=self._compression_level,
+        )
+
+        return self._send_body(method, path, params, headers, payload, body, compression_time, payload_size)
+
+    def _send_body(
+        self,
+        method,
+        path,
+        params,
+        headers,
+        payload,
+        body,
+        compression_time,
+        payload_size=None,
     ):
         if self._proxy:
             proxy_scheme = self._proxy.scheme or "http"
@@ -415,15 +556,8 @@ class HttpClient(BaseClient):
         if headers:
             merged_headers.update(headers)
         path = self._prefix + path
-        body = payload
-        compression_time = None
-        if payload is not None:
-            if len(payload) > self._compression_threshold:
-                body, compression_time = self._compress(
-                    payload,
-                    method=self._compression_method,
-                    level=self._compression_level,
-                )
+        if body is not None:
+            if compression_time is not None:
                 merged_headers["Content-Encoding"] = self._compression_method
             elif self._default_content_encoding_header:
                 merged_headers["Content-Encoding"] = self._default_content_encoding_header
@@ -437,6 +571,7 @@ class HttpClient(BaseClient):
             merged_headers,
             body,
             compression_time,
+            payload_size,
         )
 
         if body and len(body) > self._max_payload_size_in_bytes:
@@ -493,6 +628,7 @@ class InsecureHttpClient(HttpClient):
         max_payload_size_in_bytes=1000000,
         audit_log_fp=None,
         default_content_encoding_header="Identity",
+        connection_pool_size=1,
     ):
         proxy = self._parse_proxy(proxy_scheme, proxy_host, None, None, None)
         if proxy and proxy.scheme == "https":
@@ -520,21 +656,26 @@ class InsecureHttpClient(HttpClient):
             max_payload_size_in_bytes,
             audit_log_fp,
             default_content_encoding_header,
+            connection_pool_size,
         )
 
 
 class SupportabilityMixin(object):
     @staticmethod
-    def _supportability_request(params, payload, body, compression_time):
+    def _supportability_request(params, payload, body, compression_time, payload_size=None):
         # *********
         # Used only for supportability metrics. Do not use to drive business
         # logic!
-        # payload: uncompressed
+        # payload: uncompressed, or None when compressed as it was encoded
         # body: compressed
+        # payload_size: size of the uncompressed payload, if known
         agent_method = params and params.get("method")
         # *********
 
-        if agent_method and payload:
+        if payload_size is None:
+            payload_size = payload and len(payload)
+
+        if agent_method and payload_size:
             # Compression was applied
             if compression_time is not None:
                 internal_metric(
@@ -548,10 +689,10 @@ class SupportabilityMixin(object):
                 )
             internal_metric(
                 "Supportability/Python/Collector/%s/Output/Bytes" % agent_method,
-                len(payload),
+                payload_size,
             )
             # Top level metric to aggregate overall bytes being sent
-            internal_metric("Supportability/Python/Collector/Output/Bytes", len(payload))
+            internal_metric("Supportability/Python/Collector/Output/Bytes", payload_size)
 
     @staticmethod
     def _supportability_response(status, exc, connection="direct"):
@@ -49,7 +49,7 @@ BASE64_DECODE_STR = getattr(base64, "decodestring", None)
 # defaults.
 
 
-def json_encode(obj, **kwargs):
+def _json_encode_kwargs(kwargs):
     _kwargs = {}
 
     # This wrapper function needs to deal with a few issues.
@@ -103,7 +103,40 @@ def json_encode(obj, **kwargs):
 
     _kwargs.update(kwargs)
 
-    return json.dumps(obj, **_kwargs)
+    return _kwargs
+
+
+def json_encode(obj, **kwargs):
+    return json.dumps(obj, **_json_encode_kwargs(kwargs))
+
+
+def json_encode_chunks(obj, depth=2, **kwargs):
+    """Generator yielding the JSON encoding of the object in pieces. Lists,
+    tuples and generators down to the given depth are encoded one element
+    at a time, so that a large payload such as a list of events is never
+    held as a single string. Joining the pieces gives the same result as
+    json_encode().
+
+    """
+
+    _kwargs = _json_encode_kwargs(kwargs)
+    separator = _kwargs["separators"][0]
+    encode = json.JSONEncoder(**_kwargs).encode
+
+    return _json_encode_chunks(obj, depth, encode, separator)
+
+
+def _json_encode_chunks(obj, depth, encode, separator):
+    if depth > 0 and isinstance(obj, (list, tuple, types.GeneratorType)):
+        yield "["
+        for index, item in enumerate(obj):
+            if index:
+                yield separator
+            for chunk in _json_encode_chunks(item, depth - 1, encode, separator):
+                yield chunk
+        yield "]"
+    else:
+        yield encode(obj)
 
 
 def json_decode(s, **kwargs):
@@ -366,6 +399,35 @@ def ensure_str(s):
     return s
 
 
+def payload_size(value):
+    """Returns the size in bytes of a message payload. Payloads which are
+    bytes, or support the buffer protocol, are measured without copying
+    them. Text is measured as UTF-8. Any other payload, such as one which
+    has been deserialized, is measured by its string representation.
+
+    """
+
+    if value is None:
+        return 0
+
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+
+    if isinstance(value, six.text_type):
+        return len(value.encode("utf-8"))
+
+    try:
+        view = memoryview(value)
+    except TypeError:
+        return len(str(value).encode("utf-8"))
+
+    try:
+        return view.nbytes
+    except AttributeError:
+        # Python 2 memory views don't give the number of bytes.
+        return len(view.tobytes())
+
+
 def serverless_payload_decode(text):
     """This method takes in a string or UTF-8 input. The input will be
     base64 decoded, gzip decompressed, and json decoded. Returns a
@@ -345,6 +345,7 @@ def _process_configuration(section):
     _process_setting(section, "capture_environ", "getboolean", None)
     _process_setting(section, "include_environ", "get", _map_split_strings)
     _process_setting(section, "max_stack_trace_lines", "getint", None)
+    _process_setting(section, "metric_stats_table", "get", None)
     _process_setting(section, "startup_timeout", "getfloat", None)
     _process_setting(section, "shutdown_timeout", "getfloat", None)
     _process_setting(section, "compressed_content_encoding", "get", _map_compressed_content_encoding)
@@ -354,8 +355,14 @@ def _process_configuration(section):
     _process_setting(section, "transaction_name.naming_scheme", "get", None)
     _process_setting(section, "gc_runtime_metrics.enabled", "getboolean", None)
     _process_setting(section, "gc_runtime_metrics.top_object_count_limit", "getint", None)
+    _process_setting(section, "gc_runtime_metrics.top_object_sample_limit", "getint", None)
+    _process_setting(section, "harvest_spool.enabled", "getboolean", None)
+    _process_setting(section, "harvest_spool.directory", "get", None)
+    _process_setting(section, "harvest_spool.max_size", "getint", None)
+    _process_setting(section, "harvest_spool.max_age", "getfloat", None)
     _process_setting(section, "memory_runtime_pid_metrics.enabled", "getboolean", None)
     _process_setting(section, "thread_profiler.enabled", "getboolean", None)
+    _process_setting(section, "thread_profiler.cpu_budget", "getfloat", None)
     _process_setting(section, "transaction_tracer.enabled", "getboolean", None)
     _process_setting(
         section,
@@ -367,6 +374,7 @@ def _process_configuration(section):
     _process_setting(section, "transaction_tracer.stack_trace_threshold", "getfloat", None)
     _process_setting(section, "transaction_tracer.explain_enabled", "getboolean", None)
     _process_setting(section, "transaction_tracer.explain_threshold", "getfloat", None)
+    _process_setting(section, "transaction_tracer.explain_plan_cache_ttl", "getfloat", None)
     _process_setting(section, "transaction_tracer.function_trace", "get", _map_split_strings)
     _process_setting(section, "transaction_tracer.generator_trace", "get", _map_split_strings)
     _process_setting(section, "transaction_tracer.top_n", "getint", None)
@@ -425,6 +433,9 @@ def _process_configuration(section):
         _map_inc_excl_attributes,
     )
     _process_setting(section, "slow_sql.enabled", "getboolean", None)
+    _process_setting(section, "transaction_recorder.enabled", "getboolean", None)
+    _process_setting(section, "transaction_recorder.queue_size", "getint", None)
+    _process_setting(section, "transaction_recorder.overflow_policy", "get", None)
     _process_setting(section, "synthetics.enabled", "getboolean", None)
     _process_setting(section, "transaction_events.enabled", "getboolean", None)
     _process_setting(section, "transaction_events.max_samples_stored", "getint", None)
@@ -467,14 +478,20 @@ def _process_configuration(section):
     )
     _process_setting(section, "local_daemon.socket_path", "get", None)
     _process_setting(section, "local_daemon.synchronous_startup", "getboolean", None)
+    _process_setting(section, "agent_limits.data_collector_send_concurrency", "getint", None)
     _process_setting(section, "agent_limits.transaction_traces_nodes", "getint", None)
     _process_setting(section, "agent_limits.sql_query_length_maximum", "getint", None)
+    _process_setting(section, "agent_limits.sql_parse_cache_size", "getint", None)
+    _process_setting(section, "agent_limits.sql_explain_plan_cache_size", "getint", None)
+    _process_setting(section, "agent_limits.attribute_filter_cache_size", "getint", None)
     _process_setting(section, "agent_limits.slow_sql_stack_trace", "getint", None)
     _process_setting(section, "agent_limits.max_sql_connections", "getint", None)
     _process_setting(section, "agent_limits.sql_explain_plans", "getint", None)
     _process_setting(section, "agent_limits.sql_explain_plans_per_harvest", "getint", None)
     _process_setting(section, "agent_limits.slow_sql_data", "getint", None)
     _process_setting(section, "agent_limits.merge_stats_maximum", "getint", None)
+    _process_setting(section, "agent_limits.stats_engine_shards", "getint", None)
+    _process_setting(section, "agent_limits.metric_name_table_size", "getint", None)
     _process_setting(section, "agent_limits.errors_per_transaction", "getint", None)
     _process_setting(section, "agent_limits.errors_per_harvest", "getint", None)
     _process_setting(section, "agent_limits.slow_transaction_dry_harvests", "getint", None)
@@ -507,6 +524,9 @@ def _process_configuration(section):
     _process_setting(section, "debug.otlp_content_encoding", "get", None)
     _process_setting(section, "cross_application_tracer.enabled", "getboolean", None)
     _process_setting(section, "message_tracer.segment_parameters_enabled", "getboolean", None)
+    _process_setting(section, "message_tracer.consumer_batch.enabled", "getboolean", None)
+    _process_setting(section, "message_tracer.consumer_batch.max_messages", "getint", None)
+    _process_setting(section, "message_tracer.consumer_batch.distributed_tracing", "getboolean", None)
     _process_setting(section, "process_host.display_name", "get", None)
     _process_setting(section, "utilization.detect_aws", "getboolean", None)
     _process_setting(section, "utilization.detect_azure", "getboolean", None)
@@ -561,6 +581,7 @@ def _process_configuration(section):
 
     _process_setting(section, "machine_learning.enabled", "getboolean", None)
     _process_setting(section, "machine_learning.inference_events_value.enabled", "getboolean", None)
+    _process_setting(section, "machine_learning.inference_events.sample_limit", "getint", None)
     _process_setting(section, "ai_monitoring.enabled", "getboolean", None)
     _process_setting(section, "ai_monitoring.record_content.enabled", "getboolean", None)
     _process_setting(section, "ai_monitoring.streaming.enabled", "getboolean", None)
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import itertools
 import random
 import time
 import threading
@@ -33,6 +34,38 @@ class AdaptiveSampler(object):
         self.computed_count = 0
         self.sampled_count = 0
 
+    # The time of the next reset is precomputed whenever the time of the
+    # last reset changes, so that deciding whether a reset is required is
+    # a single comparison against the current time.
+
+    @property
+    def last_reset(self):
+        return self._last_reset
+
+    @last_reset.setter
+    def last_reset(self, value):
+        self._last_reset = value
+        self._next_reset = value + self.period
+
+    # Transactions are counted using an iterator so the count can be
+    # incremented without holding the lock. Advancing the iterator is a
+    # single call into C code and so is atomic, with each thread being
+    # given a distinct value being the number of transactions so far,
+    # including its own. As reading the count back also advances the
+    # iterator, it is read under the lock and the iterator replaced with
+    # one carrying on from the same count.
+
+    @property
+    def computed_count(self):
+        with self._lock:
+            count = next(self._computed_counter) - 1
+            self._computed_counter = itertools.count(count + 1)
+        return count
+
+    @computed_count.setter
+    def computed_count(self, value):
+        self._computed_counter = itertools.count(value + 1)
+
     def reset_if_required(self):
         time_since_last_reset = time.time() - self.last_reset
         cycles = time_since_last_reset // self.period
@@ -44,38 +77,59 @@ class AdaptiveSampler(object):
                 self._reset()
 
     def compute_sampled(self):
+        # The lock is only acquired when a reset is due or when the random
+        # draw has decided a transaction should be sampled. Once the number
+        # sampled reaches the maximum, or when the draw fails, no lock is
+        # needed. The sampled count is checked again after acquiring the
+        # lock as another thread may have taken the last sample.
+
+        if time.time() >= self._next_reset:
+            with self._lock:
+                self.reset_if_required()
+
+        computed_count = max(next(self._computed_counter), 1)
+
+        if self.sampled_count >= self.max_sampled:
+            return False
+
+        elif self.sampled_count < self.sampling_target:
+            sampled = random.randrange(
+                    self.computed_count_last) < self.sampling_target
+        else:
+            sampled = random.randrange(
+                    computed_count) < self.adaptive_target
+
+        if not sampled:
+            return False
+
         with self._lock:
-            self.reset_if_required()
             if self.sampled_count >= self.max_sampled:
                 return False
 
-            elif self.sampled_count < self.sampling_target:
-                sampled = random.randrange(
-                        self.computed_count_last) < self.sampling_target
-                if sampled:
-                    self.sampled_count += 1
-            else:
-                sampled = random.randrange(
-                        self.computed_count) < self.adaptive_target
-                if sampled:
-                    self.sampled_count += 1
+            self.sampled_count += 1
 
-                    ratio = float(self.sampling_target) / self.sampled_count
-                    self.adaptive_target = (self.sampling_target ** ratio -
-                                            self.sampling_target ** 0.5)
+            if self.sampled_count > self.sampling_target:
+                ratio = float(self.sampling_target) / self.sampled_count
+                self.adaptive_target = (self.sampling_target ** ratio -
+                                        self.sampling_target ** 0.5)
 
-            self.computed_count += 1
-        return sampled
+        return True
 
     def _reset(self):
+        # Called with the lock held. The sampled count is cleared before
+        # the transaction count is restarted, and the time of the reset
+        # recorded last, as decisions made without the lock may see the
+        # new count as soon as it has been swapped in.
+        computed_count = next(self._computed_counter) - 1
+
         # For subsequent harvests, collect a max of twice the
         # self.sampling_target value.
-        self.last_reset = time.time()
         self.max_sampled = 2 * self.sampling_target
         self.adaptive_target = (self.sampling_target -
                                 self.sampling_target ** 0.5)
 
-        self.computed_count_last = max(self.computed_count,
+        self.computed_count_last = max(computed_count,
                                        self.sampling_target)
-        self.computed_count = 0
         self.sampled_count = 0
+        self.computed_count = 0
+        self.last_reset = time.time()
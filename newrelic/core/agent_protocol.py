@@ -44,6 +44,7 @@ from newrelic.network.exceptions import (
     ForceAgentDisconnect,
     ForceAgentRestart,
     NetworkInterfaceException,
+    PayloadTooLarge,
     RetryDataForRequest,
 )
 
@@ -64,7 +65,7 @@ class AgentProtocol(object):
         409: ForceAgentRestart,
         410: ForceAgentDisconnect,
         411: DiscardDataForRequest,
-        413: DiscardDataForRequest,
+        413: PayloadTooLarge,
         414: DiscardDataForRequest,
         415: DiscardDataForRequest,
         417: DiscardDataForRequest,
@@ -179,6 +180,7 @@ class AgentProtocol(object):
             compression_method=settings.compressed_content_encoding,
             max_payload_size_in_bytes=settings.max_payload_size_in_bytes,
             audit_log_fp=audit_log_fp,
+            connection_pool_size=settings.agent_limits.data_collector_send_concurrency,
         )
 
         self._params = {
@@ -228,7 +230,7 @@ class AgentProtocol(object):
         params, headers, payload = self._to_http(method, payload)
 
         try:
-            response = self.client.send_request(path=path, params=params, headers=headers, payload=payload)
+            response = self._send_request(path=path, params=params, headers=headers, payload=payload)
         except NetworkInterfaceException:
             # All HTTP errors are currently retried
             raise RetryDataForRequest
@@ -270,7 +272,12 @@ class AgentProtocol(object):
         params["method"] = method
         if self._run_token:
             params["run_id"] = self._run_token
-        return params, self._headers, json_encode(payload).encode("utf-8")
+        return params, self._headers, payload
+
+    def _send_request(self, path, params, headers, payload):
+        # The payload is encoded as JSON by the client, which for large
+        # payloads compresses the JSON as it is being encoded.
+        return self.client.send_json_request(path=path, params=params, headers=headers, payload=payload)
 
     @staticmethod
     def _connect_payload(app_name, linked_applications, environment, settings):
@@ -600,5 +607,8 @@ class OtlpProtocol(AgentProtocol):
     def _to_http(self, method, payload=()):
         return {}, self._headers, otlp_encode(payload)
 
+    def _send_request(self, path, params, headers, payload):
+        return self.client.send_request(path=path, params=params, headers=headers, payload=payload)
+
     def decode_response(self, response):
         return response.decode("utf-8")
@@ -26,13 +26,18 @@ import time
 import traceback
 import warnings
 from functools import partial
+from itertools import count
 
 from newrelic.common.object_names import callable_name
 from newrelic.core.adaptive_sampler import AdaptiveSampler
 from newrelic.core.config import global_settings
 from newrelic.core.custom_event import create_custom_event
-from newrelic.core.data_collector import create_session
-from newrelic.core.database_utils import SQLConnections
+from newrelic.core.data_collector import HarvestSender, create_session
+from newrelic.core.database_utils import (
+    SQLConnections,
+    explain_plan_cache,
+    sql_parse_cache,
+)
 from newrelic.core.environment import environment_settings
 from newrelic.core.internal_metrics import (
     InternalTrace,
@@ -40,9 +45,12 @@ from newrelic.core.internal_metrics import (
     internal_count_metric,
     internal_metric,
 )
+from newrelic.core.log_line_counts import log_line_counts
+from newrelic.core.node_mixin import SpanEventReference
 from newrelic.core.profile_sessions import profile_session_manager
 from newrelic.core.rules_engine import RulesEngine, SegmentCollapseEngine
-from newrelic.core.stats_engine import CustomMetrics, StatsEngine
+from newrelic.core.stats_engine import CustomMetrics, StatsEngine, StatsEngineShard
+from newrelic.core.transaction_recorder import TransactionRecorder
 from newrelic.network.exceptions import (
     DiscardDataForRequest,
     ForceAgentDisconnect,
@@ -103,9 +111,19 @@ class Application(object):
         self._stats_lock = threading.RLock()
         self._stats_engine = StatsEngine()
 
+        # Optional stripes of the stats engine into which transactions
+        # are merged, each under its own lock. Threads are assigned to a
+        # shard the first time they record a transaction.
+
+        self._stats_shards = []
+        self._stats_shard_index = count()
+        self._stats_shard_local = threading.local()
+
         self._stats_custom_lock = threading.RLock()
         self._stats_custom_engine = StatsEngine()
 
+        self._transaction_recorder = None
+
         self._agent_commands_lock = threading.Lock()
         self._data_samplers_lock = threading.Lock()
         self._data_samplers_started = False
@@ -513,6 +531,29 @@ class Application(object):
         with self._stats_lock:
             self._stats_engine.reset_stats(configuration)
 
+            shards = configuration.agent_limits.stats_engine_shards or 0
+
+            if shards > 1 and not configuration.serverless_mode.enabled:
+                self._stats_shards = [
+                    StatsEngineShard(self._stats_engine.create_workarea()) for _ in range(shards)
+                ]
+            else:
+                self._stats_shards = []
+
+        # When enabled, completed transactions are handed off to a
+        # background thread to be recorded rather than doing the work on
+        # the thread which ran the transaction. This is never used in
+        # serverless mode as there a harvest follows every transaction.
+
+        if configuration.transaction_recorder.enabled and not configuration.serverless_mode.enabled:
+            self._transaction_recorder = TransactionRecorder(
+                self._app_name,
+                self._record_transaction,
+                configuration.transaction_recorder.queue_size,
+                configuration.transaction_recorder.overflow_policy,
+            )
+            self._transaction_recorder.start()
+
         # Record an initial start time for the reporting period and
         # clear record of last transaction processed.
 
@@ -869,6 +910,24 @@ class Application(object):
                 self._global_events_account += 1
                 self._stats_custom_engine.record_custom_metric(name, value)
 
+    def merge_log_line_counts(self):
+        """Merge the counts of log lines recorded outside of transactions
+        into the custom metrics for the application. The counts are kept
+        by each thread, rather than taking the lock for the custom
+        metrics for every line logged, until they are merged here.
+
+        """
+
+        metrics = log_line_counts.harvest(self._app_name)
+
+        if not metrics or not self._active_session:
+            return
+
+        with self._stats_custom_lock:
+            for name, line_count in metrics:
+                self._global_events_account += 1
+                self._stats_custom_engine.record_custom_metric(name, {"count": line_count})
+
     def record_dimensional_metric(self, name, value, tags=None):
         """Record a dimensional metric against the application independent
         of a specific transaction.
@@ -957,8 +1016,24 @@ class Application(object):
                 self._global_events_account += 1
 
     def record_transaction(self, data):
-        """Record a single transaction against this application."""
+        """Record a single transaction against this application. If the
+        transaction recorder is enabled, the transaction is queued and
+        will be recorded from the background recorder thread.
+
+        """
 
+        if not self._active_session:
+            return
+
+        transaction_recorder = self._transaction_recorder
+
+        if transaction_recorder is not None and transaction_recorder.active:
+            transaction_recorder.put(data)
+            return
+
+        self._record_transaction(data)
+
+    def _record_transaction(self, data):
         if not self._active_session:
             return
 
@@ -1013,12 +1088,24 @@ class Application(object):
                     if settings.debug.record_transaction_failure:
                         raise
 
-            with self._stats_lock:
+            # When the stats engine is sharded, merge into the shard for
+            # this thread rather than the main stats engine so threads
+            # only contend on the lock of their own shard.
+
+            shard = self._stats_shard()
+
+            with shard.lock if shard is not None else self._stats_lock:
                 try:
-                    self._transaction_count += 1
-                    self._last_transaction = data.end_time
+                    if shard is not None:
+                        stats_engine = shard.stats_engine
+                        shard.transaction_count += 1
+                        shard.last_transaction = data.end_time
+                    else:
+                        stats_engine = self._stats_engine
+                        self._transaction_count += 1
+                        self._last_transaction = data.end_time
 
-                    self._stats_engine.merge(stats)
+                    stats_engine.merge(stats)
 
                     # We merge the internal statistics here as well even
                     # though have popped out of the context where we are
@@ -1026,7 +1113,7 @@ class Application(object):
                     # anything else after this point. If we do then that
                     # data will not be recorded.
 
-                    self._stats_engine.merge_custom_metrics(internal_metrics.metrics())
+                    stats_engine.merge_custom_metrics(internal_metrics.metrics())
 
                 except Exception:
                     _logger.exception(
@@ -1040,6 +1127,38 @@ class Application(object):
                     if settings.debug.record_transaction_failure:
                         raise
 
+    def _stats_shard(self):
+        """Returns the stats engine shard assigned to the current thread,
+        or None if the stats engine is not sharded.
+
+        """
+
+        shards = self._stats_shards
+
+        if not shards:
+            return None
+
+        index = getattr(self._stats_shard_local, "index", None)
+
+        if index is None:
+            index = self._stats_shard_local.index = next(self._stats_shard_index)
+
+        return shards[index % len(shards)]
+
+    def _merge_stats_shards(self):
+        """Combines the data accumulated in any stats engine shards into
+        the main stats engine. Must be called with the stats lock held.
+
+        """
+
+        for shard in self._stats_shards:
+            stats, transaction_count, last_transaction = shard.swap(self._stats_engine.create_workarea())
+
+            self._transaction_count += transaction_count
+            self._last_transaction = max(self._last_transaction, last_transaction)
+
+            self._stats_engine.merge_shard(stats)
+
     def cmd_start_profiler(self, command_id=0, **kwargs):
         """Triggered by the start_profiler agent command to start a
         thread profiling session.
@@ -1182,9 +1301,19 @@ class Application(object):
                 _logger.debug("Snapshotting for harvest[%s] of %r.", call_metric, self._app_name)
 
                 configuration = self._active_session.configuration
-                transaction_count = self._transaction_count
+
+                # On a forced harvest at shutdown, give the background
+                # transaction recorder a chance to drain its queue so
+                # that the final transactions are included.
+
+                if shutdown and self._transaction_recorder is not None:
+                    self._transaction_recorder.flush(global_settings().shutdown_timeout)
 
                 with self._stats_lock:
+                    self._merge_stats_shards()
+
+                    transaction_count = self._transaction_count
+
                     self._transaction_count = 0
 
                     self._last_transaction = 0.0
@@ -1192,6 +1321,8 @@ class Application(object):
                     stats = self._stats_engine.harvest_snapshot(flexible)
 
                 if not flexible:
+                    self.merge_log_line_counts()
+
                     with self._stats_custom_lock:
                         global_events_account = self._global_events_account
                         self._global_events_account = 0
@@ -1265,6 +1396,52 @@ class Application(object):
                             internal_count_metric("Supportability/Python/Uninstrumented", 1)
                             internal_count_metric("Supportability/Uninstrumented/%s" % uninstrumented, 1)
 
+                    # Report on transactions which were handed off to the
+                    # background transaction recorder.
+
+                    if self._transaction_recorder is not None:
+                        recorder_seen, recorder_dropped = self._transaction_recorder.stats()
+
+                        internal_count_metric("Supportability/Python/TransactionRecorder/Seen", recorder_seen)
+                        internal_count_metric("Supportability/Python/TransactionRecorder/Dropped", recorder_dropped)
+
+                    # Report on the use of the process wide cache of parsed
+                    # SQL statements.
+
+                    sql_cache_hits, sql_cache_misses = sql_parse_cache.stats()
+
+                    if sql_cache_hits or sql_cache_misses:
+                        internal_count_metric("Supportability/Python/DatabaseUtils/SQLParseCache/Hits", sql_cache_hits)
+                        internal_count_metric(
+                            "Supportability/Python/DatabaseUtils/SQLParseCache/Misses", sql_cache_misses
+                        )
+
+                    explain_cache_hits, explain_cache_misses = explain_plan_cache.stats()
+
+                    if explain_cache_hits or explain_cache_misses:
+                        internal_count_metric(
+                            "Supportability/Python/DatabaseUtils/ExplainPlanCache/Hits", explain_cache_hits
+                        )
+                        internal_count_metric(
+                            "Supportability/Python/DatabaseUtils/ExplainPlanCache/Misses", explain_cache_misses
+                        )
+
+                    # Report on the use of the cache of the destinations
+                    # for attribute names.
+
+                    attribute_filter = getattr(configuration, "attribute_filter", None)
+
+                    if attribute_filter is not None:
+                        filter_cache_misses, filter_cache_evictions = attribute_filter.stats()
+
+                        if filter_cache_misses or filter_cache_evictions:
+                            internal_count_metric(
+                                "Supportability/Python/AttributeFilter/Cache/Misses", filter_cache_misses
+                            )
+                            internal_count_metric(
+                                "Supportability/Python/AttributeFilter/Cache/Evictions", filter_cache_evictions
+                            )
+
                 # Create our time stamp as to when this reporting period
                 # ends and start reporting the data.
 
@@ -1286,6 +1463,21 @@ class Application(object):
                         _logger.debug("Stretching harvest duration for forced harvest on shutdown.")
                         period_end = self._period_start + 1.001
 
+                # Payloads for the different types of data are sent one
+                # after the other, or when configured to do so, are sent
+                # concurrently over a pool of connections. The data for
+                # each payload is only reset once it has been sent, so
+                # what wasn't sent can still be rolled back on a failure.
+
+                if configuration.audit_log_file:
+                    # The audit log cannot be written to from more than
+                    # one thread at a time.
+                    send_concurrency = 1
+                else:
+                    send_concurrency = configuration.agent_limits.data_collector_send_concurrency
+
+                sender = HarvestSender(send_concurrency, internal_metrics)
+
                 try:
                     # Send the transaction and custom metric data.
 
@@ -1298,11 +1490,13 @@ class Application(object):
                         if synthetics_events.num_samples:
                             _logger.debug("Sending synthetics event data for harvest of %r.", self._app_name)
 
-                            self._active_session.send_transaction_events(
-                                synthetics_events.sampling_info, synthetics_events
+                            sender.send(
+                                self._active_session.send_transaction_events,
+                                (synthetics_events.sampling_info, synthetics_events),
+                                stats.reset_synthetics_events,
                             )
-
-                        stats.reset_synthetics_events()
+                        else:
+                            stats.reset_synthetics_events()
 
                     if configuration.collect_analytics_events and configuration.transaction_events.enabled:
                         transaction_events = stats.transaction_events
@@ -1319,11 +1513,13 @@ class Application(object):
                             if transaction_events.num_samples:
                                 _logger.debug("Sending analytics event data for harvest of %r.", self._app_name)
 
-                                self._active_session.send_transaction_events(
-                                    transaction_events.sampling_info, transaction_events
+                                sender.send(
+                                    self._active_session.send_transaction_events,
+                                    (transaction_events.sampling_info, transaction_events),
+                                    stats.reset_transaction_events,
                                 )
-
-                            stats.reset_transaction_events()
+                            else:
+                                stats.reset_transaction_events()
 
                     # Send span events
 
@@ -1345,12 +1541,26 @@ class Application(object):
                             spans = stats.span_events
                             if spans:
                                 if spans.num_samples > 0:
-                                    span_samples = list(spans)
+                                    # Span events are held in the reservoir as
+                                    # references to the trace nodes, with the
+                                    # attributes only built for those which
+                                    # survived through to the harvest.
+
+                                    span_samples = [
+                                        span.render() if isinstance(span, SpanEventReference) else span
+                                        for span in spans
+                                    ]
 
                                     _logger.debug("Sending span event data for harvest of %r.", self._app_name)
 
-                                    self._active_session.send_span_events(spans.sampling_info, span_samples)
+                                    sender.send(
+                                        self._active_session.send_span_events,
+                                        (spans.sampling_info, span_samples),
+                                        stats.reset_span_events,
+                                    )
                                     span_samples = None
+                                else:
+                                    stats.reset_span_events()
 
                                 # As per spec
                                 spans_seen = spans.num_seen
@@ -1358,8 +1568,6 @@ class Application(object):
                                 internal_count_metric("Supportability/SpanEvent/TotalEventsSeen", spans_seen)
                                 internal_count_metric("Supportability/SpanEvent/TotalEventsSent", spans_sampled)
 
-                                stats.reset_span_events()
-
                     # Send error events
 
                     if (
@@ -1376,15 +1584,19 @@ class Application(object):
                                 _logger.debug("Sending error event data for harvest of %r.", self._app_name)
 
                                 samp_info = error_events.sampling_info
-                                self._active_session.send_error_events(samp_info, error_event_samples)
+                                sender.send(
+                                    self._active_session.send_error_events,
+                                    (samp_info, error_event_samples),
+                                    stats.reset_error_events,
+                                )
                                 error_event_samples = None
+                            else:
+                                stats.reset_error_events()
 
                             # As per spec
                             internal_count_metric("Supportability/Events/TransactionError/Seen", error_events.num_seen)
                             internal_count_metric("Supportability/Events/TransactionError/Sent", num_error_samples)
 
-                            stats.reset_error_events()
-
                     # Send custom events
 
                     if configuration.collect_custom_events and configuration.custom_insights_events.enabled:
@@ -1396,15 +1608,19 @@ class Application(object):
 
                                 _logger.debug("Sending custom event data for harvest of %r.", self._app_name)
 
-                                self._active_session.send_custom_events(customs.sampling_info, custom_samples)
+                                sender.send(
+                                    self._active_session.send_custom_events,
+                                    (customs.sampling_info, custom_samples),
+                                    stats.reset_custom_events,
+                                )
                                 custom_samples = None
+                            else:
+                                stats.reset_custom_events()
 
                             # As per spec
                             internal_count_metric("Supportability/Events/Customer/Seen", customs.num_seen)
                             internal_count_metric("Supportability/Events/Customer/Sent", customs.num_samples)
 
-                            stats.reset_custom_events()
-
                     # Send machine learning events
 
                     if configuration.ml_insights_events.enabled:
@@ -1416,15 +1632,19 @@ class Application(object):
 
                                 _logger.debug("Sending machine learning event data for harvest of %r.", self._app_name)
 
-                                self._active_session.send_ml_events(ml_events.sampling_info, ml_event_samples)
+                                sender.send(
+                                    self._active_session.send_ml_events,
+                                    (ml_events.sampling_info, ml_event_samples),
+                                    stats.reset_ml_events,
+                                )
                                 ml_event_samples = None
+                            else:
+                                stats.reset_ml_events()
 
                             # As per spec
                             internal_count_metric("Supportability/Events/Customer/Seen", ml_events.num_seen)
                             internal_count_metric("Supportability/Events/Customer/Sent", ml_events.num_samples)
 
-                            stats.reset_ml_events()
-
                     # Send log events
 
                     if (
@@ -1442,16 +1662,20 @@ class Application(object):
 
                                 _logger.debug("Sending log event data for harvest of %r.", self._app_name)
 
-                                self._active_session.send_log_events(logs.sampling_info, log_samples)
+                                sender.send(
+                                    self._active_session.send_log_events,
+                                    (logs.sampling_info, log_samples),
+                                    stats.reset_log_events,
+                                )
                                 log_samples = None
+                            else:
+                                stats.reset_log_events()
 
                             # As per spec
                             internal_count_metric("Supportability/Logging/Forwarding/Seen", logs.num_seen)
                             internal_count_metric("Supportability/Logging/Forwarding/Sent", logs.num_samples)
                             internal_count_metric("Logging/Forwarding/Dropped", logs.num_seen - logs.num_samples)
 
-                            stats.reset_log_events()
-
                     # Send the accumulated error data.
 
                     if configuration.collect_errors:
@@ -1460,7 +1684,7 @@ class Application(object):
                         if error_data:
                             _logger.debug("Sending error data for harvest of %r.", self._app_name)
 
-                            self._active_session.send_errors(error_data)
+                            sender.send(self._active_session.send_errors, (error_data,))
 
                     if not flexible:
                         if configuration.collect_traces:
@@ -1475,14 +1699,20 @@ class Application(object):
                                     if slow_sql_data:
                                         _logger.debug("Sending slow SQL data for harvest of %r.", self._app_name)
 
-                                        self._active_session.send_sql_traces(slow_sql_data)
+                                        sender.send(self._active_session.send_sql_traces, (slow_sql_data,))
 
                                 slow_transaction_data = stats.transaction_trace_data(connections)
 
                                 if slow_transaction_data:
                                     _logger.debug("Sending slow transaction data for harvest of %r.", self._app_name)
 
-                                    self._active_session.send_transaction_traces(slow_transaction_data)
+                                    sender.send(self._active_session.send_transaction_traces, (slow_transaction_data,))
+
+                        # Wait for any payloads being sent concurrently, so
+                        # the supportability metrics recorded while sending
+                        # them are included with the metric data.
+
+                        sender.wait()
 
                         # Create a metric_normalizer based on normalize_name
                         # If metric rename rules are empty, set normalizer
@@ -1554,6 +1784,9 @@ class Application(object):
                         _logger.debug("Finalizing data.")
                         self._active_session.finalize()
 
+                    else:
+                        sender.wait()
+
                     # If this is a final forced harvest for the process
                     # then attempt to shutdown the session.
 
@@ -1685,6 +1918,13 @@ class Application(object):
 
         self.stop_data_samplers()
 
+        # Stop the background transaction recorder. Anything still queued
+        # belongs to the session being shutdown and is discarded.
+
+        if self._transaction_recorder is not None:
+            self._transaction_recorder.shutdown()
+            self._transaction_recorder = None
+
         # Now shutdown the actual agent session.
 
         try:
@@ -58,11 +58,32 @@ class AttributeFilter(object):
     #      the bitfield.
     #
     #   4. Return the resulting bitfield after all rules have been applied.
+    #
+    # As the rules are sorted, the rules matching an attribute name are
+    # always applied from the shortest to the longest rule name, where each
+    # rule name is a prefix of the attribute name. The rules are therefore
+    # compiled into a trie keyed on the characters in the rule names, so
+    # only the rules matching an attribute name need to be visited.
+    #
+    # The effect of any sequence of rules on a bitfield can be expressed as
+    # a bitfield to mask it with and a bitfield to then add to it. Each node
+    # of the trie holds the combined effect of the rules for that node, and
+    # the combined effect of all the rules matching an attribute name is
+    # what is cached for the name, independent of the default destinations
+    # passed in to apply(). The cache is bounded, with the oldest entries
+    # being evicted to make room for new entries. No lock is taken when
+    # updating the cache, so the counts of misses and evictions are only
+    # approximate when attributes are filtered from many threads at once.
 
     def __init__(self, flattened_settings):
         self.enabled_destinations = self._set_enabled_destinations(flattened_settings)
         self.rules = self._build_rules(flattened_settings)
+        self.root = self._compile_rules(self.rules)
+
         self.cache = {}
+        self.cache_size = flattened_settings.get("agent_limits.attribute_filter_cache_size", 1000)
+        self._cache_misses = 0
+        self._cache_evictions = 0
 
     def __repr__(self):
         return "<AttributeFilter: destinations: %s, rules: %s>" % (bin(self.enabled_destinations), self.rules)
@@ -136,27 +157,104 @@ class AttributeFilter(object):
 
         return tuple(rules)
 
+    def _compile_rules(self, rules):
+        # Rules are added to the trie in sorted order, so the rules for
+        # each node are combined in the order they would be applied.
+
+        root = AttributeFilterNode()
+
+        for rule in rules:
+            node = root
+            for char in rule.name:
+                node = node.children.setdefault(char, AttributeFilterNode())
+
+            if rule.is_include:
+                effect = (DST_ALL, rule.destinations & self.enabled_destinations)
+            else:
+                effect = (DST_ALL & ~rule.destinations, DST_NONE)
+
+            if rule.is_wildcard:
+                node.wildcard = _combine(node.wildcard, effect)
+            else:
+                node.exact = _combine(node.exact, effect)
+
+        return root
+
+    def _match(self, name):
+        effect = None
+        node = self.root
+
+        for char in name:
+            if node.wildcard is not None:
+                effect = _combine(effect, node.wildcard)
+
+            node = node.children.get(char)
+
+            if node is None:
+                return effect or (DST_ALL, DST_NONE)
+
+        if node.wildcard is not None:
+            effect = _combine(effect, node.wildcard)
+
+        if node.exact is not None:
+            effect = _combine(effect, node.exact)
+
+        return effect or (DST_ALL, DST_NONE)
+
     def apply(self, name, default_destinations):
         if self.enabled_destinations == DST_NONE:
             return DST_NONE
 
-        cache_index = (name, default_destinations)
+        effect = self.cache.get(name)
+
+        if effect is None:
+            effect = self._match(name)
+
+            self._cache_misses += 1
+
+            if self.cache_size > 0:
+                if len(self.cache) >= self.cache_size:
+                    try:
+                        del self.cache[next(iter(self.cache))]
+                    except (KeyError, RuntimeError, StopIteration):
+                        # Another thread changed the cache at the same time.
+                        pass
+                    else:
+                        self._cache_evictions += 1
+
+                self.cache[name] = effect
+
+        mask, destinations = effect
+
+        return (self.enabled_destinations & default_destinations & mask) | destinations
+
+    def stats(self):
+        """Returns and resets the counts of cache misses and evictions."""
+
+        misses, evictions = self._cache_misses, self._cache_evictions
+        self._cache_misses, self._cache_evictions = 0, 0
+
+        return misses, evictions
+
+
+def _combine(first, second):
+    # Combines the effects of two sequences of rules, each being a tuple
+    # of the bitfield to mask destinations with and the bitfield to then
+    # add to them, into the effect of applying one after the other.
+
+    if first is None:
+        return second
 
-        if cache_index in self.cache:
-            return self.cache[cache_index]
+    return (first[0] & second[0], (first[1] & second[0]) | second[1])
 
-        destinations = self.enabled_destinations & default_destinations
 
-        for rule in self.rules:
-            if rule.name_match(name):
-                if rule.is_include:
-                    inc_dest = rule.destinations & self.enabled_destinations
-                    destinations |= inc_dest
-                else:
-                    destinations &= ~rule.destinations
+class AttributeFilterNode(object):
+    __slots__ = ("children", "wildcard", "exact")
 
-        self.cache[cache_index] = destinations
-        return destinations
+    def __init__(self):
+        self.children = {}
+        self.wildcard = None
+        self.exact = None
 
 
 class AttributeFilterRule(object):
@@ -136,6 +136,10 @@ class GCRuntimeMetricsSettings(Settings):
     enabled = False
 
 
+class HarvestSpoolSettings(Settings):
+    pass
+
+
 class MemoryRuntimeMetricsSettings(Settings):
     pass
 
@@ -148,6 +152,10 @@ class MachineLearningInferenceEventsValueSettings(Settings):
     pass
 
 
+class MachineLearningInferenceEventsSettings(Settings):
+    pass
+
+
 class AIMonitoringSettings(Settings):
     @property
     def llm_token_count_callback(self):
@@ -208,6 +216,10 @@ class TransactionNameSettings(Settings):
     pass
 
 
+class TransactionRecorderSettings(Settings):
+    pass
+
+
 class TransactionMetricsSettings(Settings):
     pass
 
@@ -264,6 +276,10 @@ class MessageTracerSettings(Settings):
     pass
 
 
+class MessageTracerConsumerBatchSettings(Settings):
+    pass
+
+
 class UtilizationSettings(Settings):
     pass
 
@@ -431,6 +447,7 @@ _settings.application_logging.local_decorating = ApplicationLoggingLocalDecorati
 _settings.application_logging.metrics = ApplicationLoggingMetricsSettings()
 _settings.machine_learning = MachineLearningSettings()
 _settings.machine_learning.inference_events_value = MachineLearningInferenceEventsValueSettings()
+_settings.machine_learning.inference_events = MachineLearningInferenceEventsSettings()
 _settings.ai_monitoring = AIMonitoringSettings()
 _settings.ai_monitoring.streaming = AIMonitoringStreamingSettings()
 _settings.ai_monitoring.record_content = AIMonitoringRecordContentSettings()
@@ -456,11 +473,13 @@ _settings.event_harvest_config.harvest_limits = EventHarvestConfigHarvestLimitSe
 _settings.event_loop_visibility = EventLoopVisibilitySettings()
 _settings.gc_runtime_metrics = GCRuntimeMetricsSettings()
 _settings.memory_runtime_pid_metrics = MemoryRuntimeMetricsSettings()
+_settings.harvest_spool = HarvestSpoolSettings()
 _settings.heroku = HerokuSettings()
 _settings.infinite_tracing = InfiniteTracingSettings()
 _settings.instrumentation = InstrumentationSettings()
 _settings.instrumentation.graphql = InstrumentationGraphQLSettings()
 _settings.message_tracer = MessageTracerSettings()
+_settings.message_tracer.consumer_batch = MessageTracerConsumerBatchSettings()
 _settings.process_host = ProcessHostSettings()
 _settings.rum = RumSettings()
 _settings.serverless_mode = ServerlessModeSettings()
@@ -474,6 +493,7 @@ _settings.transaction_events = TransactionEventsSettings()
 _settings.transaction_events.attributes = TransactionEventsAttributesSettings()
 _settings.transaction_metrics = TransactionMetricsSettings()
 _settings.transaction_name = TransactionNameSettings()
+_settings.transaction_recorder = TransactionRecorderSettings()
 _settings.transaction_segments = TransactionSegmentSettings()
 _settings.transaction_segments.attributes = TransactionSegmentAttributesSettings()
 _settings.transaction_tracer = TransactionTracerSettings()
@@ -710,6 +730,8 @@ _settings.include_environ = [
 
 _settings.max_stack_trace_lines = 50
 
+_settings.metric_stats_table = os.environ.get("NEW_RELIC_METRIC_STATS_TABLE", "list")
+
 _settings.sampling_rate = 0
 
 _settings.startup_timeout = float(os.environ.get("NEW_RELIC_STARTUP_TIMEOUT", "0.0"))
@@ -745,10 +767,19 @@ _settings.attributes.exclude = []
 _settings.attributes.include = []
 
 _settings.thread_profiler.enabled = True
+_settings.thread_profiler.cpu_budget = _environ_as_float("NEW_RELIC_THREAD_PROFILER_CPU_BUDGET", 0.0)
 _settings.cross_application_tracer.enabled = False
 
 _settings.gc_runtime_metrics.enabled = False
 _settings.gc_runtime_metrics.top_object_count_limit = 5
+_settings.gc_runtime_metrics.top_object_sample_limit = _environ_as_int(
+    "NEW_RELIC_GC_RUNTIME_METRICS_TOP_OBJECT_SAMPLE_LIMIT", 0
+)
+
+_settings.harvest_spool.enabled = _environ_as_bool("NEW_RELIC_HARVEST_SPOOL_ENABLED", default=False)
+_settings.harvest_spool.directory = os.environ.get("NEW_RELIC_HARVEST_SPOOL_DIRECTORY", None)
+_settings.harvest_spool.max_size = _environ_as_int("NEW_RELIC_HARVEST_SPOOL_MAX_SIZE", 16 * 1024 * 1024)
+_settings.harvest_spool.max_age = _environ_as_float("NEW_RELIC_HARVEST_SPOOL_MAX_AGE", 3600.0)
 
 _settings.memory_runtime_pid_metrics.enabled = _environ_as_bool(
     "NEW_RELIC_MEMORY_RUNTIME_PID_METRICS_ENABLED", default=True
@@ -783,6 +814,7 @@ _settings.transaction_tracer.record_sql = "obfuscated"
 _settings.transaction_tracer.stack_trace_threshold = 0.5
 _settings.transaction_tracer.explain_enabled = True
 _settings.transaction_tracer.explain_threshold = 0.5
+_settings.transaction_tracer.explain_plan_cache_ttl = 600.0
 _settings.transaction_tracer.function_trace = []
 _settings.transaction_tracer.generator_trace = []
 _settings.transaction_tracer.top_n = 20
@@ -816,19 +848,33 @@ _settings.browser_monitoring.attributes.include = []
 _settings.transaction_name.limit = None
 _settings.transaction_name.naming_scheme = os.environ.get("NEW_RELIC_TRANSACTION_NAMING_SCHEME")
 
+_settings.transaction_recorder.enabled = _environ_as_bool("NEW_RELIC_TRANSACTION_RECORDER_ENABLED", default=False)
+_settings.transaction_recorder.queue_size = _environ_as_int("NEW_RELIC_TRANSACTION_RECORDER_QUEUE_SIZE", 1000)
+_settings.transaction_recorder.overflow_policy = os.environ.get(
+    "NEW_RELIC_TRANSACTION_RECORDER_OVERFLOW_POLICY", "drop"
+)  # Valid values: 'drop', 'block'
+
 _settings.slow_sql.enabled = True
 
 _settings.synthetics.enabled = True
 
 _settings.agent_limits.data_collector_timeout = 30.0
+_settings.agent_limits.data_collector_send_concurrency = _environ_as_int(
+    "NEW_RELIC_AGENT_LIMITS_DATA_COLLECTOR_SEND_CONCURRENCY", 1
+)
 _settings.agent_limits.transaction_traces_nodes = 2000
 _settings.agent_limits.sql_query_length_maximum = 16384
+_settings.agent_limits.sql_parse_cache_size = 1000
+_settings.agent_limits.sql_explain_plan_cache_size = 500
+_settings.agent_limits.attribute_filter_cache_size = 1000
 _settings.agent_limits.slow_sql_stack_trace = 30
 _settings.agent_limits.max_sql_connections = 4
 _settings.agent_limits.sql_explain_plans = 30
 _settings.agent_limits.sql_explain_plans_per_harvest = 60
 _settings.agent_limits.slow_sql_data = 10
 _settings.agent_limits.merge_stats_maximum = None
+_settings.agent_limits.stats_engine_shards = _environ_as_int("NEW_RELIC_AGENT_LIMITS_STATS_ENGINE_SHARDS", 0)
+_settings.agent_limits.metric_name_table_size = 50000
 _settings.agent_limits.errors_per_transaction = 5
 _settings.agent_limits.errors_per_harvest = 20
 _settings.agent_limits.slow_transaction_dry_harvests = 5
@@ -901,6 +947,15 @@ _settings.debug.connect_span_stream_in_developer_mode = False
 _settings.debug.otlp_content_encoding = None
 
 _settings.message_tracer.segment_parameters_enabled = True
+_settings.message_tracer.consumer_batch.enabled = _environ_as_bool(
+    "NEW_RELIC_MESSAGE_TRACER_CONSUMER_BATCH_ENABLED", default=False
+)
+_settings.message_tracer.consumer_batch.max_messages = _environ_as_int(
+    "NEW_RELIC_MESSAGE_TRACER_CONSUMER_BATCH_MAX_MESSAGES", default=500
+)
+_settings.message_tracer.consumer_batch.distributed_tracing = _environ_as_bool(
+    "NEW_RELIC_MESSAGE_TRACER_CONSUMER_BATCH_DISTRIBUTED_TRACING", default=False
+)
 
 _settings.utilization.detect_aws = True
 _settings.utilization.detect_azure = True
@@ -954,6 +1009,9 @@ _settings.machine_learning.enabled = _environ_as_bool("NEW_RELIC_MACHINE_LEARNIN
 _settings.machine_learning.inference_events_value.enabled = _environ_as_bool(
     "NEW_RELIC_MACHINE_LEARNING_INFERENCE_EVENT_VALUE_ENABLED", default=False
 )
+_settings.machine_learning.inference_events.sample_limit = _environ_as_int(
+    "NEW_RELIC_MACHINE_LEARNING_INFERENCE_EVENTS_SAMPLE_LIMIT", default=0
+)
 _settings.ai_monitoring.enabled = _environ_as_bool("NEW_RELIC_AI_MONITORING_ENABLED", default=False)
 _settings.ai_monitoring.streaming.enabled = _environ_as_bool("NEW_RELIC_AI_MONITORING_STREAMING_ENABLED", default=True)
 _settings.ai_monitoring.record_content.enabled = _environ_as_bool(
@@ -19,12 +19,16 @@
 from __future__ import print_function
 
 import logging
+import sys
+import threading
+import zlib
 
 from newrelic.common.agent_http import (
     ApplicationModeClient,
     DeveloperModeClient,
     ServerlessModeClient,
 )
+from newrelic.common.encoding_utils import json_encode
 from newrelic.core.agent_protocol import (
     AgentProtocol,
     OtlpProtocol,
@@ -32,10 +36,149 @@ from newrelic.core.agent_protocol import (
 )
 from newrelic.core.agent_streaming import StreamingRpc
 from newrelic.core.config import global_settings
+from newrelic.core.harvest_spool import harvest_spool
+from newrelic.core.internal_metrics import InternalTraceContext, internal_count_metric
 from newrelic.core.otlp_utils import encode_metric_data, encode_ml_event_data
+from newrelic.core.stats_engine import CustomMetrics
+from newrelic.network.exceptions import (
+    DiscardDataForRequest,
+    PayloadTooLarge,
+    RetryDataForRequest,
+)
+from newrelic.packages import six
 
 _logger = logging.getLogger(__name__)
 
+# When a payload is too large to send, the items in it are split into
+# chunks sized from an estimate of the number of bytes each item adds to
+# the compressed payload. The estimate comes from encoding a sample of
+# the items, rather than encoding the whole payload again for each
+# attempt at a split. Chunks are sized to fill only part of the maximum
+# payload size, to allow for items varying in size.
+
+PAYLOAD_SPLIT_SAMPLE_SIZE = 50
+PAYLOAD_SPLIT_FILL_FACTOR = 0.8
+
+
+def _split_items(items, max_payload_size):
+    step = max(len(items) // PAYLOAD_SPLIT_SAMPLE_SIZE, 1)
+    sample = items[::step]
+
+    encoded = zlib.compress(json_encode(sample).encode("utf-8"))
+    bytes_per_item = float(len(encoded)) / len(sample)
+
+    chunk_size = int(max_payload_size * PAYLOAD_SPLIT_FILL_FACTOR / bytes_per_item)
+
+    # Always split into at least two chunks, as the payload was known to
+    # be too large even if the estimate says otherwise.
+
+    chunk_size = max(min(chunk_size, (len(items) + 1) // 2), 1)
+
+    return [items[i : i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+
+def _split_sampling_info(sampling_info, chunks):
+    # The number of events seen and the reservoir size are shared out
+    # across the chunks in proportion to the number of events in each,
+    # so that the totals reported are unchanged.
+
+    total = sum(len(chunk) for chunk in chunks)
+    split = []
+    allocated = dict((key, 0) for key in sampling_info)
+
+    for index, chunk in enumerate(chunks):
+        info = dict(sampling_info)
+        for key, value in sampling_info.items():
+            if index == len(chunks) - 1:
+                info[key] = value - allocated[key]
+            else:
+                info[key] = value * len(chunk) // total
+                allocated[key] += info[key]
+        split.append(info)
+
+    return split
+
+
+class HarvestSender(object):
+    """Sends the payloads for a harvest to the data collector. With a
+    concurrency of one, each payload is sent as soon as it is added, with
+    any exception raised straight away. Otherwise payloads are queued up
+    and sent from a pool of threads when wait() is called.
+
+    Each payload is given a callback which is only called once it has
+    been sent successfully, and which should reset the data which was
+    sent, so that the data for any payload not sent is still there to be
+    rolled back into the next harvest.
+
+    """
+
+    def __init__(self, concurrency, internal_metrics):
+        self.concurrency = concurrency
+        self.internal_metrics = internal_metrics
+        self._pending = []
+
+    def send(self, send, args=(), sent=None):
+        if self.concurrency <= 1:
+            send(*args)
+            if sent is not None:
+                sent()
+        else:
+            self._pending.append((send, args, sent))
+
+    def wait(self):
+        """Sends all queued payloads and waits for them to complete. If
+        any failed, the exception for the first of them in the order they
+        were added is raised, which is the exception which would have been
+        raised had they been sent one after the other.
+
+        """
+
+        pending, self._pending = self._pending, []
+
+        if not pending:
+            return
+
+        results = [None] * len(pending)
+        lock = threading.Lock()
+        indices = iter(range(len(pending)))
+
+        def _worker(metrics):
+            # Supportability metrics are recorded into a table for each
+            # thread and merged once all threads have finished.
+
+            with InternalTraceContext(metrics):
+                while True:
+                    with lock:
+                        index = next(indices, None)
+                    if index is None:
+                        return
+
+                    send, args, sent = pending[index]
+                    try:
+                        send(*args)
+                        if sent is not None:
+                            sent()
+                    except Exception:
+                        results[index] = sys.exc_info()
+
+        worker_metrics = [CustomMetrics() for _ in range(min(self.concurrency, len(pending)))]
+        threads = [
+            threading.Thread(target=_worker, args=(metrics,), name="NR-Harvest-Sender") for metrics in worker_metrics
+        ]
+
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for metrics in worker_metrics:
+            self.internal_metrics.merge_metric_stats(metrics.metrics())
+
+        for exc_info in results:
+            if exc_info is not None:
+                six.reraise(*exc_info)
+
 
 class Session(object):
     PROTOCOL = AgentProtocol
@@ -51,6 +194,10 @@ class Session(object):
         )
         self._rpc = None
 
+        self._spool = harvest_spool(app_name, settings)
+        self._spool_lock = threading.Lock()
+        self._collector_unavailable = False
+
     @property
     def configuration(self):
         return self._protocol.configuration
@@ -62,6 +209,10 @@ class Session(object):
     def close_connection(self):
         self._protocol.close_connection()
 
+        # Give the data collector another chance with the next harvest.
+
+        self._collector_unavailable = False
+
     def connect_span_stream(self, span_iterator, record_metric):
         if not self._rpc:
             host = self.configuration.infinite_tracing.trace_observer_host
@@ -93,6 +244,142 @@ class Session(object):
         if self._rpc:
             self._rpc.close()
 
+    def _send_data(self, protocol, method, payload, **kwargs):
+        """Sends a payload of harvest data. When the harvest spool is
+        enabled and the payload can't be sent for a reason which means it
+        could be sent later, the payload is added to the spool instead.
+        Once the data collector can be reached again, what is in the spool
+        is sent after the first payload which is sent successfully.
+
+        """
+
+        spool = self._spool
+
+        # Payloads for the OTLP endpoints are not spooled.
+
+        if spool is None or protocol is not self._protocol:
+            return protocol.send(method, payload, **kwargs)
+
+        # After one payload has failed to be sent, the rest of the payloads
+        # for the same harvest go straight to the spool, rather than each
+        # having to wait for the data collector to fail them as well.
+
+        if not self._collector_unavailable:
+            try:
+                result = protocol.send(method, payload, **kwargs)
+            except RetryDataForRequest:
+                self._collector_unavailable = True
+            else:
+                self._replay_spool()
+                return result
+
+        spool.append(method, self.agent_run_id, payload)
+
+    def _replay_spool(self):
+        spool = self._spool
+
+        # Only one thread sends what is in the spool at a time, so that the
+        # same payload isn't sent twice.
+
+        if not self._spool_lock.acquire(False):
+            return
+
+        try:
+            while not self._collector_unavailable:
+                record = spool.peek()
+                if record is None:
+                    break
+
+                token, method, run_id, payload = record
+
+                # Payloads which were made for an earlier agent run are
+                # sent as part of the current run.
+
+                if payload and payload[0] == run_id:
+                    payload[0] = self.agent_run_id
+
+                try:
+                    self._protocol.send(method, payload)
+                except RetryDataForRequest:
+                    self._collector_unavailable = True
+                    break
+                except DiscardDataForRequest:
+                    internal_count_metric("Supportability/Python/HarvestSpool/Discarded/%s" % method, 1)
+                else:
+                    internal_count_metric("Supportability/Python/HarvestSpool/Replayed/%s" % method, 1)
+
+                spool.pop(token)
+        finally:
+            self._spool_lock.release()
+
+    def _send_split(self, protocol, method, items, sampling_info, build_payload, **kwargs):
+        """Sends the payload built from the items, and where it is too large
+        to be sent, splits the items into chunks which are sent separately.
+        A chunk which still turns out to be too large is itself split.
+
+        """
+
+        try:
+            return self._send_data(protocol, method, build_payload(items, sampling_info), **kwargs)
+        except PayloadTooLarge:
+            items = list(items)
+            if len(items) < 2:
+                raise
+
+        chunks = _split_items(items, self.configuration.max_payload_size_in_bytes)
+
+        if sampling_info is not None:
+            chunk_sampling_info = _split_sampling_info(sampling_info, chunks)
+        else:
+            chunk_sampling_info = [None] * len(chunks)
+
+        internal_count_metric("Supportability/Python/Collector/PayloadSplit/%s" % method, len(chunks))
+
+        _logger.debug(
+            "Payload for %r was too large to send and has been split into %d chunks of up to %d items.",
+            method,
+            len(chunks),
+            len(chunks[0]),
+        )
+
+        result = None
+        for index, (chunk, info) in enumerate(zip(chunks, chunk_sampling_info)):
+            try:
+                result = self._send_split(protocol, method, chunk, info, build_payload, **kwargs)
+            except RetryDataForRequest:
+                if not index:
+                    raise
+
+                # The chunks already sent were accepted by the data
+                # collector, so rolling back all of the items into the next
+                # harvest would have them counted twice. What has not been
+                # sent is discarded instead.
+
+                discarded = sum(len(chunk) for chunk in chunks[index:])
+                internal_count_metric("Supportability/Python/Collector/PayloadSplit/Discarded/%s" % method, discarded)
+
+                _logger.debug(
+                    "Sending a chunk of the payload for %r failed after %d of %d chunks had been sent. "
+                    "The %d items not yet sent have been discarded.",
+                    method,
+                    index,
+                    len(chunks),
+                    discarded,
+                )
+
+                break
+
+        return result
+
+    def _send_events(self, method, sampling_info, events):
+        return self._send_split(
+            self._protocol,
+            method,
+            events,
+            sampling_info,
+            lambda events, sampling_info: (self.agent_run_id, sampling_info, events),
+        )
+
     def send_transaction_traces(self, transaction_traces):
         """Called to submit transaction traces. The transaction traces
         should be an iterable of individual traces.
@@ -107,30 +394,33 @@ class Session(object):
             return
 
         payload = (self.agent_run_id, transaction_traces)
-        return self._protocol.send("transaction_sample_data", payload)
+        return self._send_data(self._protocol, "transaction_sample_data", payload)
 
     def send_transaction_events(self, sampling_info, sample_set):
         """Called to submit sample set for analytics."""
 
-        payload = (self.agent_run_id, sampling_info, sample_set)
-        return self._protocol.send("analytic_event_data", payload)
+        return self._send_events("analytic_event_data", sampling_info, sample_set)
 
     def send_custom_events(self, sampling_info, custom_event_data):
         """Called to submit sample set for custom events."""
 
-        payload = (self.agent_run_id, sampling_info, custom_event_data)
-        return self._protocol.send("custom_event_data", payload)
+        return self._send_events("custom_event_data", sampling_info, custom_event_data)
 
     def send_ml_events(self, sampling_info, custom_event_data):
         """Called to submit sample set for machine learning events."""
-        payload = encode_ml_event_data(custom_event_data, str(self.agent_run_id))
-        return self._otlp_protocol.send("ml_event_data", payload, path="/v1/logs")
+        return self._send_split(
+            self._otlp_protocol,
+            "ml_event_data",
+            custom_event_data,
+            None,
+            lambda events, sampling_info: encode_ml_event_data(events, str(self.agent_run_id)),
+            path="/v1/logs",
+        )
 
     def send_span_events(self, sampling_info, span_event_data):
         """Called to submit sample set for span events."""
 
-        payload = (self.agent_run_id, sampling_info, span_event_data)
-        return self._protocol.send("span_event_data", payload)
+        return self._send_events("span_event_data", sampling_info, span_event_data)
 
     def send_metric_data(self, start_time, end_time, metric_data):
         """Called to submit metric data for specified period of time.
@@ -139,8 +429,13 @@ class Session(object):
         specific metrics.
         """
 
-        payload = (self.agent_run_id, start_time, end_time, metric_data)
-        return self._protocol.send("metric_data", payload)
+        return self._send_split(
+            self._protocol,
+            "metric_data",
+            metric_data,
+            None,
+            lambda metric_data, sampling_info: (self.agent_run_id, start_time, end_time, metric_data),
+        )
 
     def send_dimensional_metric_data(self, start_time, end_time, metric_data):
         """Called to submit dimensional metric data for specified period of time.
@@ -159,8 +454,13 @@ class Session(object):
     def send_log_events(self, sampling_info, log_event_data):
         """Called to submit sample set for log events."""
 
-        payload = ({"logs": tuple(log._asdict() for log in log_event_data)},)
-        return self._protocol.send("log_event_data", payload)
+        return self._send_split(
+            self._protocol,
+            "log_event_data",
+            log_event_data,
+            None,
+            lambda log_event_data, sampling_info: ({"logs": tuple(log._asdict() for log in log_event_data)},),
+        )
 
     def get_agent_commands(self):
         """Receive agent commands from the data collector."""
@@ -178,13 +478,12 @@ class Session(object):
 
         """
         payload = (self.agent_run_id, errors)
-        return self._protocol.send("error_data", payload)
+        return self._send_data(self._protocol, "error_data", payload)
 
     def send_error_events(self, sampling_info, error_data):
         """Called to submit sample set for error events."""
 
-        payload = (self.agent_run_id, sampling_info, error_data)
-        return self._protocol.send("error_event_data", payload)
+        return self._send_events("error_event_data", sampling_info, error_data)
 
     def send_sql_traces(self, sql_traces):
         """Called to sub SQL traces. The SQL traces should be an
@@ -196,7 +495,7 @@ class Session(object):
         """
 
         payload = (sql_traces,)
-        return self._protocol.send("sql_trace_data", payload)
+        return self._send_data(self._protocol, "sql_trace_data", payload)
 
     def send_agent_command_results(self, cmd_results):
         """Acknowledge the receipt of an agent command."""
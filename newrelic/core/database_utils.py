@@ -17,9 +17,13 @@ explain plans for SQL etc.
 
 """
 
+import hashlib
 import logging
 import re
+import threading
+import time
 import weakref
+from collections import OrderedDict
 
 import newrelic.packages.six as six
 
@@ -49,11 +53,6 @@ _any_quotes_p = _single_quotes_p + '|' + _double_quotes_p
 _single_dollar_p = _single_quotes_p + '|' + _dollar_quotes_p
 _single_oracle_p = _single_quotes_p + '|' + _oracle_quotes_p
 
-_single_quotes_re = re.compile(_single_quotes_p)
-_any_quotes_re = re.compile(_any_quotes_p)
-_single_dollar_re = re.compile(_single_dollar_p)
-_single_oracle_re = re.compile(_single_oracle_p)
-
 # Cleanup regexes. Presence of a quote will indicate that the now obfuscated
 # sql was actually malformed.
 
@@ -76,38 +75,61 @@ _single_dollar_cleanup_re = re.compile(_single_dollar_cleanup_p)
 # We add one variation here in that don't want to replace a number that
 # follows on from a ':'. This is because ':1' can be used as positional
 # parameter with database adapters where 'paramstyle' is 'numeric'.
-
-_uuid_p = r'\{?(?:[0-9a-f]\-?){32}\}?'
-_int_p = r'(?<!:)-?\b(?:[0-9]+\.)?[0-9]+(e[+-]?[0-9]+)?'
-_hex_p = r'0x[0-9a-f]+'
-_bool_p = r'\b(?:true|false|null)\b'
-
-# Join all literals into one compiled regular expression. Longest expressions
-# first to avoid the situation of partial matches on shorter expressions. UUIDs
+#
+# Join all literals into one regular expression. Longest expressions first
+# to avoid the situation of partial matches on shorter expressions. UUIDs
 # might be an example.
-
-_all_literals_p = '(' + ')|('.join([_uuid_p, _hex_p, _int_p, _bool_p]) + ')'
-_all_literals_re = re.compile(_all_literals_p, re.IGNORECASE)
-
-_quotes_table = {
-    'single': (_single_quotes_re, _single_quotes_cleanup_re),
-    'single+double': (_any_quotes_re, _any_quotes_cleanup_re),
-    'single+dollar': (_single_dollar_re, _single_dollar_cleanup_re),
-    'single+oracle': (_single_oracle_re, _single_quotes_cleanup_re),
+#
+# Quoted strings and literals are replaced in a single scan of the SQL
+# using one regular expression per quoting style. Quoted strings are tried
+# first at any position, as no literal can contain the character which
+# starts a quoted string. The literal patterns spell out both cases of each
+# letter, as only they and not the quoted strings are matched ignoring
+# case. The lookahead on the first character lets the scan skip quickly
+# over text which can't start either. For Oracle a boolean may also end
+# where a q quoted string starts.
+
+_uuid_cased_p = r'\{?(?:[0-9a-fA-F]\-?){32}\}?'
+_int_cased_p = r'(?<!:)-?\b(?:[0-9]+\.)?[0-9]+([eE][+-]?[0-9]+)?'
+_hex_cased_p = r'0[xX][0-9a-fA-F]+'
+_bool_cased_p = r'\b(?:[tT][rR][uU][eE]|[fF][aA][lL][sS][eE]|[nN][uU][lL][lL])\b'
+
+_bool_oracle_cased_p = (r'\b(?:[tT][rR][uU][eE]|[fF][aA][lL][sS][eE]|'
+        r'[nN][uU][lL][lL])(?:\b|(?=%s))' % _oracle_quotes_p)
+
+_all_literals_cased_p = '(' + ')|('.join([_uuid_cased_p, _hex_cased_p,
+        _int_cased_p, _bool_cased_p]) + ')'
+_oracle_literals_cased_p = '(' + ')|('.join([_uuid_cased_p, _hex_cased_p,
+        _int_cased_p, _bool_oracle_cased_p]) + ')'
+
+_literals_first_p = r'{0-9a-fA-F\-tTnN'
+
+
+def _obfuscate_p(quotes_p, quotes_first_p, literals_p=_all_literals_cased_p):
+    return r'(?=[%s%s])(?:%s|%s)' % (quotes_first_p, _literals_first_p,
+            quotes_p, literals_p)
+
+
+_obfuscate_table = {
+    'single': (re.compile(_obfuscate_p(_single_quotes_p, "'")),
+            _single_quotes_cleanup_re),
+    'single+double': (re.compile(_obfuscate_p(_any_quotes_p, '\'"')),
+            _any_quotes_cleanup_re),
+    'single+dollar': (re.compile(_obfuscate_p(_single_dollar_p, "'$")),
+            _single_dollar_cleanup_re),
+    'single+oracle': (re.compile(_obfuscate_p(_single_oracle_p, "'q",
+            _oracle_literals_cased_p)),
+            _single_quotes_cleanup_re),
 }
 
 
 def _obfuscate_sql(sql, database):
-    quotes_re, quotes_cleanup_re = _quotes_table.get(database.quoting_style,
-            (_single_quotes_re, _single_quotes_cleanup_re))
-
-    # Substitute quoted strings first.
-
-    sql = quotes_re.sub('?', sql)
+    obfuscate_re, quotes_cleanup_re = _obfuscate_table.get(
+            database.quoting_style, _obfuscate_table['single'])
 
-    # Replace all other sensitive fields
+    # Substitute quoted strings and all other sensitive fields.
 
-    sql = _all_literals_re.sub('?', sql)
+    sql = obfuscate_re.sub('?', sql)
 
     # Determine if the obfuscated query was malformed by searching for
     # remaining quote characters
@@ -206,9 +228,9 @@ def _extract_identifier(token):
 
 # Helper function for removing C style comments embedded in SQL statements.
 
-_uncomment_sql_p = r'(?:#|--).*?(?=\r|\n|$)'
+_uncomment_sql_p = r'(?:#|--)[^\r\n]*'
 _uncomment_sql_q = r'\/\*(?:[^\/]|\/[^*])*?(?:\*\/|\/\*.*)'
-_uncomment_sql_x = r'(%s)|(%s)' % (_uncomment_sql_p, _uncomment_sql_q)
+_uncomment_sql_x = r'(?=[#/-])(?:%s|%s)' % (_uncomment_sql_p, _uncomment_sql_q)
 _uncomment_sql_re = re.compile(_uncomment_sql_x, re.DOTALL)
 
 
@@ -736,7 +758,118 @@ def _explain_plan(connections, sql, database, connect_params, cursor_params,
                     'execute_params=%r.', query, database.client,
                     cursor_params, execute_params)
 
-    return None
+    return _EXPLAIN_PLAN_FAILED
+
+
+# Returned by _explain_plan() where an error occurred, as distinct from
+# None where no explain plan can be generated for the statement.
+
+_EXPLAIN_PLAN_FAILED = object()
+
+
+class ExplainPlanCache(object):
+
+    """Process wide, bounded LRU cache of the results of explain plans, so
+    that the same statements are not explained again for every harvest.
+    Entries are keyed on the normalized SQL, the database product and
+    client, and a digest of the parameters used to connect to the
+    database, so that credentials are not held by the cache. Entries
+    expire once older than the setting
+    transaction_tracer.explain_plan_cache_ttl.
+    Where the raw SQL is being reported, the raw SQL is used in place of
+    the normalized SQL, as the explain plan is not obfuscated. The maximum
+    number of entries is taken from the setting
+    agent_limits.sql_explain_plan_cache_size, with zero disabling the
+    cache.
+
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def key(sql_statement, connect_params, sql_format):
+        database = sql_statement.database
+
+        if sql_format == 'raw':
+            sql = sql_statement.sql
+        else:
+            sql = sql_statement.normalized
+
+        args, kwargs = connect_params
+
+        connect_identity = repr((tuple(args), sorted(kwargs.items())))
+        digest = hashlib.sha1(connect_identity.encode('utf-8',
+                'backslashreplace'))
+
+        return (sql, database.product, database.client, digest.digest(),
+                sql_format == 'raw')
+
+    def lookup(self, key):
+        """Returns the tuple of whether the key was found and the cached
+        explain plan, which may be None where no explain plan could be
+        generated.
+
+        """
+
+        settings = global_settings()
+
+        if settings.agent_limits.sql_explain_plan_cache_size <= 0:
+            return False, None
+
+        with self._lock:
+            entry = self._entries.pop(key, None)
+
+            if entry is not None:
+                expires, details = entry
+
+                if expires > time.time():
+                    self._hits += 1
+                    self._entries[key] = entry
+                    return True, details
+
+            self._misses += 1
+
+        return False, None
+
+    def store(self, key, details):
+        settings = global_settings()
+
+        maximum = settings.agent_limits.sql_explain_plan_cache_size
+
+        if maximum <= 0:
+            return
+
+        expires = time.time() + settings.transaction_tracer.explain_plan_cache_ttl
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires, details)
+
+            while len(self._entries) > maximum:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """Returns and resets the counts of cache hits and misses."""
+
+        with self._lock:
+            hits, misses = self._hits, self._misses
+            self._hits, self._misses = 0, 0
+
+        return hits, misses
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+explain_plan_cache = ExplainPlanCache()
 
 
 def explain_plan(connections, sql_statement, connect_params, cursor_params,
@@ -757,11 +890,30 @@ def explain_plan(connections, sql_statement, connect_params, cursor_params,
     if sql_statement.operation not in database.explain_stmts:
         return
 
+    # Where the same statement was explained recently, reuse the result
+    # rather than connecting to the database to explain it again.
+
+    key = explain_plan_cache.key(sql_statement, connect_params, sql_format)
+
+    found, details = explain_plan_cache.lookup(key)
+
+    if found:
+        return details
+
     details = _explain_plan(connections, sql_statement.sql, database,
             connect_params, cursor_params, sql_parameters, execute_params)
 
+    # An error may only be transient, such as the connection to the
+    # database being lost, so is not cached and the statement will be
+    # explained again next time.
+
+    if details is _EXPLAIN_PLAN_FAILED:
+        return None
+
     if details is not None and sql_format != 'raw':
-        return _obfuscate_explain_plan(database, *details)
+        details = _obfuscate_explain_plan(database, *details)
+
+    explain_plan_cache.store(key, details)
 
     return details
 
@@ -812,6 +964,90 @@ class SQLDatabase(object):
         return result
 
 
+class _SQLParseResult(object):
+
+    __slots__ = ('obfuscated', 'normalized', 'operation', 'target')
+
+    def __init__(self):
+        self.obfuscated = None
+        self.normalized = None
+        self.operation = None
+        self.target = None
+
+
+class SQLParseCache(object):
+
+    """Process wide, bounded LRU cache of the results of parsing SQL
+    statements. Entries are keyed on a digest of the SQL, the database
+    product and quoting style, and hold the obfuscated and normalized
+    forms of the SQL along with the operation and target, each filled in
+    the first time it is required by any SQLStatement for the same SQL.
+    Neither the keys nor the entries hold the SQL as given, so literals
+    in the SQL are not kept by the cache. SQL longer than the setting
+    agent_limits.sql_query_length_maximum is not cached. The maximum
+    number of entries is taken from the setting
+    agent_limits.sql_parse_cache_size, with zero disabling the cache.
+
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def lookup(self, sql, database):
+        limits = global_settings().agent_limits
+
+        if (limits.sql_parse_cache_size <= 0 or
+                len(sql) > limits.sql_query_length_maximum):
+            return _SQLParseResult()
+
+        digest = hashlib.sha1(sql.encode('utf-8', 'backslashreplace'))
+
+        key = (digest.digest(), getattr(database, 'product', None),
+                getattr(database, 'quoting_style', None))
+
+        with self._lock:
+            result = self._entries.pop(key, None)
+
+            if result is not None:
+                self._hits += 1
+                self._entries[key] = result
+                return result
+
+            self._misses += 1
+
+        result = _SQLParseResult()
+
+        with self._lock:
+            self._entries[key] = result
+
+            while len(self._entries) > limits.sql_parse_cache_size:
+                self._entries.popitem(last=False)
+
+        return result
+
+    def stats(self):
+        """Returns and resets the counts of cache hits and misses."""
+
+        with self._lock:
+            hits, misses = self._hits, self._misses
+            self._hits, self._misses = 0, 0
+
+        return hits, misses
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+sql_parse_cache = SQLParseCache()
+
+
 class SQLStatement(object):
 
     def __init__(self, sql, database=None):
@@ -821,6 +1057,7 @@ class SQLStatement(object):
         self._obfuscated = None
         self._normalized = None
         self._identifier = None
+        self._parsed = None
 
         if isinstance(sql, six.binary_type):
             try:
@@ -840,16 +1077,29 @@ class SQLStatement(object):
         self.sql = sql
         self.database = database
 
+    @property
+    def parsed(self):
+        if self._parsed is None:
+            self._parsed = sql_parse_cache.lookup(self.sql, self.database)
+        return self._parsed
+
     @property
     def operation(self):
         if self._operation is None:
-            self._operation = _parse_operation(self.uncommented)
+            parsed = self.parsed
+            if parsed.operation is None:
+                parsed.operation = _parse_operation(self.uncommented)
+            self._operation = parsed.operation
         return self._operation
 
     @property
     def target(self):
         if self._target is None:
-            self._target = _parse_target(self.uncommented, self.operation)
+            parsed = self.parsed
+            if parsed.target is None:
+                parsed.target = _parse_target(self.uncommented,
+                        self.operation)
+            self._target = parsed.target
         return self._target
 
     @property
@@ -861,14 +1111,20 @@ class SQLStatement(object):
     @property
     def obfuscated(self):
         if self._obfuscated is None:
-            self._obfuscated = _uncomment_sql(_obfuscate_sql(self.sql,
-                self.database))
+            parsed = self.parsed
+            if parsed.obfuscated is None:
+                parsed.obfuscated = _uncomment_sql(_obfuscate_sql(self.sql,
+                    self.database))
+            self._obfuscated = parsed.obfuscated
         return self._obfuscated
 
     @property
     def normalized(self):
         if self._normalized is None:
-            self._normalized = _normalize_sql(self.obfuscated)
+            parsed = self.parsed
+            if parsed.normalized is None:
+                parsed.normalized = _normalize_sql(self.obfuscated)
+            self._normalized = parsed.normalized
         return self._normalized
 
     @property
@@ -0,0 +1,283 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""This module implements a spool on disk for harvest payloads which could
+not be sent to the data collector, so they can be sent once the data
+collector can be reached again, including by a later run of the process.
+
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+from newrelic.common.encoding_utils import json_decode, json_encode
+from newrelic.core.internal_metrics import internal_count_metric, internal_metric
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_logger = logging.getLogger(__name__)
+
+# The spool is a file of fixed size mapped into memory. It starts with a
+# header giving the offsets of the first record and of the end of the
+# records, followed by the records themselves, oldest first. Each record
+# is the size of its body and the time it was added, followed by the
+# body, which is the compressed JSON for the payload.
+
+_HEADER = struct.Struct("!4sBQQ")
+_RECORD = struct.Struct("!Id")
+
+_MAGIC = b"NRHS"
+_VERSION = 1
+
+# Each process reporting for an application takes the first spool file
+# for the application which is not locked by another process. When a
+# process exits, the next process to start takes over its spool file and
+# sends what was left in it.
+
+MAX_SPOOL_FILES = 64
+
+
+class HarvestSpool(object):
+    """Bounded queue of harvest payloads held in a memory mapped file.
+
+    When adding a payload would take the spool beyond its maximum size,
+    the oldest payloads are dropped to make room. Payloads older than
+    the maximum age are dropped rather than being returned.
+
+    """
+
+    def __init__(self, fd, path, max_size, max_age):
+        self.path = path
+        self.max_size = max(max_size, _HEADER.size + _RECORD.size)
+        self.max_age = max_age
+
+        self._lock = threading.Lock()
+        self._removed = 0
+
+        self._file = os.fdopen(fd, "r+b")
+        self._file.truncate(self.max_size)
+        self._map = mmap.mmap(fd, self.max_size)
+
+        magic, version, start, end = _HEADER.unpack_from(self._map, 0)
+
+        if magic != _MAGIC or version != _VERSION or not _HEADER.size <= start <= end <= self.max_size:
+            start = end = _HEADER.size
+
+        self._start = start
+        self._end = end
+        self._write_header()
+
+    def __len__(self):
+        with self._lock:
+            count = 0
+            offset = self._start
+            while offset < self._end:
+                offset += _RECORD.size + _RECORD.unpack_from(self._map, offset)[0]
+                count += 1
+            return count
+
+    @property
+    def size(self):
+        return self._end - self._start
+
+    def _write_header(self):
+        _HEADER.pack_into(self._map, 0, _MAGIC, _VERSION, self._start, self._end)
+
+    def _drop_oldest(self):
+        length = _RECORD.unpack_from(self._map, self._start)[0]
+        self._start += _RECORD.size + length
+        self._removed += 1
+
+        if self._start == self._end:
+            self._start = self._end = _HEADER.size
+
+    def _expire(self, now):
+        while self._start < self._end:
+            timestamp = _RECORD.unpack_from(self._map, self._start)[1]
+            if now - timestamp <= self.max_age:
+                break
+
+            self._drop_oldest()
+            internal_count_metric("Supportability/Python/HarvestSpool/Dropped/Age", 1)
+
+    def append(self, method, run_id, payload):
+        """Adds the payload for a call of the method to the spool. Returns
+        False if the payload is too large to ever fit in the spool.
+
+        """
+
+        body = zlib.compress(json_encode((method, run_id, payload)).encode("utf-8"))
+        record_size = _RECORD.size + len(body)
+
+        if record_size > self.max_size - _HEADER.size:
+            internal_count_metric("Supportability/Python/HarvestSpool/Dropped/Size", 1)
+            _logger.debug("Payload for %r of %d bytes is too large for the harvest spool.", method, len(body))
+            return False
+
+        with self._lock:
+            self._expire(time.time())
+
+            while self.max_size - _HEADER.size - (self._end - self._start) < record_size:
+                self._drop_oldest()
+                internal_count_metric("Supportability/Python/HarvestSpool/Dropped/Size", 1)
+
+            # Move what is left of the records back to the start of the
+            # file when there isn't room for the new record at the end.
+
+            if self._end + record_size > self.max_size:
+                self._map.move(_HEADER.size, self._start, self._end - self._start)
+                self._end -= self._start - _HEADER.size
+                self._start = _HEADER.size
+
+            _RECORD.pack_into(self._map, self._end, len(body), time.time())
+            offset = self._end + _RECORD.size
+            self._map[offset : offset + len(body)] = body
+            self._end = offset + len(body)
+
+            self._write_header()
+
+            internal_count_metric("Supportability/Python/HarvestSpool/Spooled/%s" % method, 1)
+            internal_metric("Supportability/Python/HarvestSpool/Bytes", self._end - self._start)
+
+        return True
+
+    def peek(self):
+        """Returns the oldest payload in the spool as the tuple of a token,
+        the method, the run ID it was sent for and the payload, or None if
+        the spool is empty. The token is passed to pop() to remove the
+        payload once it has been sent.
+
+        """
+
+        with self._lock:
+            self._expire(time.time())
+
+            while self._start < self._end:
+                length = _RECORD.unpack_from(self._map, self._start)[0]
+                offset = self._start + _RECORD.size
+
+                try:
+                    method, run_id, payload = json_decode(
+                        zlib.decompress(self._map[offset : offset + length]).decode("utf-8")
+                    )
+                except Exception:
+                    _logger.warning("Discarding unreadable payload from the harvest spool %r.", self.path)
+                    self._drop_oldest()
+                    self._write_header()
+                    continue
+
+                return self._removed, method, run_id, payload
+
+            return None
+
+    def pop(self, token):
+        """Removes the oldest payload from the spool, if it is still the
+        payload which was returned by peek() along with the token.
+
+        """
+
+        with self._lock:
+            if token == self._removed and self._start < self._end:
+                self._drop_oldest()
+                self._write_header()
+
+    def close(self):
+        with self._lock:
+            self._map.flush()
+            self._map.close()
+            self._file.close()
+
+
+def _open_spool_file(directory, app_name):
+    digest = hashlib.sha256(app_name.encode("utf-8")).hexdigest()[:16]
+
+    if fcntl is None:
+        # Without file locking, spool files can't be safely handed on to
+        # later processes, so each process has its own.
+
+        slots = [os.getpid()]
+    else:
+        slots = range(MAX_SPOOL_FILES)
+
+    for slot in slots:
+        path = os.path.join(directory, "newrelic-harvest-%s-%d.spool" % (digest, slot))
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+
+        if fcntl is None:
+            return fd, path
+
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError):
+            os.close(fd)
+            continue
+
+        return fd, path
+
+    return None, None
+
+
+_spools = {}
+_spools_lock = threading.Lock()
+
+
+def harvest_spool(app_name, settings):
+    """Returns the harvest spool for the application, or None if the
+    harvest spool is not enabled or could not be opened. The spool is
+    opened the first time it is asked for and then kept open for the life
+    of the process, as a spool file can only be used by one process at a
+    time.
+
+    """
+
+    spool_settings = settings.harvest_spool
+
+    if not spool_settings.enabled or not spool_settings.directory:
+        return None
+
+    key = (spool_settings.directory, app_name)
+
+    with _spools_lock:
+        if key in _spools:
+            return _spools[key]
+
+        spool = None
+
+        try:
+            fd, path = _open_spool_file(spool_settings.directory, app_name)
+
+            if fd is None:
+                _logger.warning(
+                    "Unable to use the harvest spool for %r as all spool files in %r are in use by other processes.",
+                    app_name,
+                    spool_settings.directory,
+                )
+            else:
+                spool = HarvestSpool(fd, path, spool_settings.max_size, spool_settings.max_age)
+
+        except Exception:
+            _logger.exception("Unable to open the harvest spool for %r in %r.", app_name, spool_settings.directory)
+
+        _spools[key] = spool
+
+        return spool
@@ -0,0 +1,115 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""This module implements counts of the log lines recorded outside of
+transactions. Counting a line only updates counts held by the thread
+logging it, so that threads logging many lines do not contend on the lock
+for the custom metrics of the application. The counts are collected from
+all threads when the application is harvested.
+
+"""
+
+import threading
+import weakref
+from collections import defaultdict
+
+import newrelic.packages.six as six
+
+
+class _ThreadCounts(object):
+    # Only the thread which owns the counts updates them. The counts only
+    # ever go up, with the counts already reported being kept separately
+    # by the harvest, so the two never write to the same dictionary.
+
+    __slots__ = ("counts", "__weakref__")
+
+    def __init__(self):
+        self.counts = {}
+
+
+class LogLineCounts(object):
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _thread_counts(self):
+        try:
+            return self._local.counts
+        except AttributeError:
+            pass
+
+        thread_counts = self._local.counts = _ThreadCounts()
+
+        # A weak reference is held to the counts for the thread so that it
+        # can be seen when the thread has exited, at which point what is
+        # left to report is reported and the counts are discarded.
+
+        with self._lock:
+            self._threads.append((weakref.ref(thread_counts), thread_counts.counts, {}))
+
+        return thread_counts
+
+    def count(self, app_name, level_name):
+        """Counts a line logged at the level for the application."""
+
+        counts = self._thread_counts().counts
+        key = (app_name, level_name)
+        counts[key] = counts.get(key, 0) + 1
+
+    def harvest(self, app_name):
+        """Returns the metrics for the lines logged for the application
+        since the last harvest, as a list of tuples of metric name and
+        count.
+
+        """
+
+        levels = defaultdict(int)
+
+        with self._lock:
+            threads = []
+
+            for thread in self._threads:
+                thread_ref, counts, reported = thread
+
+                # Check whether the thread has exited before taking a copy
+                # of the counts, so no lines can be missed once it has.
+
+                exited = thread_ref() is None
+
+                for key, count in six.iteritems(counts.copy()):
+                    if key[0] != app_name:
+                        continue
+
+                    unreported = count - reported.get(key, 0)
+
+                    if unreported:
+                        levels[key[1]] += unreported
+                        reported[key] = count
+
+                if not exited or reported != counts:
+                    threads.append(thread)
+
+            self._threads = threads
+
+        if not levels:
+            return []
+
+        metrics = [("Logging/lines", sum(levels.values()))]
+        metrics.extend(("Logging/lines/%s" % level_name, count) for level_name, count in six.iteritems(levels))
+
+        return metrics
+
+
+log_line_counts = LogLineCounts()
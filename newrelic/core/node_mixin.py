@@ -16,6 +16,39 @@ import newrelic.core.attribute as attribute
 from newrelic.core.attribute_filter import DST_SPAN_EVENTS, DST_TRANSACTION_SEGMENTS
 
 
+class SpanEventReference(object):
+    """Deferred span event for a trace node. Only the node, the guid of
+    its parent and a context shared by all spans of the transaction are
+    kept, with the attribute dictionaries for the span event built the
+    first time the event is accessed. Iterating the reference yields the
+    intrinsics, user attributes and agent attributes of the span event.
+
+    """
+
+    __slots__ = ("node", "parent_guid", "context", "_event")
+
+    def __init__(self, node, parent_guid, context):
+        self.node = node
+        self.parent_guid = parent_guid
+        self.context = context
+        self._event = None
+
+    def render(self):
+        if self._event is None:
+            settings, base_attrs = self.context
+            self._event = self.node.span_event(settings, base_attrs=base_attrs, parent_guid=self.parent_guid)
+        return self._event
+
+    def __iter__(self):
+        return iter(self.render())
+
+    def __getitem__(self, index):
+        return self.render()[index]
+
+    def __len__(self):
+        return len(self.render())
+
+
 class GenericNodeMixin(object):
     @property
     def processed_user_attributes(self):
@@ -81,6 +114,13 @@ class GenericNodeMixin(object):
             ):
                 yield event
 
+    def span_event_references(self, context, parent_guid=None):
+        yield SpanEventReference(self, parent_guid, context)
+
+        for child in self.children:
+            for reference in child.span_event_references(context, parent_guid=self.guid):
+                yield reference
+
 
 class DatastoreNodeMixin(GenericNodeMixin):
     @property
@@ -35,6 +35,22 @@ _logger = logging.getLogger(__name__)
 
 AGENT_PACKAGE_DIRECTORY = os.path.dirname(newrelic.__file__) + "/"
 
+# The CPU time used by the profiler thread is what is measured against
+# the budget for the profiler, where the interpreter provides it.
+
+_thread_time = getattr(time, "thread_time", time.time)
+
+# Nodes in a call tree are looked up by a key combining the ID of the
+# parent node with the ID of the method for the node.
+
+_NODE_KEY_SHIFT = 32
+
+# Stack frames for generators and coroutines can be resumed from a
+# different caller, so a call stack containing them can change without
+# the innermost frame changing.
+
+_CO_RESUMABLE = 0x20 | 0x80 | 0x100 | 0x200
+
 
 class SessionState(object):
     RUNNING = 1
@@ -92,31 +108,6 @@ def format_stack_trace(frame, thread_category):
     return stack_trace
 
 
-def collect_stack_traces(include_nr_threads=False):
-    """Generator that yields the (thread category, stack trace) of all the
-    python threads.
-
-    """
-    for (txn, thread_id, thread_category, frame) in trace_cache().active_threads():
-
-        # Skip NR Threads unless explicitly requested.
-
-        if (thread_category == "AGENT") and (not include_nr_threads):
-            continue
-
-        stack_trace = format_stack_trace(frame, thread_category)
-
-        # Skip over empty stack traces. This is merely for optimization.
-        #
-        # It saves us from adding an empty deque to the txn obj, which will be
-        # discarded later on during call tree merge.
-
-        if not stack_trace:
-            continue
-
-        yield thread_category, stack_trace
-
-
 class ProfileSessionManager(object):
     """Singleton class that manages multiple profile sessions. Do NOT
     instantiate directly from this class. Instead use profile_session_manager()
@@ -149,6 +140,7 @@ class ProfileSessionManager(object):
         self._lock = threading.Lock()
         self.profile_agent_code = False
         self.sample_period_s = 0.1
+        self._sample_cost_s = None
 
     def start_profile_session(self, app_name, profile_id, stop_time, sample_period_s=0.1, profile_agent_code=False):
         """Start a new profiler session. If a full_profiler is already
@@ -243,15 +235,24 @@ class ProfileSessionManager(object):
 
         """
 
+        self._sample_cost_s = None
+
         while True:
+            start = _thread_time()
+
+            session = self.full_profile_session
+
+            if session:
+                for _, thread_id, category, frame in trace_cache().active_threads():
 
-            for category, stack in collect_stack_traces(self.profile_agent_code):
+                    # Skip NR Threads unless explicitly requested.
 
-                # Merge the stack_trace to the call tree only for
-                # full_profile_session.
+                    if category == "AGENT" and not self.profile_agent_code:
+                        continue
 
-                if self.full_profile_session:
-                    self.full_profile_session.update_call_tree(category, stack)
+                    session.update_call_tree_from_frame(category, frame, thread_id=thread_id)
+
+                session.finish_sample()
 
             self.update_profile_sessions()
 
@@ -261,7 +262,31 @@ class ProfileSessionManager(object):
                 self._profiler_thread_running = False
                 return
 
-            self._profiler_shutdown.wait(self.sample_period_s)
+            self._profiler_shutdown.wait(self.next_sample_period(_thread_time() - start))
+
+    def next_sample_period(self, sample_cost_s):
+        """Returns the time to wait before taking the next sample. This is
+        the sample period asked for, unless taking a sample costs so much
+        that the profiler would use more than the fraction of CPU time
+        given by the setting thread_profiler.cpu_budget, in which case the
+        time waited is increased to keep within the budget.
+
+        """
+
+        budget = global_settings().thread_profiler.cpu_budget
+
+        if budget <= 0:
+            return self.sample_period_s
+
+        # The cost of taking a sample is smoothed out, so that the sample
+        # period doesn't jump about when the odd sample is slow.
+
+        if self._sample_cost_s is None:
+            self._sample_cost_s = sample_cost_s
+        else:
+            self._sample_cost_s = 0.8 * self._sample_cost_s + 0.2 * sample_cost_s
+
+        return max(self.sample_period_s, self._sample_cost_s / budget - self._sample_cost_s)
 
     def update_profile_sessions(self):
         """Check the current time and decide if any of the profile sessions
@@ -296,12 +321,96 @@ class ProfileSession(object):
         self.reset_profile_data()
 
     def reset_profile_data(self):
-        self.call_buckets = {"REQUEST": {}, "AGENT": {}, "BACKGROUND": {}, "OTHER": {}}
-        self._node_list = []
+        # The call trees for all categories of thread are held in lists
+        # indexed by node ID, with the first nodes being the root of the
+        # call tree for each category.
+
+        self.call_buckets = {"REQUEST": 0, "AGENT": 1, "BACKGROUND": 2, "OTHER": 3}
+
+        self._node_method = [None] * len(self.call_buckets)
+        self._node_parent = [None] * len(self.call_buckets)
+        self._node_depth = [0] * len(self.call_buckets)
+        self._node_count = [0] * len(self.call_buckets)
+        self._node_ids = {}
+
+        # Methods are given an ID the first time they are seen, with the
+        # details for the method cached against the code object and line
+        # numbers, so they only need to be worked out once.
+
+        self._methods = []
+        self._method_ids = {}
+        self._code_details = {}
+
+        # The innermost frame for each thread in the last sample, and the
+        # node it was merged into, for threads which haven't moved on.
+
+        self._thread_leaves = {}
+        self._next_thread_leaves = {}
+
         self.start_time_s = time.time()
         self.sample_count = 0
         self.transaction_count = 0
 
+    def _method_id(self, method):
+        method_id = self._method_ids.get(method)
+
+        if method_id is None:
+            method_id = self._method_ids[method] = len(self._methods)
+            self._methods.append(method)
+
+        return method_id
+
+    def _frame_method_id(self, details, leaf, real_line):
+        method_id = details[5][leaf].get(real_line)
+
+        if method_id is None:
+            first_line = real_line if leaf else details[2]
+            method_id = self._method_id((details[0], details[1], first_line, real_line))
+            details[5][leaf][real_line] = method_id
+
+        return method_id
+
+    def _merge_call_stack(self, node_id, method_ids):
+        # Merges the methods of a call stack, root first, into the call
+        # tree below the node.
+
+        node_ids = self._node_ids
+        node_count = self._node_count
+
+        for method_id in method_ids:
+            key = (node_id << _NODE_KEY_SHIFT) | method_id
+
+            child_id = node_ids.get(key)
+
+            if child_id is None:
+                child_id = node_ids[key] = len(node_count)
+
+                self._node_method.append(method_id)
+                self._node_parent.append(node_id)
+                self._node_depth.append(self._node_depth[node_id] + 1)
+                node_count.append(0)
+
+            # The count for each node is incremented for each sample it
+            # is in. The depth of each node is used later when pruning
+            # nodes if go over the limit. Specifically, the deepest and
+            # least used nodes will be prune first.
+
+            node_count[child_id] += 1
+            node_id = child_id
+
+        return node_id
+
+    def _count_call_stack(self, node_id):
+        # Counts another sample for the node and the nodes above it.
+
+        node_parent = self._node_parent
+        node_count = self._node_count
+        roots = len(self.call_buckets)
+
+        while node_id >= roots:
+            node_count[node_id] += 1
+            node_id = node_parent[node_id]
+
     def update_call_tree(self, bucket_type, stack_trace):
         """Merge a single call stack trace into a call tree bucket. If
         no appropriate call tree is found then create a new call tree.
@@ -312,41 +421,122 @@ class ProfileSession(object):
 
         self.transaction_count += 1
 
-        depth = 1
         try:
-            bucket = self.call_buckets[bucket_type]
+            node_id = self.call_buckets[bucket_type]
+        except KeyError:
+            return False
+
+        self._merge_call_stack(node_id, [self._method_id(method) for method in stack_trace])
+
+        return True
+
+    def update_call_tree_from_frame(self, bucket_type, frame, include_agent_code=None, thread_id=None):
+        """Merge the call stack for a stack frame into a call tree bucket.
+        This gives the same result as formatting the stack frame with
+        format_stack_trace() and passing it to update_call_tree(), but
+        avoids formatting the same frames over again for each sample.
+        When the thread ID is given and the thread is still executing the
+        same line of the same frame as in the last sample, the call stack
+        is not looked at again.
+
+        """
+
+        try:
+            root_id = self.call_buckets[bucket_type]
         except KeyError:
             return False
 
-        for method in stack_trace:
-            call_tree = bucket.get(method)
+        if thread_id is not None:
+            leaf = self._thread_leaves.get(thread_id)
+
+            if leaf is not None and leaf[0] is frame and leaf[1] == frame.f_lineno and leaf[2] == root_id:
+                self._next_thread_leaves[thread_id] = leaf
+                self._count_call_stack(leaf[3])
+                self.transaction_count += 1
+                return True
+
+        if include_agent_code is None:
+            include_agent_code = bucket_type == "AGENT"
+
+        code_details = self._code_details
+        frame_method_id = self._frame_method_id
+        method_ids = []
+        resumable = False
+        leaf_frame = frame
+
+        while frame is not None:
+            code = frame.f_code
+
+            details = code_details.get(code)
+
+            if details is None:
+                filename = intern(code.co_filename)
+                details = code_details[code] = (
+                    filename,
+                    intern(code.co_name),
+                    code.co_firstlineno,
+                    filename.startswith(AGENT_PACKAGE_DIRECTORY),
+                    bool(code.co_flags & _CO_RESUMABLE),
+                    ({}, {}),
+                )
+
+            real_line = frame.f_lineno
+            frame = frame.f_back
+
+            resumable = resumable or details[4]
+
+            # Stack frames related to the agent instrumentation are
+            # dropped, as for format_stack_trace().
+
+            if details[3] and not include_agent_code:
+                continue
+
+            # The first frame kept adds the fake leaf node with the line
+            # number of where the code was executing at the point of the
+            # sample.
 
-            if call_tree is None:
-                call_tree = CallTree(method, depth=depth)
-                self._node_list.append(call_tree)
-                bucket[method] = call_tree
+            if not method_ids:
+                method_ids.append(frame_method_id(details, 1, real_line))
 
-            call_tree.call_count += 1
+            method_ids.append(frame_method_id(details, 0, real_line))
 
-            # The call depth is incremented on each recursive call so we
-            # know the depth of the call stack. We use this later when
-            # pruning nodes if go over the limit. Specifically, the deepest
-            # and least used nodes will be prune first.
+        # Skip over empty stack traces.
 
-            bucket = call_tree.children
-            depth += 1
+        if not method_ids:
+            return False
+
+        self.transaction_count += 1
+
+        method_ids.reverse()
+
+        node_id = self._merge_call_stack(root_id, method_ids)
+
+        if thread_id is not None and not resumable:
+            self._next_thread_leaves[thread_id] = (leaf_frame, leaf_frame.f_lineno, root_id, node_id)
 
         return True
 
+    def finish_sample(self):
+        """Called once all threads have been merged in for a sample, so
+        that only the frames of threads still running are held on to.
+
+        """
+
+        self._thread_leaves = self._next_thread_leaves
+        self._next_thread_leaves = {}
+
     def _prune_call_trees(self, limit):
         """Prune the number of profile nodes we send up to the data
         collector down to the specified limit. Done to ensure not
         sending so much data that gets reject for being over size limit.
+        Returns the set of IDs for the nodes to be ignored.
 
         """
 
-        if len(self._node_list) <= limit:
-            return
+        node_ids = range(len(self.call_buckets), len(self._node_count))
+
+        if len(node_ids) <= limit:
+            return set()
 
         # We sort the profile nodes based on call count, but also take
         # into consideration the depth of the node in the call tree.
@@ -370,10 +560,32 @@ class ProfileSession(object):
         # categories in UI, the duplicates only appear as one after the
         # UI merges them.
 
-        self._node_list.sort(key=lambda x: (x.call_count, -x.depth), reverse=True)
+        node_count = self._node_count
+        node_depth = self._node_depth
+
+        ordered = sorted(node_ids, key=lambda x: (node_count[x], -node_depth[x]), reverse=True)
 
-        for node in self._node_list[limit:]:
-            node.ignore = True
+        return set(ordered[limit:])
+
+    def _flatten(self, node_id, children):
+        filename, func_name, func_line, exec_line = self._methods[self._node_method[node_id]]
+
+        # func_line is the first line of a function and exec_line is the line
+        # inside that function that is currently being executed.  On the leaf
+        # nodes the exec_line will be different from the func_line. Such nodes
+        # are labeled with an @ sign in the second element of the tuple.
+
+        if func_line == exec_line:
+            method_data = (filename, "@%s#%s" % (func_name, func_line), exec_line)
+        else:
+            method_data = (filename, "%s#%s" % (func_name, func_line), exec_line)
+
+        return [
+            method_data,
+            self._node_count[node_id],
+            0,
+            [self._flatten(child_id, children) for child_id in children[node_id]],
+        ]
 
     def profile_data(self):
 
@@ -388,7 +600,19 @@ class ProfileSession(object):
         # and get rejected by the data collector.
 
         settings = global_settings()
-        self._prune_call_trees(settings.agent_limits.thread_profiler_nodes)
+        ignored = self._prune_call_trees(settings.agent_limits.thread_profiler_nodes)
+
+        # Nodes are listed against their parent node in the order they were
+        # added to the call tree. The root node of each call tree is always
+        # kept, but any other node being ignored is left out.
+
+        children = [[] for _ in self._node_count]
+
+        for node_id in range(len(self.call_buckets), len(self._node_count)):
+            parent_id = self._node_parent[node_id]
+
+            if parent_id < len(self.call_buckets) or node_id not in ignored:
+                children[parent_id].append(node_id)
 
         flat_tree = {}
         thread_count = 0
@@ -398,9 +622,9 @@ class ProfileSession(object):
             # Only flatten buckets that have data in them. No need to send
             # empty buckets.
 
-            if bucket:
-                flat_tree[category] = [x.flatten() for x in bucket.values()]
-                thread_count += len(bucket)
+            if children[bucket]:
+                flat_tree[category] = [self._flatten(x, children) for x in children[bucket]]
+                thread_count += len(children[bucket])
 
         # Construct the actual final data for sending. The actual call
         # data is turned into JSON, compressed and then base64 encoded at
@@ -438,30 +662,5 @@ class ProfileSession(object):
         return profile
 
 
-class CallTree(object):
-    def __init__(self, method_data, call_count=0, depth=1):
-        self.method_data = method_data
-        self.call_count = call_count
-        self.children = {}
-
-        self.depth = depth
-        self.ignore = False
-
-    def flatten(self):
-        filename, func_name, func_line, exec_line = self.method_data
-
-        # func_line is the first line of a function and exec_line is the line
-        # inside that function that is currently being executed.  On the leaf
-        # nodes the exec_line will be different from the func_line. Such nodes
-        # are labeled with an @ sign in the second element of the tuple.
-
-        if func_line == exec_line:
-            method_data = (filename, "@%s#%s" % (func_name, func_line), exec_line)
-        else:
-            method_data = (filename, "%s#%s" % (func_name, func_line), exec_line)
-
-        return [method_data, self.call_count, 0, [x.flatten() for x in self.children.values() if not x.ignore]]
-
-
 def profile_session_manager():
     return ProfileSessionManager.singleton()
@@ -69,6 +69,55 @@ def current_stack(skip=0, limit=None):
 
     return _format_stack_trace(_extract_stack(f, skip, limit))
 
+class StackTrace(object):
+    """Stack trace recorded as the code object and line number for each
+    frame, which is cheap to capture. The trace is only formatted the
+    first time it is iterated over, as most traces captured are never
+    reported. Iterating over the trace yields the same lines as returned
+    by current_stack().
+
+    """
+
+    __slots__ = ("frames", "_formatted")
+
+    def __init__(self, frames):
+        self.frames = frames
+        self._formatted = None
+
+    def __iter__(self):
+        return iter(self.format())
+
+    def format(self):
+        if self._formatted is None:
+            self._formatted = _format_stack_trace(
+                dict(source=code.co_filename, line=line, name=code.co_name) for code, line in self.frames
+            )
+        return self._formatted
+
+def current_stack_trace(skip=0, limit=None):
+    """Returns the stack trace for the point of call as a StackTrace,
+    deferring the formatting of the stack trace until it is needed.
+
+    """
+
+    if limit is None:
+        limit = _global_settings.max_stack_trace_lines
+
+    try:
+        f = sys._getframe(skip + 1)
+    except ValueError:
+        f = None
+
+    frames = []
+
+    while f is not None and len(frames) < limit:
+        frames.append((f.f_code, f.f_lineno))
+        f = f.f_back
+
+    frames.reverse()
+
+    return StackTrace(frames)
+
 def _extract_tb(tb, limit):
     if tb is None:
         return []
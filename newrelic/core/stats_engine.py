@@ -25,10 +25,12 @@ import logging
 import operator
 import random
 import sys
+import threading
 import time
 import traceback
 import warnings
 import zlib
+from array import array
 from heapq import heapify, heapreplace
 
 import newrelic.packages.six as six
@@ -54,6 +56,7 @@ from newrelic.core.error_collector import TracedError
 from newrelic.core.log_event_node import LogEventNode
 from newrelic.core.metric import TimeMetric
 from newrelic.core.stack_trace import exception_stack
+from newrelic.core.string_table import MetricNameTable
 
 _logger = logging.getLogger(__name__)
 
@@ -196,6 +199,340 @@ class CountStats(TimeStats):
         pass
 
 
+_TIME_STATS = 0
+_COUNT_STATS = 1
+_APDEX_STATS = 2
+
+
+class _StatsSlot(object):
+
+    """Handle onto one slot of a StatsArrayTable. Provides the same
+    interface as the list based stats classes, with reads and updates
+    going directly to the columns of the table.
+
+    """
+
+    __slots__ = ("_table", "_slot")
+
+    def __init__(self, table, slot):
+        self._table = table
+        self._slot = slot
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        return self._table.columns[index][self._slot]
+
+    def __setitem__(self, index, value):
+        self._table.columns[index][self._slot] = value
+
+    def __len__(self):
+        return 6
+
+    def __iter__(self):
+        slot = self._slot
+        return (column[slot] for column in self._table.columns)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __copy__(self):
+        return self._table.materialize(self._slot)
+
+    def __repr__(self):
+        return repr(self.__copy__())
+
+    def merge_stats(self, other):
+        self._table.merge_stats(self._slot, other)
+
+
+class TimeStatsSlot(_StatsSlot):
+
+    __slots__ = ()
+
+    call_count = property(operator.itemgetter(0))
+    total_call_time = property(operator.itemgetter(1))
+    total_exclusive_call_time = property(operator.itemgetter(2))
+    min_call_time = property(operator.itemgetter(3))
+    max_call_time = property(operator.itemgetter(4))
+    sum_of_squares = property(operator.itemgetter(5))
+
+    def merge_raw_time_metric(self, duration, exclusive=None):
+        self._table.merge_raw_time_metric(self._slot, duration, exclusive)
+
+    def merge_time_metric(self, metric):
+        self._table.merge_raw_time_metric(self._slot, metric.duration, metric.exclusive)
+
+    def merge_custom_metric(self, value):
+        self._table.merge_raw_time_metric(self._slot, value)
+
+    def merge_dimensional_metric(self, value):
+        self._table.merge_raw_time_metric(self._slot, value)
+
+
+class CountStatsSlot(TimeStatsSlot):
+
+    __slots__ = ()
+
+    def merge_raw_time_metric(self, duration, exclusive=None):
+        pass
+
+    def merge_time_metric(self, metric):
+        pass
+
+    def merge_custom_metric(self, value):
+        pass
+
+    def merge_dimensional_metric(self, value):
+        pass
+
+
+class ApdexStatsSlot(_StatsSlot):
+
+    __slots__ = ()
+
+    satisfying = property(operator.itemgetter(0))
+    tolerating = property(operator.itemgetter(1))
+    frustrating = property(operator.itemgetter(2))
+
+    def merge_apdex_metric(self, metric):
+        self._table.merge_apdex_metric(self._slot, metric)
+
+
+class StatsArrayTable(object):
+
+    """Table of metric stats stored as a struct of arrays. Rather than a
+    list of six values per metric, each of the six values is held in its
+    own array of doubles, indexed by a slot number allocated to the
+    metric. Slots released by pop() go onto a free list and are reused
+    by later metrics.
+
+    The table is keyed on the same integer metric identifiers as the
+    plain dictionary used by the stats engine and supports the subset of
+    the dictionary interface the stats engine relies on. Values handed
+    out are handles onto the slot which support the same merge methods
+    as TimeStats, CountStats and ApdexStats. Copying a handle gives back
+    one of those list based objects, which is how the data is turned
+    back into something that can be encoded when sending to the data
+    collector.
+
+    """
+
+    _slot_types = {
+        _TIME_STATS: TimeStatsSlot,
+        _COUNT_STATS: CountStatsSlot,
+        _APDEX_STATS: ApdexStatsSlot,
+    }
+
+    def __init__(self):
+        self.columns = tuple(array("d") for _ in range(6))
+        self.__kinds = array("b")
+        self.__slots = {}
+        self.__free = []
+
+    def __contains__(self, metric_id):
+        return metric_id in self.__slots
+
+    def __len__(self):
+        return len(self.__slots)
+
+    def __iter__(self):
+        return iter(self.__slots)
+
+    def __getitem__(self, metric_id):
+        slot = self.__slots[metric_id]
+        return self._slot_types[self.__kinds[slot]](self, slot)
+
+    def __setitem__(self, metric_id, stats):
+        slot = self.__slots.get(metric_id)
+        if slot is None:
+            slot = self.__allocate()
+            self.__slots[metric_id] = slot
+
+        if isinstance(stats, _StatsSlot):
+            kind = stats._table.__kinds[stats._slot]
+        elif isinstance(stats, ApdexStats):
+            kind = _APDEX_STATS
+        elif isinstance(stats, CountStats):
+            kind = _COUNT_STATS
+        else:
+            kind = _TIME_STATS
+
+        self.__kinds[slot] = kind
+        for column, value in zip(self.columns, stats):
+            column[slot] = value
+
+    def __allocate(self):
+        if self.__free:
+            return self.__free.pop()
+
+        for column in self.columns:
+            column.append(0.0)
+        self.__kinds.append(_TIME_STATS)
+
+        return len(self.__kinds) - 1
+
+    def get(self, metric_id, default=None):
+        slot = self.__slots.get(metric_id)
+        if slot is None:
+            return default
+        return self._slot_types[self.__kinds[slot]](self, slot)
+
+    def pop(self, metric_id, *default):
+        if metric_id not in self.__slots and default:
+            return default[0]
+
+        slot = self.__slots.pop(metric_id)
+        stats = self.materialize(slot)
+        self.__free.append(slot)
+
+        return stats
+
+    def clear(self):
+        self.__free.extend(six.itervalues(self.__slots))
+        self.__slots.clear()
+
+    def keys(self):
+        return self.__slots.keys()
+
+    def items(self):
+        get = self.__getitem__
+        return [(metric_id, get(metric_id)) for metric_id in self.__slots]
+
+    def values(self):
+        get = self.__getitem__
+        return [get(metric_id) for metric_id in self.__slots]
+
+    iteritems = items
+    itervalues = values
+
+    def materialize(self, slot):
+        """Returns the stats held in the slot as an instance of the list
+        based stats class for the type of metric.
+
+        """
+
+        c0, c1, c2, c3, c4, c5 = (column[slot] for column in self.columns)
+        kind = self.__kinds[slot]
+
+        if kind == _APDEX_STATS:
+            stats = ApdexStats(int(c0), int(c1), int(c2), c3)
+            stats[4] = c4
+            stats[5] = c5
+            return stats
+
+        if c0.is_integer():
+            c0 = int(c0)
+
+        if kind == _COUNT_STATS:
+            return CountStats(c0, c1, c2, c3, c4, c5)
+
+        return TimeStats(c0, c1, c2, c3, c4, c5)
+
+    def merge_raw_time_metric(self, slot, duration, exclusive=None):
+        if exclusive is None:
+            exclusive = duration
+
+        count, total, total_exclusive, minimum, maximum, sum_of_squares = self.columns
+
+        total[slot] += duration
+        total_exclusive[slot] += exclusive
+        minimum[slot] = count[slot] and min(minimum[slot], duration) or duration
+        maximum[slot] = max(maximum[slot], duration)
+        sum_of_squares[slot] += duration**2
+        count[slot] += 1
+
+    def merge_apdex_metric(self, slot, metric):
+        satisfying, tolerating, frustrating, apdex_min, apdex_max, _ = self.columns
+
+        satisfying[slot] += metric.satisfying
+        tolerating[slot] += metric.tolerating
+        frustrating[slot] += metric.frustrating
+
+        apdex_min[slot] = (
+            (satisfying[slot] or tolerating[slot] or frustrating[slot])
+            and min(apdex_min[slot], metric.apdex_t)
+            or metric.apdex_t
+        )
+        apdex_max[slot] = max(apdex_max[slot], metric.apdex_t)
+
+    def merge_stats(self, slot, other):
+        if isinstance(other, _StatsSlot):
+            other = list(other)
+
+        c0, c1, c2, c3, c4, c5 = self.columns
+        kind = self.__kinds[slot]
+
+        if kind == _COUNT_STATS:
+            c0[slot] += other[0]
+
+        elif kind == _APDEX_STATS:
+            c0[slot] += other[0]
+            c1[slot] += other[1]
+            c2[slot] += other[2]
+            c3[slot] = (c0[slot] or c1[slot] or c2[slot]) and min(c3[slot], other[3]) or other[3]
+            c4[slot] = max(c4[slot], other[3])
+
+        else:
+            c1[slot] += other[1]
+            c2[slot] += other[2]
+            c3[slot] = c0[slot] and min(c3[slot], other[3]) or other[3]
+            c4[slot] = max(c4[slot], other[4])
+            c5[slot] += other[5]
+            c0[slot] += other[0]
+
+    def merge_table(self, other):
+        """Merges all stats from another table keyed on the same metric
+        identifiers. This works column by column on the underlying arrays
+        without creating any intermediate stats objects.
+
+        """
+
+        slots = self.__slots
+        kinds = self.__kinds
+        other_kinds = other.__kinds
+        c0, c1, c2, c3, c4, c5 = self.columns
+        o0, o1, o2, o3, o4, o5 = other.columns
+
+        for metric_id, source in six.iteritems(other.__slots):
+            slot = slots.get(metric_id)
+
+            if slot is None:
+                slot = self.__allocate()
+                slots[metric_id] = slot
+                kinds[slot] = other_kinds[source]
+                c0[slot] = o0[source]
+                c1[slot] = o1[source]
+                c2[slot] = o2[source]
+                c3[slot] = o3[source]
+                c4[slot] = o4[source]
+                c5[slot] = o5[source]
+                continue
+
+            kind = kinds[slot]
+
+            if kind == _TIME_STATS:
+                c1[slot] += o1[source]
+                c2[slot] += o2[source]
+                c3[slot] = c0[slot] and min(c3[slot], o3[source]) or o3[source]
+                c4[slot] = max(c4[slot], o4[source])
+                c5[slot] += o5[source]
+                c0[slot] += o0[source]
+
+            elif kind == _COUNT_STATS:
+                c0[slot] += o0[source]
+
+            else:
+                c0[slot] += o0[source]
+                c1[slot] += o1[source]
+                c2[slot] += o2[source]
+                c3[slot] = (c0[slot] or c1[slot] or c2[slot]) and min(c3[slot], o3[source]) or o3[source]
+                c4[slot] = max(c4[slot], o3[source])
+
+
 class CustomMetrics(object):
 
     """Table for collection a set of value metrics."""
@@ -234,6 +571,19 @@ class CustomMetrics(object):
 
         return six.iteritems(self.__stats_table)
 
+    def merge_metric_stats(self, metrics):
+        """Merges in the accumulated stats for a set of value metrics, as
+        returned by metrics() for another table.
+
+        """
+
+        for name, other in metrics:
+            stats = self.__stats_table.get(name)
+            if stats is None:
+                self.__stats_table[name] = copy.copy(other)
+            else:
+                stats.merge_stats(other)
+
     def reset_metric_stats(self):
         """Resets the accumulated statistics back to initial state for
         metric data.
@@ -335,6 +685,55 @@ class DimensionalMetrics(object):
         return self.metrics()
 
 
+class MetricStatsTable(object):
+
+    """Read only view of the metrics held by a stats engine, keyed by
+    (name, scope) tuples. Internally the stats engine keys metrics on the
+    integer identifiers handed out by a metric name table, so the names
+    are only looked up again when accessed through this view.
+
+    """
+
+    def __init__(self, stats_table, metric_ids):
+        self.__stats_table = stats_table
+        self.__metric_ids = metric_ids
+
+    def __contains__(self, key):
+        return self.__metric_ids.lookup(*key) in self.__stats_table
+
+    def __getitem__(self, key):
+        metric_id = self.__metric_ids.lookup(*key)
+        if metric_id not in self.__stats_table:
+            raise KeyError(key)
+        return self.__stats_table[metric_id]
+
+    def __iter__(self):
+        return self.keys()
+
+    def __len__(self):
+        return len(self.__stats_table)
+
+    def get(self, key, default=None):
+        return self.__stats_table.get(self.__metric_ids.lookup(*key), default)
+
+    def keys(self):
+        key = self.__metric_ids.key
+        return (key(metric_id) for metric_id in list(self.__stats_table))
+
+    def values(self):
+        return six.itervalues(self.__stats_table)
+
+    def items(self):
+        key = self.__metric_ids.key
+        return ((key(metric_id), stats) for metric_id, stats in list(six.iteritems(self.__stats_table)))
+
+    def __str__(self):
+        return str(dict(self.items()))
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, dict(self.items()))
+
+
 class SlowSqlStats(list):
     def __init__(self):
         super(SlowSqlStats, self).__init__([0, 0, 0, 0, None])
@@ -429,29 +828,57 @@ class SampledDataSet(object):
         if priority is None:
             priority = random.random()  # nosec
 
-        entry = (priority, self.num_seen, sample)
-        if self.num_seen == self.capacity:
-            self.pq.append(entry)
-            self.heap = self.heap or heapify(self.pq) or True
-        elif not self.heap:
-            self.pq.append(entry)
-        else:
-            sampled = self.should_sample(priority)
-            if not sampled:
+        # Once the reservoir is full, samples which would not displace
+        # the minimal priority sample are rejected before an entry is
+        # created for them.
+
+        if self.heap:
+            if priority <= self.pq[0][0]:
                 return
-            heapreplace(self.pq, entry)
+            heapreplace(self.pq, (priority, self.num_seen, sample))
+            return
+
+        self.pq.append((priority, self.num_seen, sample))
+        if len(self.pq) >= self.capacity:
+            heapify(self.pq)
+            self.heap = True
 
     def merge(self, other_data_set, priority=None):
         if priority is None:
             priority = -1
 
-        for original_priority, seen_at, sample in other_data_set.pq:
-            self.add(sample, max(priority, original_priority))
+        num_seen = self.num_seen
+        self.num_seen += other_data_set.num_seen
 
-        # Merge the num_seen from the other_data_set, but take care not to
-        # double-count the actual samples of other_data_set since the .add
-        # call above will add one to self.num_seen each time
-        self.num_seen += other_data_set.num_seen - other_data_set.num_samples
+        if self.capacity <= 0 or not other_data_set.pq:
+            return
+
+        # Samples from the other data set are given sequence numbers as if
+        # they were added after everything already seen here. This is a
+        # single top-k selection over the combined samples: the reservoir
+        # is filled up to capacity and heapified once, after which
+        # samples which do not beat the minimal priority are rejected
+        # before an entry is created for them.
+
+        pq = self.pq
+        samples = iter(other_data_set.pq)
+
+        if not self.heap:
+            for original_priority, _, sample in samples:
+                num_seen += 1
+                pq.append((max(priority, original_priority), num_seen, sample))
+                if len(pq) >= self.capacity:
+                    heapify(pq)
+                    self.heap = True
+                    break
+
+        if self.heap:
+            for original_priority, _, sample in samples:
+                num_seen += 1
+                if original_priority < priority:
+                    original_priority = priority
+                if original_priority > pq[0][0]:
+                    heapreplace(pq, (original_priority, num_seen, sample))
 
 
 class LimitedDataSet(list):
@@ -532,6 +959,7 @@ class StatsEngine(object):
 
     def __init__(self):
         self.__settings = None
+        self.__metric_ids = MetricNameTable()
         self.__stats_table = {}
         self.__dimensional_stats_table = DimensionalMetrics()
         self._transaction_events = SampledDataSet()
@@ -556,7 +984,11 @@ class StatsEngine(object):
 
     @property
     def stats_table(self):
-        return self.__stats_table
+        return MetricStatsTable(self.__stats_table, self.__metric_ids)
+
+    @property
+    def metric_ids(self):
+        return self.__metric_ids
 
     @property
     def dimensional_stats_table(self):
@@ -621,14 +1053,16 @@ class StatsEngine(object):
         # not make a difference to the data collector which treats None
         # as an empty string anyway.
 
-        key = (metric.name, "")
-        stats = self.__stats_table.get(key)
+        metric_id = self.__metric_ids.intern(metric.name)
+        stats = self.__stats_table.get(metric_id)
         if stats is None:
             stats = ApdexStats(apdex_t=metric.apdex_t)
-            self.__stats_table[key] = stats
-        stats.merge_apdex_metric(metric)
+            stats.merge_apdex_metric(metric)
+            self.__stats_table[metric_id] = stats
+        else:
+            stats.merge_apdex_metric(metric)
 
-        return key
+        return (metric.name, "")
 
     def record_apdex_metrics(self, metrics):
         """Record the apdex metrics supplied by the iterable for a
@@ -655,8 +1089,8 @@ class StatsEngine(object):
         # Scope is forced to be empty string if None as
         # scope of None is reserved for apdex metrics.
 
-        key = (metric.name, metric.scope or "")
-        stats = self.__stats_table.get(key)
+        metric_id = self.__metric_ids.intern(metric.name, metric.scope or "")
+        stats = self.__stats_table.get(metric_id)
         if stats is None:
             stats = TimeStats(
                 call_count=1,
@@ -666,11 +1100,11 @@ class StatsEngine(object):
                 max_call_time=metric.duration,
                 sum_of_squares=metric.duration**2,
             )
-            self.__stats_table[key] = stats
+            self.__stats_table[metric_id] = stats
         else:
             stats.merge_time_metric(metric)
 
-        return key
+        return (metric.name, metric.scope or "")
 
     def record_time_metrics(self, metrics):
         """Record the time metrics supplied by the iterable for a single
@@ -970,7 +1404,7 @@ class StatsEngine(object):
         from prior value metrics with the same name.
 
         """
-        key = (name, "")
+        metric_id = self.__metric_ids.intern(name)
 
         if isinstance(value, dict):
             if len(value) == 1 and "count" in value:
@@ -980,13 +1414,13 @@ class StatsEngine(object):
         else:
             new_stats = TimeStats(1, value, value, value, value, value**2)
 
-        stats = self.__stats_table.get(key)
+        stats = self.__stats_table.get(metric_id)
         if stats is None:
-            self.__stats_table[key] = new_stats
+            self.__stats_table[metric_id] = new_stats
         else:
             stats.merge_stats(new_stats)
 
-        return key
+        return (name, "")
 
     def record_custom_metrics(self, metrics):
         """Record the value metrics supplied by the iterable, merging
@@ -1152,7 +1586,7 @@ class StatsEngine(object):
             self.__transaction_errors = self.__transaction_errors[: settings.agent_limits.errors_per_harvest]
 
         if error_collector.capture_events and error_collector.enabled and settings.collect_error_events:
-            events = transaction.error_events(self.__stats_table)
+            events = transaction.error_events(self.stats_table)
             for event in events:
                 self._error_events.add(event, priority=transaction.priority)
 
@@ -1190,11 +1624,11 @@ class StatsEngine(object):
         # while transactions from regular requests are saved in another.
 
         if transaction.synthetics_resource_id:
-            event = transaction.transaction_event(self.__stats_table)
+            event = transaction.transaction_event(self.stats_table)
             self._synthetics_events.add(event)
 
         elif settings.collect_analytics_events and settings.transaction_events.enabled:
-            event = transaction.transaction_event(self.__stats_table)
+            event = transaction.transaction_event(self.stats_table)
             self._transaction_events.add(event, priority=transaction.priority)
 
         # Merge in custom events
@@ -1214,7 +1648,7 @@ class StatsEngine(object):
                 for event in transaction.span_protos(settings):
                     self._span_stream.put(event)
             elif transaction.sampled:
-                for event in transaction.span_events(self.__settings):
+                for event in transaction.span_event_references(self.__settings):
                     self._span_events.add(event, priority=transaction.priority)
 
         # Merge in log events
@@ -1329,15 +1763,20 @@ class StatsEngine(object):
         # renaming rules, the metrics are re-aggregated to collapse the
         # metrics with same names after the renaming.
 
+        # Metrics are keyed on integer identifiers internally and this
+        # is the point at which they are turned back into names.
+
+        stats_table = self.stats_table
+
         if self.__settings.debug.log_raw_metric_data:
             _logger.info(
                 "Raw metric data for harvest of %r is %r.",
                 self.__settings.app_name,
-                list(six.iteritems(self.__stats_table)),
+                list(stats_table.items()),
             )
 
         if normalizer is not None:
-            for key, value in six.iteritems(self.__stats_table):
+            for key, value in stats_table.items():
                 normalized_name, ignored = normalizer(key[0])
                 if ignored:
                     continue
@@ -1349,7 +1788,7 @@ class StatsEngine(object):
                 else:
                     stats.merge_stats(value)
         else:
-            normalized_stats = self.__stats_table
+            normalized_stats = dict(stats_table.items())
 
         if self.__settings.debug.log_normalized_metric_data:
             _logger.info(
@@ -1360,6 +1799,8 @@ class StatsEngine(object):
 
         for key, value in six.iteritems(normalized_stats):
             key = dict(name=key[0], scope=key[1])
+            if not isinstance(value, list):
+                value = copy.copy(value)
             result.append((key, value))
 
         return result
@@ -1467,7 +1908,7 @@ class StatsEngine(object):
             params = slow_sql_node.params or {}
 
             if slow_sql_node.stack_trace:
-                params["backtrace"] = slow_sql_node.stack_trace
+                params["backtrace"] = list(slow_sql_node.stack_trace)
 
             explain_plan_data = explain_plan(
                 connections,
@@ -1736,9 +2177,14 @@ class StatsEngine(object):
 
         """
 
-        self.__stats_table = {}
+        self.__stats_table = self._create_stats_table()
         self.__dimensional_stats_table.reset_metric_stats()
 
+    def _create_stats_table(self):
+        if self.__settings is not None and self.__settings.metric_stats_table == "array":
+            return StatsArrayTable()
+        return {}
+
     def reset_transaction_events(self):
         """Resets the accumulated statistics back to initial state for
         sample analytics data.
@@ -1828,7 +2274,7 @@ class StatsEngine(object):
         self.__slow_transaction = None
         self.__synthetics_transactions = []
         self.__sql_stats_table = {}
-        self.__stats_table = {}
+        self.__stats_table = self._create_stats_table()
         self.__transaction_errors = []
 
     def harvest_snapshot(self, flexible=False):
@@ -1861,6 +2307,15 @@ class StatsEngine(object):
             allowlist_stats, other_stats = snapshot, self
             self.reset_non_event_types()
 
+            # The metric name table only ever grows. Once all metrics
+            # have been handed off to the snapshot, start over with a new
+            # table if it has grown too large, so that metric names which
+            # are no longer in use do not accumulate forever. Any data
+            # still referring to the old table is merged back by name.
+
+            if len(self.__metric_ids) > self.__settings.agent_limits.metric_name_table_size:
+                self.__metric_ids = MetricNameTable()
+
         event_harvest_allowlist = self.__settings.event_harvest_config.allowlist
 
         # Iterate through harvest types. If they are in the list of types to
@@ -1909,6 +2364,27 @@ class StatsEngine(object):
         self._merge_sql(snapshot)
         self._merge_traces(snapshot)
 
+    def merge_shard(self, shard):
+        """Merges data accumulated from many transactions into a shard of
+        the stats engine. Unlike merge(), the shard is not assumed to hold
+        events from only a single transaction.
+        """
+
+        if not self.__settings:
+            return
+
+        self.merge_metric_stats(shard)
+        self._merge_transaction_events(shard, rollback=True)
+        self._merge_synthetics_events(shard, rollback=True)
+        self._merge_error_events(shard)
+        self._merge_error_traces(shard)
+        self._merge_custom_events(shard)
+        self._merge_ml_events(shard)
+        self._merge_span_events(shard)
+        self._merge_log_events(shard)
+        self._merge_sql(shard)
+        self._merge_traces(shard)
+
     def rollback(self, snapshot):
         """Performs a "rollback" merge after a failed harvest. Snapshot is a
         copy of the main StatsEngine data that we attempted to harvest, but
@@ -1943,10 +2419,30 @@ class StatsEngine(object):
         if not self.__settings:
             return
 
-        for key, other in six.iteritems(snapshot.__stats_table):
-            stats = self.__stats_table.get(key)
+        # Work areas and snapshots share the metric name table of the
+        # stats engine they were created from, so can be merged on the
+        # integer identifiers directly. Anything else, such as data from
+        # before the metric name table was last replaced, has to be
+        # mapped across by name.
+
+        if snapshot.__metric_ids is self.__metric_ids:
+            if isinstance(self.__stats_table, StatsArrayTable) and isinstance(
+                snapshot.__stats_table, StatsArrayTable
+            ):
+                self.__stats_table.merge_table(snapshot.__stats_table)
+                return
+
+            other_stats = six.iteritems(snapshot.__stats_table)
+        else:
+            intern = self.__metric_ids.intern
+            other_stats = (
+                (intern(*key), other) for key, other in snapshot.stats_table.items()
+            )
+
+        for metric_id, other in other_stats:
+            stats = self.__stats_table.get(metric_id)
             if not stats:
-                self.__stats_table[key] = other
+                self.__stats_table[metric_id] = other
             else:
                 stats.merge_stats(other)
 
@@ -2067,10 +2563,10 @@ class StatsEngine(object):
             return
 
         for name, other in metrics:
-            key = (name, "")
-            stats = self.__stats_table.get(key)
+            metric_id = self.__metric_ids.intern(name)
+            stats = self.__stats_table.get(metric_id)
             if not stats:
-                self.__stats_table[key] = other
+                self.__stats_table[metric_id] = other
             else:
                 stats.merge_stats(other)
 
@@ -2103,6 +2599,38 @@ class StatsEngine(object):
         return copy
 
 
+class StatsEngineShard(object):
+
+    """One stripe of transaction data accumulated between harvests. Each
+    shard has its own lock so that threads recording transactions into
+    different shards do not contend with each other. Shards are combined
+    into the main stats engine at harvest time.
+
+    """
+
+    def __init__(self, stats_engine):
+        self.lock = threading.Lock()
+        self.stats_engine = stats_engine
+        self.transaction_count = 0
+        self.last_transaction = 0.0
+
+    def swap(self, stats_engine):
+        """Replaces the accumulated data with the empty stats engine
+        supplied, returning the prior stats engine, transaction count and
+        time of the last transaction.
+
+        """
+
+        with self.lock:
+            result = (self.stats_engine, self.transaction_count, self.last_transaction)
+
+            self.stats_engine = stats_engine
+            self.transaction_count = 0
+            self.last_transaction = 0.0
+
+        return result
+
+
 class StatsEngineSnapshot(StatsEngine):
     def reset_transaction_events(self):
         self._transaction_events = None
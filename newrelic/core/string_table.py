@@ -12,6 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import threading
+
+
 class StringTable(object):
 
     def __init__(self):
@@ -27,3 +30,47 @@ class StringTable(object):
 
     def values(self):
         return self.__values
+
+
+class MetricNameTable(object):
+
+    """Maps metric (name, scope) pairs to small integer identifiers.
+
+    Lookups go through a dictionary per scope so that the hash of the
+    name and scope strings, which Python caches on the string objects,
+    is all that is needed to find an identifier. No key tuple has to be
+    allocated and hashed for every metric recorded. Identifiers are only
+    ever appended so a reader never needs to hold the lock.
+
+    """
+
+    def __init__(self):
+        self.__keys = []
+        self.__mapping = {}
+        self.__lock = threading.Lock()
+
+    def intern(self, name, scope=""):
+        try:
+            return self.__mapping[scope][name]
+        except KeyError:
+            pass
+
+        with self.__lock:
+            names = self.__mapping.setdefault(scope, {})
+            metric_id = names.get(name)
+            if metric_id is None:
+                metric_id = len(self.__keys)
+                self.__keys.append((name, scope))
+                names[name] = metric_id
+            return metric_id
+
+    def lookup(self, name, scope=""):
+        names = self.__mapping.get(scope)
+        if names is not None:
+            return names.get(name)
+
+    def key(self, metric_id):
+        return self.__keys[metric_id]
+
+    def __len__(self):
+        return len(self.__keys)
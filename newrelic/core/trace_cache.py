@@ -104,6 +104,13 @@ class TraceCache(MutableMapping):
     def __init__(self):
         self._cache = weakref.WeakValueDictionary()
 
+        # Greenlets and asyncio tasks for which an ID has been handed out
+        # by current_thread_id(). Entries are removed automatically when
+        # the greenlet or task is destroyed, so an ID found in here is
+        # always that of a live coroutine and never of a real thread.
+
+        self._coroutines = weakref.WeakValueDictionary()
+
     def __repr__(self):
         return "<%s object at 0x%x %s>" % (self.__class__.__name__, id(self), str(dict(self.items())))
 
@@ -128,15 +135,40 @@ class TraceCache(MutableMapping):
 
             current = self.greenlet.getcurrent()
             if current is not None and current.parent:
-                return id(current)
+                return self._coroutine_id(current)
 
         if self.asyncio:
             task = current_task(self.asyncio)
             if task is not None:
-                return id(task)
+                return self._coroutine_id(task)
 
         return thread.get_ident()
 
+    def _coroutine_id(self, coroutine):
+        """Returns the ID for a greenlet or task, recording that the ID
+        corresponds to a coroutine rather than a real thread.
+
+        """
+
+        coroutine_id = id(coroutine)
+
+        if coroutine_id not in self._coroutines:
+            try:
+                self._coroutines[coroutine_id] = coroutine
+            except TypeError:
+                # Object does not support weak references.
+                pass
+
+        return coroutine_id
+
+    def is_coroutine_id(self, thread_id):
+        """Returns whether the ID was handed out by current_thread_id()
+        for a greenlet or task rather than for a real thread.
+
+        """
+
+        return thread_id in self._coroutines
+
     def task_start(self, task):
         trace = self.current_trace()
         if trace:
@@ -261,24 +293,21 @@ class TraceCache(MutableMapping):
         self[thread_id] = trace
 
         # We judge whether we are actually running in a coroutine by
-        # seeing if the current thread ID is actually listed in the set
-        # of all current frames for executing threads. If we are
-        # executing within a greenlet, then thread.get_ident() will
-        # return the greenlet identifier. This will not be a key in
-        # dictionary of all current frames because that will still be
-        # the original standard thread which all greenlets are running
-        # within.
+        # checking whether the thread ID was handed out for a greenlet
+        # or task by current_thread_id(). This avoids having to build
+        # the set of current frames for all executing threads, which
+        # would make the cost of saving a trace grow with the number of
+        # threads in the process.
 
         trace._greenlet = None
 
-        if hasattr(sys, "_current_frames"):
-            if thread_id not in sys._current_frames():
-                if self.greenlet:
-                    trace._greenlet = weakref.ref(self.greenlet.getcurrent())
+        if self.is_coroutine_id(thread_id):
+            if self.greenlet:
+                trace._greenlet = weakref.ref(self.greenlet.getcurrent())
 
-                if self.asyncio and not hasattr(trace, "_task"):
-                    task = current_task(self.asyncio)
-                    trace._task = task
+            if self.asyncio and not hasattr(trace, "_task"):
+                task = current_task(self.asyncio)
+                trace._task = task
 
     def pop_current(self, trace):
         """Restore the trace's parent under the thread ID of the current
@@ -658,3 +658,21 @@ class TransactionNode(_TransactionNode):
             attr_class=attr_class,
         ):
             yield event
+
+    def span_event_references(self, settings):
+        """Yields references to the span events of the transaction. The
+        attributes of each span event are only built if the reference is
+        accessed, which for span events evicted from the reservoir before
+        harvest is never.
+
+        """
+
+        base_attrs = {
+            "transactionId": self.guid,
+            "traceId": self.trace_id,
+            "sampled": self.sampled,
+            "priority": self.priority,
+        }
+
+        for reference in self.root.span_event_references((settings, base_attrs), parent_guid=self.parent_span):
+            yield reference
@@ -0,0 +1,169 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""This module implements a background recorder which takes completed
+transaction nodes off the request thread and records them against the
+application from a dedicated thread.
+
+"""
+
+import collections
+import logging
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+
+class TransactionRecorder(object):
+    """Bounded queue of transaction nodes drained by a daemon thread.
+
+    When the queue is full, the overflow policy decides what happens to
+    the next transaction. With the "drop" policy the transaction is
+    discarded and counted as dropped. With the "block" policy the caller
+    waits for space to become available in the queue.
+
+    """
+
+    def __init__(self, name, record, maxlen, overflow_policy="drop"):
+        self._name = name
+        self._record = record
+        self._maxlen = max(maxlen, 1)
+        self._block = overflow_policy == "block"
+
+        self._queue = collections.deque()
+        self._notify = threading.Condition()
+        self._shutdown = False
+        self._pending = 0
+
+        self._seen = 0
+        self._dropped = 0
+
+        self._thread = None
+
+    @property
+    def active(self):
+        return self._thread is not None and not self._shutdown
+
+    def start(self):
+        with self._notify:
+            if self._thread is not None:
+                return
+
+            self._thread = threading.Thread(target=self._run, name="NR-Transaction-Recorder/%s" % self._name)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def put(self, item):
+        with self._notify:
+            if self._shutdown:
+                return False
+
+            self._seen += 1
+
+            if self._block:
+                while len(self._queue) >= self._maxlen and not self._shutdown:
+                    self._notify.wait()
+
+                if self._shutdown:
+                    self._dropped += 1
+                    return False
+
+            elif len(self._queue) >= self._maxlen:
+                self._dropped += 1
+                return False
+
+            self._queue.append(item)
+            self._pending += 1
+            self._notify.notify_all()
+
+        return True
+
+    def flush(self, timeout=None):
+        """Waits until all transactions queued so far have been recorded.
+        Returns whether the queue was fully drained within the timeout.
+
+        """
+
+        with self._notify:
+            if self._thread is None or threading.current_thread() is self._thread:
+                return not self._pending
+
+            if timeout is None:
+                while self._pending and not self._shutdown:
+                    self._notify.wait()
+            else:
+                self._wait_for(lambda: not self._pending or self._shutdown, timeout)
+
+            return not self._pending
+
+    def _wait_for(self, predicate, timeout):
+        # Condition.wait_for() is not available on Python 2.7.
+
+        end_time = time.time() + timeout
+        while not predicate():
+            remaining = end_time - time.time()
+            if remaining <= 0.0:
+                break
+            self._notify.wait(remaining)
+
+    def shutdown(self, timeout=None):
+        if timeout:
+            self.flush(timeout)
+
+        with self._notify:
+            self._shutdown = True
+            self._queue.clear()
+            self._pending = 0
+            self._notify.notify_all()
+
+    def stats(self):
+        with self._notify:
+            seen, dropped = self._seen, self._dropped
+            self._seen, self._dropped = 0, 0
+
+        return seen, dropped
+
+    def __len__(self):
+        return len(self._queue)
+
+    def _run(self):
+        while True:
+            with self._notify:
+                while not self._queue and not self._shutdown:
+                    self._notify.wait()
+
+                if self._shutdown:
+                    return
+
+                item = self._queue.popleft()
+
+                # Wake up any callers blocked waiting for space in the
+                # queue under the "block" overflow policy.
+
+                self._notify.notify_all()
+
+            try:
+                self._record(item)
+            except Exception:
+                _logger.exception(
+                    "Unexpected exception when recording a transaction "
+                    "from the background recorder thread. Please report "
+                    "this problem to New Relic support for further "
+                    "investigation."
+                )
+            finally:
+                with self._notify:
+                    self._pending = max(self._pending - 1, 0)
+                    self._notify.notify_all()
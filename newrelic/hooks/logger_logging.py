@@ -17,6 +17,7 @@ from newrelic.api.time_trace import get_linking_metadata
 from newrelic.api.transaction import current_transaction, record_log_event
 from newrelic.common.object_wrapper import function_wrapper, wrap_function_wrapper
 from newrelic.core.config import global_settings
+from newrelic.core.log_line_counts import log_line_counts
 
 try:
     from urllib import quote
@@ -26,6 +27,18 @@ except ImportError:
 
 IGNORED_LOG_RECORD_KEYS = set(["message", "msg"])
 
+# Metric names for the lines logged at each level, so they needn't be
+# formatted again for every line.
+
+_LEVEL_METRIC_NAMES = {}
+
+
+def _level_metric_name(level_name):
+    name = _LEVEL_METRIC_NAMES.get(level_name)
+    if name is None:
+        name = _LEVEL_METRIC_NAMES[level_name] = "Logging/lines/%s" % level_name
+    return name
+
 
 def add_nr_linking_metadata(message):
     available_metadata = get_linking_metadata()
@@ -68,12 +81,15 @@ def wrap_callHandlers(wrapped, instance, args, kwargs):
         if settings.application_logging.metrics and settings.application_logging.metrics.enabled:
             if transaction:
                 transaction.record_custom_metric("Logging/lines", {"count": 1})
-                transaction.record_custom_metric("Logging/lines/%s" % level_name, {"count": 1})
+                transaction.record_custom_metric(_level_metric_name(level_name), {"count": 1})
             else:
+                # Lines logged outside of a transaction are counted by the
+                # thread, with the counts added to the metrics for the
+                # application when it is harvested.
+
                 application = application_instance(activate=False)
                 if application and application.enabled:
-                    application.record_custom_metric("Logging/lines", {"count": 1})
-                    application.record_custom_metric("Logging/lines/%s" % level_name, {"count": 1})
+                    log_line_counts.count(application.name, level_name)
 
         if settings.application_logging.forwarding and settings.application_logging.forwarding.enabled:
             try:
@@ -82,9 +98,12 @@ def wrap_callHandlers(wrapped, instance, args, kwargs):
                     # Allow python to convert the message to a string and template it with args.
                     message = record.getMessage()
 
-                # Grab and filter context attributes from log record
-                record_attrs = vars(record)
-                context_attrs = {k: record_attrs[k] for k in record_attrs if k not in IGNORED_LOG_RECORD_KEYS}
+                # Grab and filter context attributes from log record, only
+                # where they will be kept.
+                context_attrs = None
+                if settings.application_logging.forwarding.context_data.enabled:
+                    record_attrs = vars(record)
+                    context_attrs = {k: record_attrs[k] for k in record_attrs if k not in IGNORED_LOG_RECORD_KEYS}
 
                 record_log_event(
                     message=message, level=level_name, timestamp=int(record.created * 1000), attributes=context_attrs
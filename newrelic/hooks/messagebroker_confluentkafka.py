@@ -18,11 +18,16 @@ from newrelic.api.application import application_instance
 from newrelic.api.error_trace import wrap_error_trace
 from newrelic.api.function_trace import FunctionTraceWrapper
 from newrelic.api.message_trace import MessageTrace
-from newrelic.api.message_transaction import MessageTransaction
+from newrelic.api.message_transaction import (
+    MessageBatchTransaction,
+    MessageTransaction,
+)
 from newrelic.api.time_trace import notice_error
 from newrelic.api.transaction import current_transaction
+from newrelic.common.encoding_utils import payload_size
 from newrelic.common.object_wrapper import function_wrapper, wrap_function_wrapper
 from newrelic.common.package_version_utils import get_package_version
+from newrelic.core.config import global_settings
 
 _logger = logging.getLogger(__name__)
 
@@ -33,6 +38,8 @@ HEARTBEAT_RECEIVE = "MessageBroker/Kafka/Heartbeat/Receive"
 HEARTBEAT_SESSION_TIMEOUT = "MessageBroker/Kafka/Heartbeat/SessionTimeout"
 HEARTBEAT_POLL_TIMEOUT = "MessageBroker/Kafka/Heartbeat/PollTimeout"
 
+DISTRIBUTED_TRACE_HEADERS = (MessageTrace.cat_id_key, "newrelic", "traceparent")
+
 
 def wrap_Producer_produce(wrapped, instance, args, kwargs):
     transaction = current_transaction()
@@ -85,6 +92,10 @@ def wrap_Producer_produce(wrapped, instance, args, kwargs):
 
 
 def wrap_Consumer_poll(wrapped, instance, args, kwargs):
+    batch_settings = global_settings().message_tracer.consumer_batch
+    if batch_settings.enabled:
+        return _wrap_Consumer_batch(wrapped, instance, args, kwargs, batch_settings, single=True)
+
     # This wrapper can be called either outside of a transaction, or
     # within the context of an existing transaction.  There are 4
     # possibilities we need to handle: (Note that this is similar to
@@ -132,8 +143,7 @@ def wrap_Consumer_poll(wrapped, instance, args, kwargs):
         library = "Kafka"
         destination_type = "Topic"
         destination_name = record.topic()
-        received_bytes = len(str(record.value()).encode("utf-8"))
-        message_count = 1
+        received_bytes = payload_size(record.value())
 
         headers = record.headers()
         headers = dict(headers) if headers else {}
@@ -162,15 +172,109 @@ def wrap_Consumer_poll(wrapped, instance, args, kwargs):
             # Don't add metrics if there was an inactive transaction.
             # Name the metrics using the same format as the transaction, but in case the active transaction
             # was an existing one and not a message transaction, reproduce the naming logic here.
-            group = "Message/%s/%s" % (library, destination_type)
-            name = "Named/%s" % destination_name
-            transaction.record_custom_metric("%s/%s/Received/Bytes" % (group, name), received_bytes)
-            transaction.record_custom_metric("%s/%s/Received/Messages" % (group, name), message_count)
-            transaction.add_messagebroker_info("Confluent-Kafka", get_package_version("confluent-kafka"))
+            _record_received_message(transaction, destination_name, received_bytes)
 
     return record
 
 
+def wrap_Consumer_consume(wrapped, instance, args, kwargs):
+    batch_settings = global_settings().message_tracer.consumer_batch
+    if not batch_settings.enabled:
+        return wrapped(*args, **kwargs)
+
+    return _wrap_Consumer_batch(wrapped, instance, args, kwargs, batch_settings, single=False)
+
+
+def _wrap_Consumer_batch(wrapped, instance, args, kwargs, batch_settings, single):
+    # In batch mode a transaction is started for the messages returned by
+    # a call to consume(), or for a run of messages returned by calls to
+    # poll(), rather than for each message. The transaction for a run of
+    # messages from poll() ends when no message is returned, or when it
+    # has reached the maximum number of messages.
+
+    batch = getattr(instance, "_nr_transaction", None)
+    if batch is not None and (batch.stopped or not isinstance(batch, MessageBatchTransaction)):
+        if not batch.stopped:
+            batch.__exit__(*sys.exc_info())
+        batch = None
+
+    if batch is not None and (not single or batch.message_count >= batch_settings.max_messages):
+        batch.__exit__(*sys.exc_info())
+        batch = None
+
+    try:
+        result = wrapped(*args, **kwargs)
+    except Exception:
+        if current_transaction():
+            notice_error()
+        else:
+            notice_error(application=application_instance(activate=False))
+        raise
+
+    if single:
+        records = [result] if result else []
+    else:
+        records = result or []
+
+    if not records:
+        if batch is not None:
+            batch.__exit__(None, None, None)
+        return result
+
+    transaction = current_transaction(active_only=False)
+    if transaction is not None and transaction is not batch:
+        # Within some other transaction, the messages are only recorded as
+        # metrics against that transaction, as when not in batch mode.
+        if current_transaction():
+            for record in records:
+                _record_received_message(transaction, record.topic(), payload_size(record.value()))
+        return result
+
+    for record in records:
+        destination_name = record.topic()
+
+        # Distributed trace headers are only looked at if asked for, in
+        # which case a message carrying them starts a new transaction, so
+        # the transaction can be linked to the trace for the message.
+
+        headers = None
+        if batch_settings.distributed_tracing:
+            headers = record.headers()
+            headers = dict(headers) if headers else None
+
+            if batch is not None and headers and any(key in headers for key in DISTRIBUTED_TRACE_HEADERS):
+                batch.__exit__(None, None, None)
+                batch = None
+
+        if batch is None:
+            batch = MessageBatchTransaction(
+                application=application_instance(),
+                library="Kafka",
+                destination_type="Topic",
+                destination_name=destination_name,
+                headers=headers,
+                transport_type="Kafka",
+                routing_key=record.key(),
+                source=wrapped,
+                byte_count_attribute="kafka.consume.byteCount",
+            )
+            instance._nr_transaction = batch
+            batch.__enter__()  # pylint: disable=C2801
+            batch.add_messagebroker_info("Confluent-Kafka", get_package_version("confluent-kafka"))
+
+        batch.add_message(destination_name, payload_size(record.value()))
+
+    return result
+
+
+def _record_received_message(transaction, destination_name, received_bytes):
+    group = "Message/Kafka/Topic"
+    name = "Named/%s" % destination_name
+    transaction.record_custom_metric("%s/%s/Received/Bytes" % (group, name), received_bytes)
+    transaction.record_custom_metric("%s/%s/Received/Messages" % (group, name), 1)
+    transaction.add_messagebroker_info("Confluent-Kafka", get_package_version("confluent-kafka"))
+
+
 def wrap_DeserializingConsumer_poll(wrapped, instance, args, kwargs):
     try:
         return wrapped(*args, **kwargs)
@@ -234,6 +338,7 @@ def instrument_confluentkafka_cimpl(module):
     if hasattr(module, "Consumer"):
         wrap_immutable_class(module, "Consumer")
         wrap_function_wrapper(module, "Consumer.poll", wrap_Consumer_poll)
+        wrap_function_wrapper(module, "Consumer.consume", wrap_Consumer_consume)
 
 
 def instrument_confluentkafka_serializing_producer(module):
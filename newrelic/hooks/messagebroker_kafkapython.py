@@ -18,15 +18,20 @@ from kafka.serializer import Serializer
 from newrelic.api.application import application_instance
 from newrelic.api.function_trace import FunctionTraceWrapper
 from newrelic.api.message_trace import MessageTrace
-from newrelic.api.message_transaction import MessageTransaction
+from newrelic.api.message_transaction import (
+    MessageBatchTransaction,
+    MessageTransaction,
+)
 from newrelic.api.time_trace import current_trace, notice_error
 from newrelic.api.transaction import current_transaction
+from newrelic.common.encoding_utils import payload_size
 from newrelic.common.object_wrapper import (
     ObjectProxy,
     function_wrapper,
     wrap_function_wrapper,
 )
 from newrelic.common.package_version_utils import get_package_version
+from newrelic.core.config import global_settings
 
 HEARTBEAT_POLL = "MessageBroker/Kafka/Heartbeat/Poll"
 HEARTBEAT_SENT = "MessageBroker/Kafka/Heartbeat/Sent"
@@ -35,6 +40,8 @@ HEARTBEAT_RECEIVE = "MessageBroker/Kafka/Heartbeat/Receive"
 HEARTBEAT_SESSION_TIMEOUT = "MessageBroker/Kafka/Heartbeat/SessionTimeout"
 HEARTBEAT_POLL_TIMEOUT = "MessageBroker/Kafka/Heartbeat/PollTimeout"
 
+DISTRIBUTED_TRACE_HEADERS = (MessageTrace.cat_id_key, "newrelic", "traceparent")
+
 
 def _bind_send(topic, value=None, key=None, headers=None, partition=None, timestamp_ms=None):
     return topic, value, key, headers, partition, timestamp_ms
@@ -74,6 +81,10 @@ def wrap_KafkaProducer_send(wrapped, instance, args, kwargs):
 
 
 def wrap_kafkaconsumer_next(wrapped, instance, args, kwargs):
+    batch_settings = global_settings().message_tracer.consumer_batch
+    if batch_settings.enabled:
+        return _wrap_kafkaconsumer_next_batch(wrapped, instance, args, kwargs, batch_settings)
+
     if hasattr(instance, "_nr_transaction") and not instance._nr_transaction.stopped:
         instance._nr_transaction.__exit__(*sys.exc_info())
 
@@ -116,8 +127,7 @@ def wrap_kafkaconsumer_next(wrapped, instance, args, kwargs):
         library = "Kafka"
         destination_type = "Topic"
         destination_name = record.topic
-        received_bytes = len(str(record.value).encode("utf-8"))
-        message_count = 1
+        received_bytes = payload_size(record.value)
 
         transaction = current_transaction(active_only=False)
 
@@ -148,15 +158,100 @@ def wrap_kafkaconsumer_next(wrapped, instance, args, kwargs):
             # Don't add metrics if there was an inactive transaction.
             # Name the metrics using the same format as the transaction, but in case the active transaction
             # was an existing one and not a message transaction, reproduce the naming logic here.
-            group = "Message/%s/%s" % (library, destination_type)
-            name = "Named/%s" % destination_name
-            transaction.record_custom_metric("%s/%s/Received/Bytes" % (group, name), received_bytes)
-            transaction.record_custom_metric("%s/%s/Received/Messages" % (group, name), message_count)
-            transaction.add_messagebroker_info("Kafka-Python", get_package_version("kafka-python"))
+            _record_received_message(transaction, destination_name, received_bytes)
 
     return record
 
 
+def _wrap_kafkaconsumer_next_batch(wrapped, instance, args, kwargs, batch_settings):
+    # In batch mode a transaction is started for a run of records returned
+    # by the iterator, rather than for each record. The transaction ends
+    # when it has reached the maximum number of messages, or when the
+    # iterator stops.
+
+    batch = getattr(instance, "_nr_transaction", None)
+    if batch is not None and (batch.stopped or not isinstance(batch, MessageBatchTransaction)):
+        if not batch.stopped:
+            batch.__exit__(*sys.exc_info())
+        batch = None
+
+    if batch is not None and batch.message_count >= batch_settings.max_messages:
+        batch.__exit__(*sys.exc_info())
+        batch = None
+
+    try:
+        record = wrapped(*args, **kwargs)
+    except Exception as e:
+        # StopIteration is an expected error, indicating the end of an iterable,
+        # that should not be captured.
+        if not isinstance(e, StopIteration):
+            if current_transaction():
+                notice_error()
+            else:
+                notice_error(application=application_instance(activate=False))
+        if batch is not None:
+            batch.__exit__(None, None, None)
+        raise
+
+    if not record:
+        return record
+
+    destination_name = record.topic
+    received_bytes = payload_size(record.value)
+
+    transaction = current_transaction(active_only=False)
+    if transaction is not None and transaction is not batch:
+        # Within some other transaction, the record is only recorded as
+        # metrics against that transaction, as when not in batch mode.
+        if current_transaction():
+            _record_received_message(transaction, destination_name, received_bytes)
+        return record
+
+    # Distributed trace headers are only looked at if asked for, in which
+    # case a record carrying them starts a new transaction, so the
+    # transaction can be linked to the trace for the record.
+
+    headers = None
+    if batch_settings.distributed_tracing:
+        headers = dict(record.headers) if record.headers else None
+
+        if batch is not None and headers and any(key in headers for key in DISTRIBUTED_TRACE_HEADERS):
+            batch.__exit__(None, None, None)
+            batch = None
+
+    if batch is None:
+        batch = MessageBatchTransaction(
+            application=application_instance(),
+            library="Kafka",
+            destination_type="Topic",
+            destination_name=destination_name,
+            headers=headers,
+            transport_type="Kafka",
+            routing_key=record.key,
+            source=wrapped,
+            byte_count_attribute="kafka.consume.byteCount",
+        )
+        instance._nr_transaction = batch
+        batch.__enter__()  # pylint: disable=C2801
+
+        if hasattr(instance, "config") and "client_id" in instance.config:
+            batch._add_agent_attribute("kafka.consume.client_id", instance.config["client_id"])
+
+        batch.add_messagebroker_info("Kafka-Python", get_package_version("kafka-python"))
+
+    batch.add_message(destination_name, received_bytes)
+
+    return record
+
+
+def _record_received_message(transaction, destination_name, received_bytes):
+    group = "Message/Kafka/Topic"
+    name = "Named/%s" % destination_name
+    transaction.record_custom_metric("%s/%s/Received/Bytes" % (group, name), received_bytes)
+    transaction.record_custom_metric("%s/%s/Received/Messages" % (group, name), 1)
+    transaction.add_messagebroker_info("Kafka-Python", get_package_version("kafka-python"))
+
+
 def wrap_KafkaProducer_init(wrapped, instance, args, kwargs):
     get_config_key = lambda key: kwargs.get(key, instance.DEFAULT_CONFIG[key])  # pylint: disable=C3001 # noqa: E731
 
@@ -757,29 +757,38 @@ class GeneratorProxy(ObjectProxy):
 def _record_stream_chunk(self, return_val):
     if return_val:
         try:
+            openai_attrs = self._nr_openai_attrs
             if OPENAI_V1:
                 if getattr(return_val, "data", "").startswith("[DONE]"):
                     return
                 return_val = return_val.json()
-                self._nr_openai_attrs["response_headers"] = getattr(self, "_nr_response_headers", {})
+                openai_attrs["response_headers"] = getattr(self, "_nr_response_headers", {})
             else:
-                self._nr_openai_attrs["response_headers"] = getattr(return_val, "_nr_response_headers", {})
+                openai_attrs["response_headers"] = getattr(return_val, "_nr_response_headers", {})
             choices = return_val.get("choices") or []
-            self._nr_openai_attrs["response.model"] = return_val.get("model")
-            self._nr_openai_attrs["id"] = return_val.get("id")
-            self._nr_openai_attrs["response.organization"] = return_val.get("organization")
+            openai_attrs["response.model"] = return_val.get("model")
+            openai_attrs["id"] = return_val.get("id")
+            openai_attrs["response.organization"] = return_val.get("organization")
             if choices:
                 delta = choices[0].get("delta") or {}
                 if delta:
-                    self._nr_openai_attrs["content"] = self._nr_openai_attrs.get("content", "") + (
-                        delta.get("content") or ""
-                    )
-                    self._nr_openai_attrs["role"] = self._nr_openai_attrs.get("role") or delta.get("role")
-                self._nr_openai_attrs["finish_reason"] = choices[0].get("finish_reason")
+                    # The pieces of the content are only joined together
+                    # once the stream has finished, as adding each piece
+                    # on to the content so far is quadratic in the length
+                    # of the content.
+                    openai_attrs.setdefault("content_fragments", []).append(delta.get("content") or "")
+                    openai_attrs["role"] = openai_attrs.get("role") or delta.get("role")
+                openai_attrs["finish_reason"] = choices[0].get("finish_reason")
         except Exception:
             _logger.warning(STREAM_PARSING_FAILURE_LOG_MESSAGE % traceback.format_exception(*sys.exc_info()))
 
 
+def _join_stream_content(openai_attrs):
+    fragments = openai_attrs.pop("content_fragments", None)
+    if fragments is not None:
+        openai_attrs["content"] = "".join(fragments)
+
+
 def _record_events_on_stop_iteration(self, transaction):
     if hasattr(self, "_nr_ft"):
         linking_metadata = get_trace_linking_metadata()
@@ -791,6 +800,8 @@ def _record_events_on_stop_iteration(self, transaction):
             if not openai_attrs:
                 return
 
+            _join_stream_content(openai_attrs)
+
             completion_id = str(uuid.uuid4())
             response_headers = openai_attrs.get("response_headers") or {}
             _record_completion_success(
@@ -817,6 +828,7 @@ def _handle_streaming_completion_error(self, transaction, exc):
         if not openai_attrs:
             self._nr_ft.__exit__(*sys.exc_info())
             return
+        _join_stream_content(openai_attrs)
         linking_metadata = get_trace_linking_metadata()
         completion_id = str(uuid.uuid4())
         _record_completion_error(transaction, linking_metadata, completion_id, openai_attrs, self._nr_ft, exc)
@@ -36,17 +36,6 @@ PY2 = sys.version_info[0] == 2
 _logger = logging.getLogger(__name__)
 
 
-def isnumeric(column):
-    import numpy as np
-
-    try:
-        column.astype(np.float64)
-        return [True] * len(column)
-    except:
-        pass
-    return [False] * len(column)
-
-
 class PredictReturnTypeProxy(ObjectProxy):
     def __init__(self, wrapped, model_name, training_step):
         super(ObjectProxy, self).__init__(wrapped)
@@ -102,53 +91,75 @@ def _wrap_method_trace(module, class_, method, name=None, group=None):
     wrap_function_wrapper(module, "%s.%s" % (class_, method), _nr_wrapper_method)
 
 
-def _calc_prediction_feature_stats(prediction_input, class_, feature_column_names, tags):
+def _numeric_feature_columns(prediction_input):
     import numpy as np
 
-    # Drop any feature columns that are not numeric since we can't compute stats
-    # on non-numeric columns.
-    x = np.array(prediction_input)
-    isnumeric_features = np.apply_along_axis(isnumeric, 0, x)
-    numeric_features = x[isnumeric_features]
+    # Returns a mask of which feature columns are numeric, along with the
+    # values of the numeric columns as a 2D array of floats. A column is
+    # numeric if it can be cast to floats.
+
+    pd = sys.modules.get("pandas", None)
+    if pd and isinstance(prediction_input, pd.DataFrame):
+        # Look at each column of a pandas DataFrame separately, rather
+        # than converting the whole of it to an array of objects when the
+        # columns are of different types.
+        columns = [prediction_input.iloc[:, index].to_numpy() for index in range(prediction_input.shape[1])]
+    else:
+        x = np.asarray(prediction_input)
+
+        # Where the array is of a numeric type, all columns are numeric.
+        if x.dtype.kind in "biuf":
+            return np.ones(x.shape[1], dtype=bool), x.astype(np.float64)
+
+        columns = x.T
+
+    mask = np.zeros(len(columns), dtype=bool)
+    numeric_columns = []
+    for index, column in enumerate(columns):
+        try:
+            numeric_columns.append(column.astype(np.float64))
+            mask[index] = True
+        except Exception:
+            pass
+
+    if not numeric_columns:
+        return mask, None
+
+    return mask, np.column_stack(numeric_columns)
+
 
-    # Drop any feature column names that are not numeric since we can't compute stats
+def _calc_prediction_feature_stats(prediction_input, class_, feature_column_names, tags):
+    # Drop any feature columns that are not numeric since we can't compute stats
     # on non-numeric columns.
-    feature_column_names = feature_column_names[isnumeric_features[0]]
+    isnumeric_features, features = _numeric_feature_columns(prediction_input)
 
     # Only compute stats for features if we have any feature columns left after dropping
     # non-numeric columns.
-    num_cols = len(feature_column_names)
-    if num_cols > 0:
-        # Boolean selection of numpy array values reshapes the array to a single
-        # dimension so we have to reshape it back into a 2D array.
-        features = np.reshape(numeric_features, (len(numeric_features) // num_cols, num_cols))
-        features = features.astype(dtype=np.float64)
-
-        _record_stats(features, feature_column_names, class_, "Feature", tags)
+    if features is not None:
+        _record_stats(features, feature_column_names[isnumeric_features], class_, "Feature", tags)
 
 
 def _record_stats(data, column_names, class_, column_type, tags):
     import numpy as np
 
+    # The quartiles are found along with the min and max, being the 0th and
+    # 100th percentiles, from a single partitioning of each column.
+    _min, percentile25, percentile50, percentile75, _max = np.percentile(data, q=(0, 0.25, 0.50, 0.75, 100), axis=0)
     mean = np.mean(data, axis=0)
-    percentile25 = np.percentile(data, q=0.25, axis=0)
-    percentile50 = np.percentile(data, q=0.50, axis=0)
-    percentile75 = np.percentile(data, q=0.75, axis=0)
     standard_deviation = np.std(data, axis=0)
-    _min = np.min(data, axis=0)
-    _max = np.max(data, axis=0)
     _count = data.shape[0]
 
     transaction = current_transaction()
 
     # Currently record_metric only supports a subset of these stats so we have
     # to upload them one at a time instead of as a dictionary of stats per
-    # feature column.
+    # column, though the metrics for all columns are recorded together.
+    metrics = []
     for index, col_name in enumerate(column_names):
         metric_name = "MLModel/Sklearn/Named/%s/Predict/%s/%s" % (class_, column_type, col_name)
 
-        transaction.record_dimensional_metrics(
-            [
+        metrics.extend(
+            (
                 ("%s/%s" % (metric_name, "Mean"), float(mean[index]), tags),
                 ("%s/%s" % (metric_name, "Percentile25"), float(percentile25[index]), tags),
                 ("%s/%s" % (metric_name, "Percentile50"), float(percentile50[index]), tags),
@@ -157,14 +168,16 @@ def _record_stats(data, column_names, class_, column_type, tags):
                 ("%s/%s" % (metric_name, "Min"), float(_min[index]), tags),
                 ("%s/%s" % (metric_name, "Max"), float(_max[index]), tags),
                 ("%s/%s" % (metric_name, "Count"), _count, tags),
-            ]
+            )
         )
 
+    transaction.record_dimensional_metrics(metrics)
+
 
 def _calc_prediction_label_stats(labels, class_, label_column_names, tags):
     import numpy as np
 
-    labels = np.array(labels, dtype=np.float64)
+    labels = np.asarray(labels, dtype=np.float64)
     _record_stats(labels, label_column_names, class_, "Label", tags)
 
 
@@ -210,7 +223,7 @@ def categorize_data_type(python_type):
 def _get_feature_column_names(user_provided_feature_names, features):
     import numpy as np
 
-    num_feature_columns = np.array(features).shape[1]
+    num_feature_columns = features.shape[1]
 
     # If the user provided feature names are the correct size, return the user provided feature
     # names.
@@ -271,10 +284,20 @@ def create_prediction_event(transaction, class_, instance, args, kwargs, return_
             },
         )
 
-    final_feature_names = _get_feature_column_names(user_provided_feature_names, data_set)
-    np_casted_data_set = np.array(data_set)
+    # A pandas DataFrame isn't converted into an array, as where its columns
+    # are of different types, every value would be converted to an object.
+    # Anything else is converted once, with the array then used throughout.
+    pd = sys.modules.get("pandas", None)
+    if pd and isinstance(data_set, pd.DataFrame):
+        features = data_set
+        feature_rows = data_set.iloc
+    else:
+        features = feature_rows = np.array(data_set)
+
+    final_feature_names = _get_feature_column_names(user_provided_feature_names, features)
+
     _calc_prediction_feature_stats(
-        data_set,
+        features,
         class_,
         final_feature_names,
         tags={
@@ -284,35 +307,40 @@ def create_prediction_event(transaction, class_, instance, args, kwargs, return_
             "modelName": model_name,
         },
     )
-    features, predictions = np_casted_data_set.shape
-    for prediction_index, prediction in enumerate(np_casted_data_set):
-        inference_id = uuid.uuid4()
 
-        event = {
-            "inference_id": inference_id,
-            "prediction_id": prediction_id,
-            "model_version": model_version,
-            "new_relic_data_schema_version": 2,
-            # The following are used for entity synthesis.
-            "modelName": model_name,
-        }
-        if metadata and isinstance(metadata, dict):
-            event.update(metadata)
-        # Don't include the raw value when inference_event_value is disabled.
-        if settings and settings.machine_learning and settings.machine_learning.inference_events_value.enabled:
-            event.update(
-                {
-                    "feature.%s" % str(final_feature_names[feature_col_index]): value
-                    for feature_col_index, value in enumerate(prediction)
-                }
-            )
-            event.update(
-                {
-                    "label.%s" % str(label_names_list[index]): str(value)
-                    for index, value in enumerate(labels[prediction_index])
-                }
-            )
-        transaction.record_ml_event("InferenceData", event)
+    # The attributes shared by the events for all rows, and the names of
+    # the attributes for the values in each column, are worked out once,
+    # with the event for a row only created if it is going to be kept.
+    common_attributes = {
+        "prediction_id": prediction_id,
+        "model_version": model_version,
+        "new_relic_data_schema_version": 2,
+        # The following are used for entity synthesis.
+        "modelName": model_name,
+    }
+    if metadata and isinstance(metadata, dict):
+        common_attributes.update(metadata)
+
+    feature_keys = label_keys = ()
+
+    # Don't include the raw value when inference_event_value is disabled.
+    if settings and settings.machine_learning and settings.machine_learning.inference_events_value.enabled:
+        feature_keys = ["feature.%s" % str(feature_name) for feature_name in final_feature_names]
+        if len(labels):
+            label_keys = ["label.%s" % str(label_name) for label_name in label_names_list]
+
+    def _inference_event(prediction_index):
+        event = {"inference_id": uuid.uuid4()}
+        event.update(common_attributes)
+        if feature_keys:
+            event.update(zip(feature_keys, feature_rows[prediction_index]))
+        if label_keys:
+            event.update(zip(label_keys, (str(value) for value in labels[prediction_index])))
+        return event
+
+    sample_limit = settings.machine_learning.inference_events.sample_limit if settings else 0
+
+    transaction.record_ml_events("InferenceData", len(features), _inference_event, sample_limit=sample_limit)
 
 
 def _nr_instrument_model(module, model_class):
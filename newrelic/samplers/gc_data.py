@@ -15,6 +15,7 @@
 import gc
 import os
 import platform
+import random
 import time
 from collections import Counter
 
@@ -45,6 +46,36 @@ class _GCDataSource(object):
         settings = global_settings()
         return settings.gc_runtime_metrics.top_object_count_limit
 
+    @property
+    def top_object_sample_limit(self):
+        settings = global_settings()
+        return settings.gc_runtime_metrics.top_object_sample_limit
+
+    def top_object_types(self, limit):
+        objects = gc.get_objects()
+        total = len(objects)
+
+        # Counting the type of every object on a large heap holds the GIL
+        # for a long time, so when a sample limit is set only a random
+        # sample of the objects is counted and the counts scaled up to
+        # estimate the counts for the whole heap. Objects are picked with
+        # replacement as random.sample() copies the whole list first, and
+        # not by taking every Nth object as that can miss types entirely
+        # where objects were allocated in a repeating pattern.
+
+        sample_limit = self.top_object_sample_limit
+
+        if 0 < sample_limit < total:
+            _random = random.random
+            objects = [objects[int(_random() * total)] for _ in range(sample_limit)]
+            scale = float(total) / sample_limit
+        else:
+            scale = 1.0
+
+        highest_types = Counter(map(type, objects)).most_common(limit)
+
+        return [(obj_type, int(round(count * scale))) for obj_type, count in highest_types]
+
     def record_gc(self, phase, info):
         if not self.enabled:
             return
@@ -92,10 +123,9 @@ class _GCDataSource(object):
 
         # Record object count for top five types with highest count
         if hasattr(gc, "get_objects"):
-            object_types = map(type, gc.get_objects())
-            if self.top_object_count_limit > 0:
-                highest_types = Counter(object_types).most_common(self.top_object_count_limit)
-                for obj_type, count in highest_types:
+            top_object_count_limit = self.top_object_count_limit
+            if top_object_count_limit > 0:
+                for obj_type, count in self.top_object_types(top_object_count_limit):
                     yield (
                         "GC/objects/%d/type/%s" % (self.pid, callable_name(obj_type)),
                         {"count": count},
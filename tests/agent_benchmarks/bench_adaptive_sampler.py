@@ -0,0 +1,68 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cost of a sampling decision by the adaptive sampler as the number of
+threads making decisions concurrently grows.
+
+Runs under airspeed velocity, or standalone to print a table:
+
+    python tests/agent_benchmarks/bench_adaptive_sampler.py
+
+"""
+
+import threading
+import time
+
+from newrelic.core.adaptive_sampler import AdaptiveSampler
+
+DECISIONS = 200000
+
+
+def _compute_sampled(sampler, decisions):
+    compute_sampled = sampler.compute_sampled
+    for _ in range(decisions):
+        compute_sampled()
+
+
+class Suite(object):
+    params = [1, 2, 4, 8, 16]
+    param_names = ["threads"]
+
+    def setup(self, threads):
+        self.sampler = AdaptiveSampler(10, 60.0)
+
+    def time_compute_sampled(self, threads):
+        workers = [
+            threading.Thread(target=_compute_sampled, args=(self.sampler, DECISIONS // threads)) for _ in range(threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    def track_nanoseconds_per_decision(self, threads):
+        start = time.time()
+        self.time_compute_sampled(threads)
+        return (time.time() - start) * 1e9 / DECISIONS
+
+    track_nanoseconds_per_decision.unit = "ns"
+
+
+if __name__ == "__main__":
+    suite = Suite()
+    print("%8s %16s %10s" % ("threads", "ns/decision", "sampled"))
+    for threads in Suite.params:
+        suite.setup(threads)
+        cost = suite.track_nanoseconds_per_decision(threads)
+        print("%8d %16.1f %10d" % (threads, cost, suite.sampler.sampled_count))
@@ -0,0 +1,93 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cost of filtering an attribute as the number of attribute filter rules
+grows, for attribute names which are always new, such as those derived
+from request parameters, comparing the compiled attribute filter with
+applying each rule in turn.
+
+Runs under airspeed velocity, or standalone to print a table:
+
+    python tests/agent_benchmarks/bench_attribute_filter.py
+
+"""
+
+import time
+
+from newrelic.core.attribute_filter import DST_ALL, AttributeFilter
+
+ATTRIBUTES = 20000
+
+
+def _settings(rules):
+    return {
+        "attributes.enabled": True,
+        "transaction_events.attributes.enabled": True,
+        "transaction_tracer.attributes.enabled": True,
+        "error_collector.attributes.enabled": True,
+        "span_events.attributes.enabled": True,
+        "transaction_segments.attributes.enabled": True,
+        "attributes.include": ["request.parameters.*"],
+        "attributes.exclude": ["custom.attribute_%d*" % i for i in range(rules)],
+        "span_events.attributes.exclude": ["request.parameters.secret_%d" % i for i in range(rules)],
+    }
+
+
+def _apply_rules(attribute_filter, name, default_destinations):
+    destinations = attribute_filter.enabled_destinations & default_destinations
+
+    for rule in attribute_filter.rules:
+        if rule.name_match(name):
+            if rule.is_include:
+                destinations |= rule.destinations & attribute_filter.enabled_destinations
+            else:
+                destinations &= ~rule.destinations
+
+    return destinations
+
+
+FILTERS = {
+    "compiled": lambda attribute_filter: attribute_filter.apply,
+    "rules": lambda attribute_filter: lambda name, default: _apply_rules(attribute_filter, name, default),
+}
+
+
+class Suite(object):
+    params = ([10, 100, 1000], sorted(FILTERS))
+    param_names = ["rules", "filter"]
+
+    def setup(self, rules, filter):
+        self.apply = FILTERS[filter](AttributeFilter(_settings(rules)))
+        self.names = ["request.parameters.param_%d" % i for i in range(ATTRIBUTES)]
+
+    def time_apply(self, rules, filter):
+        apply = self.apply
+        for name in self.names:
+            apply(name, DST_ALL)
+
+    def track_microseconds_per_attribute(self, rules, filter):
+        start = time.time()
+        self.time_apply(rules, filter)
+        return (time.time() - start) * 1e6 / ATTRIBUTES
+
+    track_microseconds_per_attribute.unit = "us"
+
+
+if __name__ == "__main__":
+    suite = Suite()
+    print("%8s %10s %16s" % ("rules", "filter", "us/attribute"))
+    for rules in Suite.params[0]:
+        for filter in Suite.params[1]:
+            suite.setup(rules, filter)
+            print("%8d %10s %16.2f" % (rules, filter, suite.track_microseconds_per_attribute(rules, filter)))
@@ -0,0 +1,84 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Time taken by the garbage collector sampler to count the top object
+types on large synthetic heaps, with and without a sample limit set by
+the gc_runtime_metrics.top_object_sample_limit setting.
+
+Runs under airspeed velocity, or standalone to print a table:
+
+    python tests/agent_benchmarks/bench_gc_census.py
+
+"""
+
+import gc
+import time
+
+from newrelic.core.config import global_settings
+from newrelic.samplers.gc_data import garbage_collector_data_source
+
+
+class HeapObject(object):
+    pass
+
+
+def _heap(size):
+    # A mix of instances, dictionaries and lists, much like the objects
+    # making up the heap of a typical web application.
+
+    return [HeapObject() if i % 3 == 0 else {} if i % 3 == 1 else [] for i in range(size)]
+
+
+class Suite(object):
+    params = ([100000, 1000000, 3000000], [0, 100000, 10000])
+    param_names = ["heap", "top_object_sample_limit"]
+
+    def setup(self, heap, top_object_sample_limit):
+        self.heap = _heap(heap)
+        self.data_source = garbage_collector_data_source(settings=())["factory"](environ=())
+
+        settings = global_settings()
+        self.previous_sample_limit = settings.gc_runtime_metrics.top_object_sample_limit
+        settings.gc_runtime_metrics.top_object_sample_limit = top_object_sample_limit
+
+        gc.collect()
+
+    def teardown(self, heap, top_object_sample_limit):
+        settings = global_settings()
+        settings.gc_runtime_metrics.top_object_sample_limit = self.previous_sample_limit
+        self.heap = None
+
+    def time_top_object_types(self, heap, top_object_sample_limit):
+        self.data_source.top_object_types(5)
+
+    def track_top_type_error(self, heap, top_object_sample_limit):
+        counts = dict(self.data_source.top_object_types(5))
+        expected = len(self.heap) // 3
+        return 100.0 * abs(counts[HeapObject] - expected) / expected
+
+    track_top_type_error.unit = "%"
+
+
+if __name__ == "__main__":
+    suite = Suite()
+    print("%10s %14s %12s %10s" % ("heap", "sample_limit", "seconds", "error %"))
+    for heap in Suite.params[0]:
+        for top_object_sample_limit in Suite.params[1]:
+            suite.setup(heap, top_object_sample_limit)
+            start = time.time()
+            suite.time_top_object_types(heap, top_object_sample_limit)
+            elapsed = time.time() - start
+            error = suite.track_top_type_error(heap, top_object_sample_limit)
+            suite.teardown(heap, top_object_sample_limit)
+            print("%10d %14d %12.4f %10.2f" % (heap, top_object_sample_limit, elapsed, error))
@@ -0,0 +1,101 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Memory use and merge speed of the metric stats table when backed by a
+dictionary of list based stats objects, compared with the struct of arrays
+table selected by the metric_stats_table setting.
+
+Runs under airspeed velocity, or standalone to print a table:
+
+    python tests/agent_benchmarks/bench_metric_stats_table.py
+
+"""
+
+import time
+import tracemalloc
+
+from newrelic.core.config import finalize_application_settings
+from newrelic.core.metric import TimeMetric
+from newrelic.core.stats_engine import StatsEngine
+
+WORKAREAS = 10
+
+
+def _stats_engine(metric_stats_table):
+    stats = StatsEngine()
+    stats.reset_stats(finalize_application_settings({"metric_stats_table": metric_stats_table}))
+    return stats
+
+
+def _metrics(count):
+    return [
+        TimeMetric(name="Function/module:function_%d" % i, scope="", duration=0.1 * (i % 7), exclusive=0.05)
+        for i in range(count)
+    ]
+
+
+class Suite(object):
+    params = ([1000, 10000, 50000], ["list", "array"])
+    param_names = ["metrics", "metric_stats_table"]
+
+    def setup(self, metrics, metric_stats_table):
+        self.metrics = _metrics(metrics)
+        self.stats_engine = _stats_engine(metric_stats_table)
+        self.stats_engine.record_time_metrics(self.metrics)
+
+        self.workareas = []
+        for _ in range(WORKAREAS):
+            workarea = self.stats_engine.create_workarea()
+            workarea.record_time_metrics(self.metrics)
+            self.workareas.append(workarea)
+
+    def time_merge_metric_stats(self, metrics, metric_stats_table):
+        for workarea in self.workareas:
+            self.stats_engine.merge_metric_stats(workarea)
+
+    def track_merged_metrics_per_second(self, metrics, metric_stats_table):
+        start = time.time()
+        self.time_merge_metric_stats(metrics, metric_stats_table)
+        return metrics * WORKAREAS / (time.time() - start)
+
+    track_merged_metrics_per_second.unit = "metrics/s"
+
+    def track_memory_per_metric(self, metrics, metric_stats_table):
+        # Names are interned on the shared metric name table during setup
+        # so only the storage of the stats themselves is measured here.
+
+        stats = self.stats_engine.create_workarea()
+
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            stats.record_time_metrics(self.metrics)
+            after = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+        return (after - before) / float(metrics)
+
+    track_memory_per_metric.unit = "bytes"
+
+
+if __name__ == "__main__":
+    suite = Suite()
+    print("%8s %8s %16s %12s" % ("metrics", "table", "merged/s", "bytes/metric"))
+    for metrics in Suite.params[0]:
+        for metric_stats_table in Suite.params[1]:
+            suite.setup(metrics, metric_stats_table)
+            memory = suite.track_memory_per_metric(metrics, metric_stats_table)
+            rate = suite.track_merged_metrics_per_second(metrics, metric_stats_table)
+            print("%8d %8s %16.0f %12.1f" % (metrics, metric_stats_table, rate, memory))
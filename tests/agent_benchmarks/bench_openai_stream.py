@@ -0,0 +1,134 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Time taken by the OpenAI instrumentation to process the chunks of a
+streamed chat completion as the number of chunks grows, comparing adding
+each piece of content on to the content so far with collecting the pieces
+and joining them once the stream has finished.
+
+Runs under airspeed velocity, or standalone to print a table:
+
+    python tests/agent_benchmarks/bench_openai_stream.py
+
+"""
+
+import json
+import time
+
+from newrelic.hooks.mlmodel_openai import (
+    OPENAI_V1,
+    _join_stream_content,
+    _record_stream_chunk,
+)
+
+
+class _Stream(object):
+    def __init__(self):
+        self._nr_openai_attrs = {}
+        self._nr_response_headers = {}
+
+
+def _chunk(i):
+    return {
+        "id": "chatcmpl-8TJ9dS50zgQM7XicE8PLnCyEihRug",
+        "object": "chat.completion.chunk",
+        "created": 1706565311,
+        "model": "gpt-3.5-turbo-0613",
+        "choices": [
+            {
+                "index": 0,
+                "delta": {"role": "assistant", "content": "token%d " % i} if i == 0 else {"content": "token%d " % i},
+                "finish_reason": None,
+            }
+        ],
+    }
+
+
+def _chunks(count):
+    chunks = [_chunk(i) for i in range(count)]
+
+    if OPENAI_V1:
+        # The version 1 client passes server sent events, with the data for
+        # the chunk as a string of JSON, to the instrumentation.
+
+        from openai._streaming import ServerSentEvent
+
+        return [ServerSentEvent(data=json.dumps(chunk)) for chunk in chunks]
+
+    return chunks
+
+
+def _concatenate(stream, chunks):
+    # Reference for how the chunks were processed before, parsing the data
+    # for each chunk and adding each piece of content on to the content so
+    # far.
+
+    attrs = stream._nr_openai_attrs
+    for chunk in chunks:
+        if OPENAI_V1:
+            chunk = json.loads(chunk.data)
+        attrs["response_headers"] = stream._nr_response_headers
+        choices = chunk.get("choices") or []
+        attrs["response.model"] = chunk.get("model")
+        attrs["id"] = chunk.get("id")
+        attrs["response.organization"] = chunk.get("organization")
+        if choices:
+            delta = choices[0].get("delta") or {}
+            if delta:
+                attrs["content"] = attrs.get("content", "") + (delta.get("content") or "")
+                attrs["role"] = attrs.get("role") or delta.get("role")
+            attrs["finish_reason"] = choices[0].get("finish_reason")
+    return attrs["content"]
+
+
+def _collect_and_join(stream, chunks):
+    for chunk in chunks:
+        _record_stream_chunk(stream, chunk)
+    _join_stream_content(stream._nr_openai_attrs)
+    return stream._nr_openai_attrs["content"]
+
+
+ACCUMULATORS = {
+    "concatenate": _concatenate,
+    "join": _collect_and_join,
+}
+
+
+class Suite(object):
+    params = ([1000, 10000], sorted(ACCUMULATORS))
+    param_names = ["chunks", "accumulator"]
+
+    def setup(self, chunks, accumulator):
+        self.chunks = _chunks(chunks)
+        self.accumulate = ACCUMULATORS[accumulator]
+
+    def time_stream(self, chunks, accumulator):
+        self.accumulate(_Stream(), self.chunks)
+
+    def track_microseconds_per_chunk(self, chunks, accumulator):
+        start = time.time()
+        self.time_stream(chunks, accumulator)
+        return (time.time() - start) * 1e6 / chunks
+
+    track_microseconds_per_chunk.unit = "us"
+
+
+if __name__ == "__main__":
+    suite = Suite()
+    print("%8s %12s %16s" % ("chunks", "accumulator", "us/chunk"))
+    for chunks in Suite.params[0]:
+        for accumulator in Suite.params[1]:
+            suite.setup(chunks, accumulator)
+            cost = suite.track_microseconds_per_chunk(chunks, accumulator)
+            print("%8d %12s %16.3f" % (chunks, accumulator, cost))
@@ -0,0 +1,116 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Peak memory use and time taken to encode and compress span event
+payloads, comparing encoding the payload to a single string before
+compressing it with streaming the encoded JSON into the compressor.
+
+Runs under airspeed velocity, or standalone to print a table:
+
+    python tests/agent_benchmarks/bench_payload_encoding.py
+
+"""
+
+import time
+import tracemalloc
+
+from newrelic.common.agent_http import HttpClient
+from newrelic.common.encoding_utils import json_encode, json_encode_chunks
+
+COMPRESSION_THRESHOLD = 64 * 1024
+
+
+def _span_event(i):
+    intrinsics = {
+        "type": "Span",
+        "traceId": "%032x" % i,
+        "guid": "%016x" % i,
+        "parentId": "%016x" % (i - 1),
+        "transactionId": "%016x" % (i // 100),
+        "sampled": True,
+        "priority": 1.234567,
+        "timestamp": 1700000000000 + i,
+        "duration": 0.0125,
+        "name": "Datastore/statement/Postgres/users/select",
+        "category": "datastore",
+        "component": "Postgres",
+        "span.kind": "client",
+    }
+    agent_attributes = {
+        "db.statement": "SELECT * FROM users WHERE id = ? AND name = ?",
+        "db.instance": "production",
+        "peer.hostname": "db-%d.example.com" % (i % 10),
+        "peer.address": "db-%d.example.com:5432" % (i % 10),
+    }
+    return [intrinsics, {"user.id": i}, agent_attributes]
+
+
+def _payload(spans):
+    events = [_span_event(i) for i in range(spans)]
+    return ("1234567", {"reservoir_size": spans, "events_seen": spans}, events)
+
+
+def _encode_then_compress(payload):
+    data = json_encode(payload).encode("utf-8")
+    if len(data) > COMPRESSION_THRESHOLD:
+        data, _ = HttpClient._compress(data)
+    return data
+
+
+def _encode_streaming(payload):
+    _, body, _, _ = HttpClient._compress_chunks(json_encode_chunks(payload), COMPRESSION_THRESHOLD)
+    return body
+
+
+ENCODERS = {
+    "string": _encode_then_compress,
+    "streaming": _encode_streaming,
+}
+
+
+class Suite(object):
+    params = ([1000, 10000], sorted(ENCODERS))
+    param_names = ["spans", "encoder"]
+
+    def setup(self, spans, encoder):
+        self.payload = _payload(spans)
+        self.encode = ENCODERS[encoder]
+
+    def time_encode(self, spans, encoder):
+        self.encode(self.payload)
+
+    def track_peak_memory(self, spans, encoder):
+        tracemalloc.start()
+        try:
+            self.encode(self.payload)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        return peak
+
+    track_peak_memory.unit = "bytes"
+
+
+if __name__ == "__main__":
+    suite = Suite()
+    print("%8s %10s %12s %16s %16s" % ("spans", "encoder", "seconds", "peak bytes", "compressed bytes"))
+    for spans in Suite.params[0]:
+        for encoder in Suite.params[1]:
+            suite.setup(spans, encoder)
+            start = time.time()
+            body = suite.encode(suite.payload)
+            elapsed = time.time() - start
+            peak = suite.track_peak_memory(spans, encoder)
+            print("%8d %10s %12.4f %16d %16d" % (spans, encoder, elapsed, peak, len(body)))
@@ -0,0 +1,108 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Time taken to obfuscate, normalize and uncomment large SQL statements,
+such as bulk inserts and long IN lists, from 1KB up to 1MB in size.
+
+Runs under airspeed velocity, or standalone to print a table:
+
+    python tests/agent_benchmarks/bench_sql_obfuscation.py
+
+"""
+
+import time
+
+from newrelic.core.database_utils import (
+    _normalize_sql,
+    _obfuscate_sql,
+    _uncomment_sql,
+)
+
+
+class DummyDatabase(object):
+    def __init__(self, quoting_style):
+        self.quoting_style = quoting_style
+
+
+def _bulk_insert(size):
+    row = "(%d, 'user_%d', \"%d@example.com\", 0x%X, TRUE, NULL, 3.25e2) /* row %d */"
+    rows = []
+    length = 0
+    while length < size:
+        i = len(rows)
+        rows.append(row % (i, i, i, i, i))
+        length += len(rows[-1]) + 2
+    return "INSERT INTO users (id, name, email, flags, active, deleted, score) VALUES " + ",\n".join(rows)
+
+
+def _in_list(size):
+    values = []
+    length = 0
+    while length < size:
+        values.append("'%08d-aaaa-bbbb-cccc-dddddddddddd'" % len(values))
+        length += len(values[-1]) + 2
+    return "SELECT * FROM sessions -- lookup\nWHERE id IN (" + ", ".join(values) + ")"
+
+
+STATEMENTS = {
+    "insert": _bulk_insert,
+    "in_list": _in_list,
+}
+
+
+class Suite(object):
+    params = ([1024, 16 * 1024, 256 * 1024, 1024 * 1024], sorted(STATEMENTS), ["single", "single+double"])
+    param_names = ["size", "statement", "quoting_style"]
+
+    def setup(self, size, statement, quoting_style):
+        self.sql = STATEMENTS[statement](size)
+        self.database = DummyDatabase(quoting_style)
+        self.obfuscated = _obfuscate_sql(self.sql, self.database)
+
+    def time_obfuscate(self, size, statement, quoting_style):
+        _obfuscate_sql(self.sql, self.database)
+
+    def time_normalize(self, size, statement, quoting_style):
+        _normalize_sql(self.obfuscated)
+
+    def time_uncomment(self, size, statement, quoting_style):
+        _uncomment_sql(self.sql)
+
+    def track_nanoseconds_per_char(self, size, statement, quoting_style):
+        start = time.time()
+        _uncomment_sql(_obfuscate_sql(self.sql, self.database))
+        return (time.time() - start) * 1e9 / len(self.sql)
+
+    track_nanoseconds_per_char.unit = "ns"
+
+
+if __name__ == "__main__":
+    suite = Suite()
+    print(
+        "%8s %8s %14s %12s %12s %12s %8s" % ("size", "sql", "quoting", "obfuscate", "normalize", "uncomment", "ns/char")
+    )
+    for size in Suite.params[0]:
+        for statement in Suite.params[1]:
+            for quoting_style in Suite.params[2]:
+                suite.setup(size, statement, quoting_style)
+                timings = []
+                for method in (suite.time_obfuscate, suite.time_normalize, suite.time_uncomment):
+                    start = time.time()
+                    method(size, statement, quoting_style)
+                    timings.append(time.time() - start)
+                rate = suite.track_nanoseconds_per_char(size, statement, quoting_style)
+                print(
+                    "%8d %8s %14s %12.6f %12.6f %12.6f %8.1f"
+                    % ((size, statement, quoting_style) + tuple(timings) + (rate,))
+                )
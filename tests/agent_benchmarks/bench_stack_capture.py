@@ -0,0 +1,69 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Time taken on the request thread to capture the stack trace for a slow
+SQL query at increasing stack depths, comparing formatting the stack
+trace when it is captured with capturing it to be formatted later.
+
+Runs under airspeed velocity, or standalone to print a table:
+
+    python tests/agent_benchmarks/bench_stack_capture.py
+
+"""
+
+import time
+
+from newrelic.core.stack_trace import current_stack, current_stack_trace
+
+CAPTURES = 1000
+
+CAPTURE = {
+    "eager": lambda: current_stack(skip=2),
+    "lazy": lambda: current_stack_trace(skip=2),
+}
+
+
+def _at_depth(depth, capture):
+    if depth:
+        return _at_depth(depth - 1, capture)
+
+    for _ in range(CAPTURES):
+        capture()
+
+
+class Suite(object):
+    params = ([10, 50, 200], sorted(CAPTURE))
+    param_names = ["depth", "capture"]
+
+    def setup(self, depth, capture):
+        self.capture = CAPTURE[capture]
+
+    def time_capture(self, depth, capture):
+        _at_depth(depth, self.capture)
+
+    def track_microseconds_per_capture(self, depth, capture):
+        start = time.time()
+        self.time_capture(depth, capture)
+        return (time.time() - start) * 1e6 / CAPTURES
+
+    track_microseconds_per_capture.unit = "us"
+
+
+if __name__ == "__main__":
+    suite = Suite()
+    print("%8s %10s %16s" % ("depth", "capture", "us/capture"))
+    for depth in Suite.params[0]:
+        for capture in Suite.params[1]:
+            suite.setup(depth, capture)
+            print("%8d %10s %16.2f" % (depth, capture, suite.track_microseconds_per_capture(depth, capture)))
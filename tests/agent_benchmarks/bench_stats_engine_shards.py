@@ -0,0 +1,103 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Merge throughput of transaction workareas into the stats engine, either
+under the single application stats lock or into per-thread shards which are
+combined at harvest time.
+
+Runs under airspeed velocity, or standalone to print a table:
+
+    python tests/agent_benchmarks/bench_stats_engine_shards.py
+
+"""
+
+import threading
+import time
+
+from newrelic.core.config import finalize_application_settings
+from newrelic.core.metric import TimeMetric
+from newrelic.core.stats_engine import StatsEngine, StatsEngineShard
+
+TRANSACTIONS_PER_THREAD = 200
+METRICS_PER_TRANSACTION = 50
+
+
+def _metrics():
+    return [
+        TimeMetric(
+            name="Function/module:function_%d" % i, scope="WebTransaction/Function/main", duration=0.1, exclusive=0.1
+        )
+        for i in range(METRICS_PER_TRANSACTION)
+    ]
+
+
+class Suite(object):
+    params = ([1, 2, 4, 8, 16], [0, 8])
+    param_names = ["threads", "shards"]
+
+    def setup(self, threads, shards):
+        self.metrics = _metrics()
+        self.stats_engine = StatsEngine()
+        self.stats_engine.reset_stats(finalize_application_settings())
+        self.stats_lock = threading.RLock()
+
+        if shards:
+            self.shards = [StatsEngineShard(self.stats_engine.create_workarea()) for _ in range(shards)]
+        else:
+            self.shards = []
+
+    def _record(self, index):
+        shard = self.shards[index % len(self.shards)] if self.shards else None
+
+        for _ in range(TRANSACTIONS_PER_THREAD):
+            stats = self.stats_engine.create_workarea()
+            stats.record_time_metrics(self.metrics)
+
+            if shard is not None:
+                with shard.lock:
+                    shard.stats_engine.merge(stats)
+            else:
+                with self.stats_lock:
+                    self.stats_engine.merge(stats)
+
+    def _harvest(self):
+        with self.stats_lock:
+            for shard in self.shards:
+                stats, _, _ = shard.swap(self.stats_engine.create_workarea())
+                self.stats_engine.merge_shard(stats)
+
+    def time_merge(self, threads, shards):
+        workers = [threading.Thread(target=self._record, args=(i,)) for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self._harvest()
+
+    def track_merges_per_second(self, threads, shards):
+        start = time.time()
+        self.time_merge(threads, shards)
+        return threads * TRANSACTIONS_PER_THREAD / (time.time() - start)
+
+    track_merges_per_second.unit = "merges/s"
+
+
+if __name__ == "__main__":
+    suite = Suite()
+    print("%8s %8s %14s" % ("threads", "shards", "merges/s"))
+    for threads in Suite.params[0]:
+        for shards in Suite.params[1]:
+            suite.setup(threads, shards)
+            print("%8d %8d %14.0f" % (threads, shards, suite.track_merges_per_second(threads, shards)))
@@ -0,0 +1,103 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Time taken by the thread profiler to take a sample of the stacks of all
+threads as the number of threads grows, comparing formatting each stack
+trace before merging it into the call tree with merging the stack frames
+into the call tree directly. The threads stay blocked, as most threads of
+a busy process do between samples.
+
+Runs under airspeed velocity, or standalone to print a table:
+
+    python tests/agent_benchmarks/bench_thread_profiler.py
+
+"""
+
+import sys
+import threading
+import time
+
+from newrelic.core.profile_sessions import ProfileSession, format_stack_trace
+
+DEPTH = 30
+SAMPLES = 20
+
+
+def _blocked(depth, event):
+    if depth:
+        return _blocked(depth - 1, event)
+    event.wait()
+
+
+def _format_and_merge(session, frames):
+    for _, frame in frames:
+        session.update_call_tree("REQUEST", format_stack_trace(frame, "REQUEST"))
+
+
+def _merge_frames(session, frames):
+    for thread_id, frame in frames:
+        session.update_call_tree_from_frame("REQUEST", frame, thread_id=thread_id)
+    session.finish_sample()
+
+
+SAMPLERS = {
+    "format": _format_and_merge,
+    "frames": _merge_frames,
+}
+
+
+class Suite(object):
+    params = ([10, 100, 300], sorted(SAMPLERS))
+    param_names = ["threads", "sampler"]
+
+    def setup(self, threads, sampler):
+        self.event = threading.Event()
+        self.threads = [threading.Thread(target=_blocked, args=(DEPTH, self.event)) for _ in range(threads)]
+        for thread in self.threads:
+            thread.start()
+
+        # Wait for all threads to be blocked at full depth.
+
+        while sum(1 for frame in sys._current_frames().values() if frame.f_code.co_name == "wait") < threads:
+            time.sleep(0.01)
+
+        self.sampler = SAMPLERS[sampler]
+        self.session = ProfileSession(1, 0)
+
+    def teardown(self, threads, sampler):
+        self.event.set()
+        for thread in self.threads:
+            thread.join()
+
+    def time_sample(self, threads, sampler):
+        for _ in range(SAMPLES):
+            self.sampler(self.session, list(sys._current_frames().items()))
+
+    def track_milliseconds_per_sample(self, threads, sampler):
+        start = time.time()
+        self.time_sample(threads, sampler)
+        return (time.time() - start) * 1e3 / SAMPLES
+
+    track_milliseconds_per_sample.unit = "ms"
+
+
+if __name__ == "__main__":
+    suite = Suite()
+    print("%8s %10s %16s" % ("threads", "sampler", "ms/sample"))
+    for threads in Suite.params[0]:
+        for sampler in Suite.params[1]:
+            suite.setup(threads, sampler)
+            cost = suite.track_milliseconds_per_sample(threads, sampler)
+            suite.teardown(threads, sampler)
+            print("%8d %10s %16.3f" % (threads, sampler, cost))
@@ -0,0 +1,63 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from testing_support.fixtures import validate_attributes
+from testing_support.validators.validate_transaction_metrics import (
+    validate_transaction_metrics,
+)
+
+from newrelic.api.application import application_instance as application
+from newrelic.api.message_transaction import MessageBatchTransaction
+from newrelic.core.stats_engine import CustomMetrics
+
+MESSAGES = [("topic1", 10), ("topic2", 3), ("topic1", 25), ("topic1", 0)]
+
+
+@validate_transaction_metrics(
+    "Named/topic1",
+    group="Message/Kafka/Topic",
+    custom_metrics=[
+        ("Message/Kafka/Topic/Named/topic1/Received/Bytes", 3),
+        ("Message/Kafka/Topic/Named/topic1/Received/Messages", 3),
+        ("Message/Kafka/Topic/Named/topic2/Received/Bytes", 1),
+        ("Message/Kafka/Topic/Named/topic2/Received/Messages", 1),
+    ],
+    background_task=True,
+)
+@validate_attributes("agent", ["kafka.consume.byteCount"])
+def test_message_batch_transaction_metrics():
+    transaction = MessageBatchTransaction(
+        application=application(),
+        library="Kafka",
+        destination_type="Topic",
+        destination_name="topic1",
+        byte_count_attribute="kafka.consume.byteCount",
+    )
+
+    with transaction:
+        for destination_name, byte_count in MESSAGES:
+            transaction.add_message(destination_name, byte_count)
+
+    assert transaction.message_count == 4
+    assert transaction.byte_count == 38
+
+    # The metrics are the same as for recording each message on its own.
+
+    expected = CustomMetrics()
+    for destination_name, byte_count in MESSAGES:
+        name = "Message/Kafka/Topic/Named/%s/Received" % destination_name
+        expected.record_custom_metric("%s/Bytes" % name, byte_count)
+        expected.record_custom_metric("%s/Messages" % name, 1)
+
+    assert dict(transaction._custom_metrics.metrics()) == dict(expected.metrics())
@@ -32,7 +32,7 @@ from testing_support.validators.validate_ml_events_outside_transaction import (
 import newrelic.core.otlp_utils
 from newrelic.api.application import application_instance as application
 from newrelic.api.background_task import background_task
-from newrelic.api.transaction import record_ml_event
+from newrelic.api.transaction import current_transaction, record_ml_event
 from newrelic.core.config import global_settings
 from newrelic.packages import six
 
@@ -329,6 +329,48 @@ def test_record_ml_event_outside_transaction_params_not_a_dict():
     record_ml_event("ParamsListEvent", ["not", "a", "dict"], application=app)
 
 
+@pytest.mark.parametrize("sample_limit,expected", [(0, 10), (5, 5), (100, 10)])
+@override_application_settings({"event_harvest_config.harvest_limits.ml_event_data": 10})
+@reset_core_stats_engine()
+def test_record_ml_events_batch(sample_limit, expected):
+    created = []
+
+    def event_params(index):
+        created.append(index)
+        return {"index": index}
+
+    @validate_ml_event_count(count=expected)
+    @background_task()
+    def _test():
+        transaction = current_transaction()
+        transaction.record_ml_events("InferenceData", 1000, event_params, sample_limit=sample_limit)
+
+        # Events are only created for those kept in the reservoir, but all
+        # events in the batch are counted as seen.
+
+        assert transaction._ml_events.num_seen == 1000
+        assert transaction._ml_events.num_samples == expected
+        assert len(created) < 1000
+
+    _test()
+
+
+@override_application_settings({"event_harvest_config.harvest_limits.ml_event_data": 10})
+@reset_core_stats_engine()
+def test_record_ml_events_batch_bad_event_type():
+    @validate_ml_event_count(count=0)
+    @background_task()
+    def _test():
+        transaction = current_transaction()
+        transaction.record_ml_events("!@#$%^&*()", 100, lambda index: {"index": index})
+
+        # Events which could not be created are still counted as seen.
+
+        assert transaction._ml_events.num_seen == 100
+
+    _test()
+
+
 # Tests for ML Events configuration settings
 
 
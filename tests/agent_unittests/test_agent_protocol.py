@@ -14,11 +14,14 @@
 
 import logging
 import os
+import random
 import ssl
 import tempfile
+import zlib
 from collections import namedtuple
 
 import pytest
+from testing_support.fixtures import override_generic_settings
 
 from newrelic.common import certs, system_info
 from newrelic.common.agent_http import DeveloperModeClient
@@ -26,6 +29,7 @@ from newrelic.common.encoding_utils import json_decode, serverless_payload_decod
 from newrelic.common.utilization import CommonUtilization
 from newrelic.core.agent_protocol import AgentProtocol, ServerlessModeProtocol
 from newrelic.core.config import finalize_application_settings, global_settings
+from newrelic.core.data_collector import DeveloperModeSession
 from newrelic.core.internal_metrics import InternalTraceContext
 from newrelic.core.stats_engine import CustomMetrics
 from newrelic.network.exceptions import (
@@ -107,10 +111,35 @@ class HttpClientException(DeveloperModeClient):
         raise NetworkInterfaceException
 
 
+class PayloadSizeLimitClient(DeveloperModeClient):
+    MAX_PAYLOAD_SIZE = 2000
+    SENT = []
+
+    def send_request(
+        self,
+        method="POST",
+        path="/agent_listener/invoke_raw_method",
+        params=None,
+        headers=None,
+        payload=None,
+    ):
+        if params["method"] in ("span_event_data", "metric_data", "log_event_data"):
+            if len(zlib.compress(payload)) > self.MAX_PAYLOAD_SIZE:
+                return 413, b""
+            self.SENT.append((params["method"], json_decode(payload.decode("utf-8"))))
+
+        return super(PayloadSizeLimitClient, self).send_request(method, path, params, headers, payload)
+
+
+class PayloadSizeLimitSession(DeveloperModeSession):
+    CLIENT = PayloadSizeLimitClient
+
+
 @pytest.fixture(autouse=True)
 def clear_sent_values():
     yield
     HttpClientRecorder.SENT[:] = []
+    PayloadSizeLimitClient.SENT[:] = []
     HttpClientRecorder.STATUS_CODE = None
     HttpClientRecorder.STATE = 0
 
@@ -591,3 +620,40 @@ def test_max_payload_size_limit():
     protocol = AgentProtocol(settings, host="localhost")
     with pytest.raises(DiscardDataForRequest):
         protocol.send("metric_data")
+
+
+@override_generic_settings(global_settings(), {"max_payload_size_in_bytes": PayloadSizeLimitClient.MAX_PAYLOAD_SIZE})
+def test_oversized_payloads_split():
+    session = PayloadSizeLimitSession("app_name", [], [], global_settings())
+
+    spans = [
+        [{"type": "Span", "guid": "%016x" % i, "traceId": "%016x" % random.getrandbits(64)}, {}, {}] for i in range(200)
+    ]
+    session.send_span_events({"reservoir_size": 2000, "events_seen": 450}, spans)
+
+    sent = [payload for method, payload in PayloadSizeLimitClient.SENT if method == "span_event_data"]
+    assert len(sent) > 1
+    assert [span for payload in sent for span in payload[2]] == spans
+    assert sum(payload[1]["events_seen"] for payload in sent) == 450
+    assert sum(payload[1]["reservoir_size"] for payload in sent) == 2000
+
+    metrics = [
+        [{"name": "Metric/%s" % "%016x" % random.getrandbits(64), "scope": ""}, [1, 2, 3, 4, 5, 6]] for i in range(200)
+    ]
+    session.send_metric_data(1.0, 2.0, metrics)
+
+    sent = [payload for method, payload in PayloadSizeLimitClient.SENT if method == "metric_data"]
+    assert len(sent) > 1
+    assert all(payload[1:3] == [1.0, 2.0] for payload in sent)
+    assert [metric for payload in sent for metric in payload[3]] == metrics
+
+
+@override_generic_settings(global_settings(), {"max_payload_size_in_bytes": PayloadSizeLimitClient.MAX_PAYLOAD_SIZE})
+def test_oversized_single_item_discarded():
+    session = PayloadSizeLimitSession("app_name", [], [], global_settings())
+
+    spans = [[{"type": "Span", "guid": "%08000x" % random.getrandbits(32000)}, {}, {}]]
+    with pytest.raises(DiscardDataForRequest):
+        session.send_span_events({"reservoir_size": 2000, "events_seen": 1}, spans)
+
+    assert not PayloadSizeLimitClient.SENT
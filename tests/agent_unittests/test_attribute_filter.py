@@ -0,0 +1,110 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+
+import pytest
+
+from newrelic.core.attribute_filter import (
+    DST_ALL,
+    DST_NONE,
+    DST_SPAN_EVENTS,
+    DST_TRANSACTION_EVENTS,
+    AttributeFilter,
+)
+
+RULE_SETTINGS = (
+    "attributes.include",
+    "attributes.exclude",
+    "transaction_events.attributes.include",
+    "transaction_events.attributes.exclude",
+    "transaction_tracer.attributes.include",
+    "transaction_tracer.attributes.exclude",
+    "error_collector.attributes.include",
+    "error_collector.attributes.exclude",
+    "browser_monitoring.attributes.include",
+    "browser_monitoring.attributes.exclude",
+    "span_events.attributes.include",
+    "span_events.attributes.exclude",
+)
+
+
+def _settings(**rules):
+    settings = {
+        "attributes.enabled": True,
+        "transaction_events.attributes.enabled": True,
+        "transaction_tracer.attributes.enabled": True,
+        "error_collector.attributes.enabled": True,
+        "browser_monitoring.attributes.enabled": False,
+        "span_events.attributes.enabled": True,
+        "transaction_segments.attributes.enabled": True,
+    }
+    settings.update(rules)
+    return settings
+
+
+def _apply_rules(attribute_filter, name, default_destinations):
+    # Applies each rule in turn, as was done before the rules were
+    # compiled into a trie.
+
+    destinations = attribute_filter.enabled_destinations & default_destinations
+
+    for rule in attribute_filter.rules:
+        if rule.name_match(name):
+            if rule.is_include:
+                destinations |= rule.destinations & attribute_filter.enabled_destinations
+            else:
+                destinations &= ~rule.destinations
+
+    return destinations
+
+
+def _random_name(rng):
+    return "".join(rng.choice("ab.") for _ in range(rng.randint(0, 4)))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_attribute_filter_matches_rules(seed):
+    rng = random.Random(seed)
+
+    settings = {}
+    for setting in RULE_SETTINGS:
+        settings[setting] = [_random_name(rng) + rng.choice(("", "*")) for _ in range(rng.randint(0, 3))]
+
+    attribute_filter = AttributeFilter(_settings(**settings))
+
+    for _ in range(500):
+        name = _random_name(rng)
+        default_destinations = rng.randint(DST_NONE, DST_ALL)
+
+        expected = _apply_rules(attribute_filter, name, default_destinations)
+        assert attribute_filter.apply(name, default_destinations) == expected, (name, attribute_filter)
+
+
+def test_attribute_filter_cache_bounded():
+    settings = _settings(
+        **{"attributes.exclude": ["request.parameters.*"], "agent_limits.attribute_filter_cache_size": 10}
+    )
+    attribute_filter = AttributeFilter(settings)
+
+    for i in range(25):
+        name = "request.parameters.param_%d" % i
+        assert attribute_filter.apply(name, DST_ALL) == DST_NONE
+
+    assert attribute_filter.apply("user.id", DST_SPAN_EVENTS) == DST_SPAN_EVENTS
+    assert attribute_filter.apply("user.id", DST_TRANSACTION_EVENTS) == DST_TRANSACTION_EVENTS
+
+    assert len(attribute_filter.cache) == 10
+    assert attribute_filter.stats() == (26, 16)
+    assert attribute_filter.stats() == (0, 0)
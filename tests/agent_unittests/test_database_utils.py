@@ -0,0 +1,180 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+import re
+
+import pytest
+
+from newrelic.core.database_utils import (
+    _any_quotes_cleanup_re,
+    _any_quotes_p,
+    _normalize_sql,
+    _obfuscate_sql,
+    _single_dollar_cleanup_re,
+    _single_dollar_p,
+    _single_oracle_p,
+    _single_quotes_cleanup_re,
+    _single_quotes_p,
+    _uncomment_sql,
+)
+
+# The regular expressions which were used to obfuscate and uncomment SQL
+# before quoted strings and literals were replaced in a single scan.
+
+_reference_uncomment_sql_re = re.compile(r"((?:#|--).*?(?=\r|\n|$))|(\/\*(?:[^\/]|\/[^*])*?(?:\*\/|\/\*.*))", re.DOTALL)
+
+_reference_uuid_p = r"\{?(?:[0-9a-f]\-?){32}\}?"
+_reference_int_p = r"(?<!:)-?\b(?:[0-9]+\.)?[0-9]+(e[+-]?[0-9]+)?"
+_reference_hex_p = r"0x[0-9a-f]+"
+_reference_bool_p = r"\b(?:true|false|null)\b"
+
+_reference_literals_re = re.compile(
+    "(" + ")|(".join([_reference_uuid_p, _reference_hex_p, _reference_int_p, _reference_bool_p]) + ")",
+    re.IGNORECASE,
+)
+
+_reference_quotes_table = {
+    "single": (re.compile(_single_quotes_p), _single_quotes_cleanup_re),
+    "single+double": (re.compile(_any_quotes_p), _any_quotes_cleanup_re),
+    "single+dollar": (re.compile(_single_dollar_p), _single_dollar_cleanup_re),
+    "single+oracle": (re.compile(_single_oracle_p), _single_quotes_cleanup_re),
+}
+
+
+def reference_obfuscate_sql(sql, quoting_style):
+    quotes_re, quotes_cleanup_re = _reference_quotes_table.get(quoting_style, _reference_quotes_table["single"])
+
+    sql = quotes_re.sub("?", sql)
+    sql = _reference_literals_re.sub("?", sql)
+
+    if quotes_cleanup_re.search(sql):
+        sql = "?"
+
+    return sql
+
+
+def reference_uncomment_sql(sql):
+    return _reference_uncomment_sql_re.sub("", sql)
+
+
+FRAGMENTS = [
+    "SELECT",
+    "select",
+    "INSERT INTO",
+    "UPDATE",
+    "DELETE FROM",
+    "VALUES",
+    "WHERE",
+    "IN",
+    "users",
+    "table_1",
+    "a1b2",
+    "x",
+    "e5",
+    "*",
+    ",",
+    ";",
+    "(",
+    ")",
+    "=",
+    ".",
+    ":",
+    ":1",
+    ":name",
+    "%s",
+    "%(name)s",
+    "?",
+    "0",
+    "42",
+    "-7",
+    "3.14",
+    "1e10",
+    "2E-3",
+    "0x1F",
+    "0XAB",
+    "deadbeef",
+    "{12345678-1234-1234-1234-123456789abc}",
+    "123456781234123412341234567890AB",
+    "true",
+    "FALSE",
+    "Null",
+    "nullable",
+    "'string'",
+    "'it''s'",
+    "'escaped \\' quote'",
+    "'unterminated",
+    "''",
+    '"double"',
+    '"dou""ble"',
+    '"unterminated',
+    "$$dollar$$",
+    "$tag$quoted 'text'$tag$",
+    "$1",
+    "$",
+    "q'[oracle]'",
+    "q'{oracle}'",
+    "q'[unterminated",
+    "-- comment",
+    "# comment",
+    "/* comment */",
+    "/* unterminated",
+    "/* 'quoted' */",
+    "*/",
+    "-",
+    "/",
+    "#",
+    "\n",
+    "\r\n",
+    "\t",
+    "  ",
+    "café",
+]
+
+QUOTING_STYLES = ["single", "single+double", "single+dollar", "single+oracle", "unknown"]
+
+
+class DummyDatabase(object):
+    def __init__(self, quoting_style):
+        self.quoting_style = quoting_style
+
+
+def random_sql(rng):
+    parts = []
+    for _ in range(rng.randint(1, 25)):
+        parts.append(rng.choice(FRAGMENTS))
+        parts.append(rng.choice(("", " ", " ", "\n")))
+    return "".join(parts)
+
+
+@pytest.mark.parametrize("quoting_style", QUOTING_STYLES)
+def test_obfuscate_sql_equivalence(quoting_style):
+    rng = random.Random(quoting_style)
+    database = DummyDatabase(quoting_style)
+
+    for _ in range(3000):
+        sql = random_sql(rng)
+        expected = reference_uncomment_sql(reference_obfuscate_sql(sql, quoting_style))
+        obfuscated = _uncomment_sql(_obfuscate_sql(sql, database))
+
+        assert obfuscated == expected, sql
+        assert _normalize_sql(obfuscated) == _normalize_sql(expected), sql
+
+
+def test_uncomment_sql_equivalence():
+    rng = random.Random(0)
+
+    for _ in range(3000):
+        sql = random_sql(rng)
+        assert _uncomment_sql(sql) == reference_uncomment_sql(sql), sql
@@ -12,9 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import array
+
 import pytest
 
-from newrelic.common.encoding_utils import camel_case, snake_case
+from newrelic.common.encoding_utils import camel_case, payload_size, snake_case
 
 
 @pytest.mark.parametrize("input_,expected,upper", [
@@ -50,3 +52,18 @@ def test_camel_case(input_, expected, upper):
 def test_snake_case(input_, expected):
     output = snake_case(input_)
     assert output == expected
+
+
+@pytest.mark.parametrize("input_,expected", [
+    (None, 0),
+    (b"", 0),
+    (b"\x00\xff" * 512, 1024),
+    (bytearray(b"abc"), 3),
+    (memoryview(b"abcd"), 4),
+    (array.array("i", [1, 2, 3]), 3 * array.array("i").itemsize),
+    (u"caf\u00e9", 5),
+    ({"key": "value"}, 16),
+])
+def test_payload_size(input_, expected):
+    output = payload_size(input_)
+    assert output == expected
@@ -0,0 +1,204 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+from testing_support.fixtures import override_generic_settings
+
+from newrelic.core import database_utils
+from newrelic.core.config import global_settings
+from newrelic.core.database_utils import (
+    SQLConnections,
+    SQLDatabase,
+    SQLStatement,
+    explain_plan,
+    explain_plan_cache,
+)
+
+settings = global_settings()
+
+
+class DummyCursor(object):
+    description = (("QUERY PLAN",),)
+
+    def __init__(self, module):
+        self.module = module
+
+    def execute(self, query, *args, **kwargs):
+        self.module.queries.append(query)
+        if self.module.error:
+            raise self.module.error
+
+    def fetchall(self):
+        return self.module.rows
+
+
+class DummyConnection(object):
+    def __init__(self, module):
+        self.module = module
+
+    def cursor(self, *args, **kwargs):
+        return DummyCursor(self.module)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class DummyDatabaseModule(object):
+    __name__ = "dummy_database"
+
+    _nr_database_product = "Postgres"
+    _nr_explain_query = "EXPLAIN"
+    _nr_explain_stmts = ("select",)
+
+    NotSupportedError = Exception
+
+    def __init__(self):
+        self.connects = 0
+        self.queries = []
+        self.rows = [("Seq Scan on users",)]
+        self.error = None
+
+    def connect(self, *args, **kwargs):
+        self.connects += 1
+        return DummyConnection(self)
+
+
+@pytest.fixture(autouse=True)
+def clear_explain_plan_cache():
+    explain_plan_cache.clear()
+    explain_plan_cache.stats()
+    yield
+    explain_plan_cache.clear()
+
+
+def _explain(module, sql, connect_params=(("dbname=test",), {}), sql_format="obfuscated"):
+    statement = SQLStatement(sql, SQLDatabase(module))
+    with SQLConnections() as connections:
+        return explain_plan(connections, statement, connect_params, None, None, None, sql_format)
+
+
+def test_explain_plan_cached_across_harvests():
+    module = DummyDatabaseModule()
+
+    first = _explain(module, "SELECT * FROM users WHERE id = 1")
+
+    # A statement which differs only in its literals normalizes to the
+    # same SQL, so its explain plan is taken from the cache without
+    # connecting to the database.
+
+    second = _explain(module, "SELECT * FROM users WHERE id = 2")
+
+    assert first == second == (["QUERY PLAN"], [("Seq Scan on users",)])
+    assert module.connects == 1
+    assert module.queries == ["EXPLAIN SELECT * FROM users WHERE id = 1"]
+    assert explain_plan_cache.stats() == (1, 1)
+
+
+def test_explain_plan_cache_keyed_on_connection():
+    module = DummyDatabaseModule()
+
+    _explain(module, "SELECT * FROM users", connect_params=(("dbname=first",), {}))
+    _explain(module, "SELECT * FROM users", connect_params=(("dbname=second",), {}))
+    _explain(module, "SELECT * FROM users", connect_params=((), {"options": ["unhashable"]}))
+    _explain(module, "SELECT * FROM users", connect_params=((), {"options": ["unhashable"]}))
+
+    assert module.connects == 3
+
+
+def test_explain_plan_cache_keyed_on_raw_sql():
+    module = DummyDatabaseModule()
+
+    _explain(module, "SELECT * FROM users WHERE id = 1", sql_format="raw")
+    _explain(module, "SELECT * FROM users WHERE id = 2", sql_format="raw")
+
+    assert module.connects == 2
+
+
+def test_explain_plan_cache_expires(monkeypatch):
+    module = DummyDatabaseModule()
+
+    now = [1000.0]
+    monkeypatch.setattr(database_utils.time, "time", lambda: now[0])
+
+    _explain(module, "SELECT * FROM users")
+    now[0] += settings.transaction_tracer.explain_plan_cache_ttl - 1
+    _explain(module, "SELECT * FROM users")
+    assert module.connects == 1
+
+    now[0] += 2
+    _explain(module, "SELECT * FROM users")
+    assert module.connects == 2
+
+
+@override_generic_settings(settings, {"agent_limits.sql_explain_plan_cache_size": 2})
+def test_explain_plan_cache_bounded():
+    module = DummyDatabaseModule()
+
+    for i in range(3):
+        _explain(module, "SELECT * FROM table_%d" % i)
+
+    assert len(explain_plan_cache) == 2
+
+    # The least recently used entry was evicted.
+
+    _explain(module, "SELECT * FROM table_2")
+    assert module.connects == 3
+    _explain(module, "SELECT * FROM table_0")
+    assert module.connects == 4
+
+
+@override_generic_settings(settings, {"agent_limits.sql_explain_plan_cache_size": 0})
+def test_explain_plan_cache_disabled():
+    module = DummyDatabaseModule()
+
+    _explain(module, "SELECT * FROM users")
+    _explain(module, "SELECT * FROM users")
+
+    assert module.connects == 2
+    assert not len(explain_plan_cache)
+    assert explain_plan_cache.stats() == (0, 0)
+
+
+def test_explain_plan_cache_keyed_on_connect_digest():
+    module = DummyDatabaseModule()
+
+    _explain(module, "SELECT * FROM users", connect_params=((), {"user": "admin", "password": "secret"}))
+
+    for key in explain_plan_cache._entries:
+        assert "secret" not in repr(key)
+
+
+def test_explain_plan_error_not_cached():
+    module = DummyDatabaseModule()
+    module.error = RuntimeError("connection lost")
+
+    assert _explain(module, "SELECT * FROM users") is None
+
+    module.error = None
+
+    assert _explain(module, "SELECT * FROM users") == (["QUERY PLAN"], [("Seq Scan on users",)])
+    assert module.connects == 2
+
+
+def test_explain_plan_empty_result_cached(monkeypatch):
+    module = DummyDatabaseModule()
+    module.rows = []
+    monkeypatch.setattr(DummyCursor, "description", None)
+
+    assert _explain(module, "SELECT * FROM users") is None
+    assert _explain(module, "SELECT * FROM users") is None
+    assert module.connects == 1
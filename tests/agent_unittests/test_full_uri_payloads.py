@@ -24,11 +24,12 @@ from newrelic.core.config import global_settings
 
 
 class FullUriClient(HttpClient):
-    def send_request(
-        self, method="POST", path="/agent_listener/invoke_raw_method", *args, **kwargs
-    ):
+    # Both send_request and send_json_request pass the path on to
+    # _send_body, so the full URI is formed there.
+
+    def _send_body(self, method, path, *args, **kwargs):
         path = "https://" + self._host + path
-        return super(FullUriClient, self).send_request(method, path, *args, **kwargs)
+        return super(FullUriClient, self)._send_body(method, path, *args, **kwargs)
 
 
 _default_settings = {
@@ -99,3 +100,19 @@ def test_full_uri_connect():
         global_settings(),
         client_cls=FullUriClient,
     )
+
+
+@pytest.mark.parametrize("send", ("send_request", "send_json_request"))
+def test_full_uri_client_path(monkeypatch, send):
+    paths = []
+
+    def _send_body(self, method, path, *args, **kwargs):
+        paths.append(path)
+        return 200, b""
+
+    monkeypatch.setattr(HttpClient, "_send_body", _send_body)
+
+    client = FullUriClient("collector.newrelic.com")
+    getattr(client, send)(path="/agent_listener/invoke_raw_method")
+
+    assert paths == ["https://collector.newrelic.com/agent_listener/invoke_raw_method"]
@@ -14,6 +14,7 @@
 
 import random
 import tempfile
+import threading
 import time
 
 import pytest
@@ -25,16 +26,26 @@ from testing_support.fixtures import (
 
 from newrelic.common.agent_http import DeveloperModeClient
 from newrelic.common.object_wrapper import function_wrapper, transient_function_wrapper
+from newrelic.core.adaptive_sampler import AdaptiveSampler
 from newrelic.core.application import Application
 from newrelic.core.config import finalize_application_settings, global_settings
 from newrelic.core.custom_event import create_custom_event
 from newrelic.core.error_node import ErrorNode
 from newrelic.core.function_node import FunctionNode
 from newrelic.core.log_event_node import LogEventNode
+from newrelic.core.metric import ApdexMetric, TimeMetric
+from newrelic.core.node_mixin import SpanEventReference
 from newrelic.core.root_node import RootNode
-from newrelic.core.stats_engine import CustomMetrics, SampledDataSet, DimensionalMetrics
+from newrelic.core.stats_engine import (
+    CountStatsSlot,
+    CustomMetrics,
+    DimensionalMetrics,
+    SampledDataSet,
+    StatsEngine,
+)
 from newrelic.core.transaction_node import TransactionNode
-from newrelic.network.exceptions import RetryDataForRequest
+from newrelic.core.transaction_recorder import TransactionRecorder
+from newrelic.network.exceptions import PayloadTooLarge, RetryDataForRequest
 
 settings = global_settings()
 
@@ -380,6 +391,42 @@ def test_application_harvest_with_spans(distributed_tracing_enabled, span_events
     _test()
 
 
+@override_generic_settings(
+    settings,
+    {
+        "developer_mode": True,
+        "distributed_tracing.enabled": True,
+        "span_events.enabled": True,
+        "event_harvest_config.harvest_limits.span_event_data": 5,
+    },
+)
+def test_span_events_rendered_at_harvest(transaction_node):
+    sent_span_events = []
+
+    @transient_function_wrapper("newrelic.core.data_collector", "Session.send_span_events")
+    def capture_span_events(wrapped, instance, args, kwargs):
+        sent_span_events.extend(args[1])
+        return wrapped(*args, **kwargs)
+
+    app = Application("Python Agent Test (Harvest Loop)")
+    app.connect_to_data_collector(None)
+    app.record_transaction(transaction_node)
+
+    # Only references to the trace nodes are held in the reservoir, none
+    # of which have had their attributes built yet.
+    references = list(app._stats_engine.span_events)
+    assert len(references) == 5
+    assert all(isinstance(reference, SpanEventReference) for reference in references)
+    assert all(reference._event is None for reference in references)
+
+    capture_span_events(app.harvest)()
+
+    assert len(sent_span_events) == 5
+    for intrinsics, user_attributes, agent_attributes in sent_span_events:
+        assert intrinsics["type"] == "Span"
+        assert intrinsics["transactionId"] == transaction_node.guid
+
+
 @pytest.mark.parametrize(
     "span_queue_size, spans_to_send, expected_seen, expected_sent",
     (
@@ -449,6 +496,127 @@ def test_failed_spans_harvest(span_events_enabled):
     _test()
 
 
+CONCURRENT_ENDPOINTS = (
+    "analytic_event_data",
+    "custom_event_data",
+    "error_data",
+    "error_event_data",
+    "log_event_data",
+    "span_event_data",
+)
+
+
+def overlapping_endpoints(endpoints_called, wait_for_overlap):
+    # Records the most sends of harvest payloads in flight at once.
+    # When waiting for an overlap, each send waits until some send has
+    # been made while another was still in flight, so sends made
+    # concurrently are seen to overlap however loaded the machine is.
+
+    condition = threading.Condition()
+    in_flight = [0]
+    peak = [0]
+
+    @transient_function_wrapper("newrelic.core.agent_protocol", "AgentProtocol.send")
+    def send_request_wrapper(wrapped, instance, args, kwargs):
+        def _bind_params(method, *args, **kwargs):
+            return method
+
+        method = _bind_params(*args, **kwargs)
+
+        if method not in CONCURRENT_ENDPOINTS:
+            endpoints_called.append(method)
+            return wrapped(*args, **kwargs)
+
+        with condition:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+            condition.notify_all()
+
+            if wait_for_overlap:
+                deadline = time.time() + 10.0
+                while peak[0] < 2 and time.time() < deadline:
+                    condition.wait(deadline - time.time())
+
+        try:
+            endpoints_called.append(method)
+            return wrapped(*args, **kwargs)
+        finally:
+            with condition:
+                in_flight[0] -= 1
+
+    send_request_wrapper.peak = peak
+    return send_request_wrapper
+
+
+@pytest.mark.parametrize("send_concurrency", (1, 4))
+def test_concurrent_harvest(transaction_node, send_concurrency):
+    endpoints_called = []
+    sent_metrics = []
+
+    overlapping = overlapping_endpoints(endpoints_called, wait_for_overlap=send_concurrency > 1)
+
+    @override_generic_settings(
+        settings,
+        {
+            "developer_mode": True,
+            "license_key": "**NOT A LICENSE KEY**",
+            "feature_flag": set(),
+            "agent_limits.data_collector_send_concurrency": send_concurrency,
+        },
+    )
+    @validate_metric_payload(
+        metrics=[("Supportability/Python/Collector/analytic_event_data/Output/Bytes", 1)],
+        endpoints_called=sent_metrics,
+    )
+    @overlapping
+    def _test():
+        app = Application("Python Agent Test (Harvest Loop)")
+        app.connect_to_data_collector(None)
+
+        app.record_transaction(transaction_node)
+        app.harvest()
+
+    _test()
+
+    # Events, errors and traces are all sent before the metric data, and
+    # are only sent while another is in flight when sent concurrently.
+    sent = endpoints_called[endpoints_called.index("metric_data") - 6 : endpoints_called.index("metric_data")]
+    assert sorted(sent) == list(CONCURRENT_ENDPOINTS)
+
+    if send_concurrency == 1:
+        assert overlapping.peak[0] == 1
+    else:
+        assert overlapping.peak[0] > 1
+
+
+@failing_endpoint("error_event_data")
+@override_generic_settings(
+    settings,
+    {
+        "developer_mode": True,
+        "license_key": "**NOT A LICENSE KEY**",
+        "feature_flag": set(),
+        "agent_limits.data_collector_send_concurrency": 4,
+    },
+)
+@function_not_called("newrelic.core.data_collector", "Session.send_metric_data")
+def test_concurrent_harvest_rollback(transaction_node):
+    app = Application("Python Agent Test (Harvest Loop)")
+    app.connect_to_data_collector(None)
+
+    app.record_transaction(transaction_node)
+
+    app.harvest()
+
+    # Only the data for the payload which failed to be sent is kept for
+    # the next harvest, along with the metrics which were never sent.
+    assert app._stats_engine.error_events.num_samples
+    assert not app._stats_engine.transaction_events.num_samples
+    assert not app._stats_engine.custom_events.num_samples
+    assert not app._stats_engine.span_events.num_samples
+    assert app._stats_engine.stats_table
+
+
 @override_generic_settings(
     settings,
     {
@@ -483,6 +651,112 @@ def test_transaction_count(transaction_node):
     assert app._transaction_count == 0
 
 
+@override_generic_settings(
+    settings,
+    {
+        "developer_mode": True,
+        "license_key": "**NOT A LICENSE KEY**",
+        "feature_flag": set(),
+        "collect_custom_events": False,
+        "application_logging.forwarding.enabled": False,
+        "transaction_recorder.enabled": True,
+    },
+)
+@validate_metric_payload(
+    metrics=[
+        ("Supportability/Python/TransactionRecorder/Seen", 2),
+        ("Supportability/Python/TransactionRecorder/Dropped", 0),
+    ],
+    endpoints_called=[],
+)
+def test_transaction_recorder(transaction_node):
+    app = Application("Python Agent Test (Harvest Loop)")
+    app.connect_to_data_collector(None)
+
+    assert app._transaction_recorder.active
+
+    app.record_transaction(transaction_node)
+    app.record_transaction(transaction_node)
+    assert app._transaction_recorder.flush(timeout=10.0)
+
+    # Transactions were recorded from the recorder thread
+    assert app._transaction_count == 2
+
+    app.harvest()
+
+    assert app._transaction_count == 0
+
+
+@override_generic_settings(
+    settings,
+    {
+        "developer_mode": True,
+        "license_key": "**NOT A LICENSE KEY**",
+        "feature_flag": set(),
+        "collect_custom_events": False,
+        "application_logging.forwarding.enabled": False,
+        "agent_limits.stats_engine_shards": 4,
+    },
+)
+@validate_metric_payload(
+    metrics=[
+        ("OtherTransaction/all", 8),
+    ],
+    endpoints_called=[],
+)
+def test_stats_engine_shards(transaction_node):
+    app = Application("Python Agent Test (Harvest Loop)")
+    app.connect_to_data_collector(None)
+
+    assert len(app._stats_shards) == 4
+
+    threads = [threading.Thread(target=app.record_transaction, args=(transaction_node,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Transactions are only combined into the main stats engine on harvest
+    assert app._transaction_count == 0
+    assert sum(shard.transaction_count for shard in app._stats_shards) == 8
+
+    app.harvest()
+
+    assert app._transaction_count == 0
+    assert sum(shard.transaction_count for shard in app._stats_shards) == 0
+
+
+@pytest.mark.parametrize("overflow_policy", ("drop", "block"))
+def test_transaction_recorder_overflow_policy(overflow_policy):
+    recorded = []
+    recorder = TransactionRecorder("Python Agent Test (Harvest Loop)", recorded.append, 1, overflow_policy)
+
+    # The recorder thread is not running, so the queue will not drain.
+    assert recorder.put(1)
+
+    if overflow_policy == "drop":
+        assert not recorder.put(2)
+        assert recorder.stats() == (2, 1)
+    else:
+        # Start the recorder thread so the blocked caller is released.
+        recorder.start()
+        assert recorder.put(2)
+        assert recorder.stats() == (2, 0)
+
+    recorder.start()
+    assert recorder.flush(timeout=10.0)
+    recorder.shutdown()
+
+    if overflow_policy == "drop":
+        assert recorded == [1]
+    else:
+        assert recorded == [1, 2]
+
+    # Nothing is accepted after shutdown.
+    assert not recorder.put(3)
+    assert recorder.stats() == (0, 0)
+
+
 @override_generic_settings(
     settings,
     {
@@ -680,6 +954,71 @@ def test_compute_sampled_no_reset():
     assert app.compute_sampled() is True
 
 
+def test_adaptive_sampler_concurrent_decisions(monkeypatch):
+    # fix random.randrange to return 0
+    monkeypatch.setattr(random, "randrange", lambda *args, **kwargs: 0)
+
+    sampler = AdaptiveSampler(10, 60.0)
+    results = []
+
+    def compute_sampled():
+        results.extend(sampler.compute_sampled() for _ in range(1000))
+
+    threads = [threading.Thread(target=compute_sampled) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == sampler.sampled_count == 10
+    assert sampler.computed_count == 8000
+
+    sampler.last_reset = time.time() - sampler.period
+    assert sampler.compute_sampled() is True
+    assert sampler.computed_count_last == 8000
+    assert sampler.computed_count == 1
+    assert sampler.max_sampled == 20
+
+
+def test_adaptive_sampler_computed_count_read(monkeypatch):
+    ranges = []
+
+    def randrange(stop):
+        ranges.append(stop)
+        return stop
+
+    monkeypatch.setattr(random, "randrange", randrange)
+
+    sampler = AdaptiveSampler(0, 60.0)
+    sampler.computed_count = 5
+
+    # Reading the count doesn't change the count seen by later decisions.
+
+    assert sampler.computed_count == 5
+    assert sampler.computed_count == 5
+    assert sampler.compute_sampled() is False
+    assert sampler.compute_sampled() is False
+    assert sampler.computed_count == 7
+
+    # The count used by a decision includes the transaction being decided.
+
+    sampler.max_sampled = 1
+    sampler.compute_sampled()
+    assert ranges == [8]
+
+
+def test_adaptive_sampler_decision_after_counter_restart():
+    # A decision made without the lock just after the transaction count
+    # has been restarted still has a transaction to draw from.
+
+    sampler = AdaptiveSampler(1, 60.0)
+    sampler.max_sampled = 2
+    sampler.sampled_count = 1
+    sampler.computed_count = 0
+
+    assert sampler.compute_sampled() in (True, False)
+
+
 def test_analytic_event_sampling_info():
     synthetics_limit = 10
     transactions_limit = 20
@@ -962,6 +1301,134 @@ def test_flexible_harvest_rollback():
     assert app._stats_engine.stats_table[stats_key].call_count == 1
 
 
+@failing_endpoint("metric_data")
+@override_generic_settings(
+    settings,
+    {
+        "developer_mode": True,
+        "agent_limits.metric_name_table_size": 1,
+    },
+)
+def test_metric_name_table_reset_rollback():
+    app = Application("Python Agent Test (Harvest Loop)")
+    app.connect_to_data_collector(None)
+
+    app._stats_engine.record_custom_metric("Custom/test_metric_name_table_reset_rollback/1", 1)
+    app._stats_engine.record_custom_metric("Custom/test_metric_name_table_reset_rollback/2", 2)
+    metric_ids = app._stats_engine.metric_ids
+
+    app.harvest()
+
+    # The metric name table grew beyond its limit and was replaced, but
+    # metrics rolled back from the failed harvest are merged by name.
+    assert app._stats_engine.metric_ids is not metric_ids
+
+    app._stats_engine.record_custom_metric("Custom/test_metric_name_table_reset_rollback/1", 1)
+
+    metrics = dict((key["name"], stats) for key, stats in app._stats_engine.metric_data())
+    assert metrics["Custom/test_metric_name_table_reset_rollback/1"].call_count == 2
+    assert metrics["Custom/test_metric_name_table_reset_rollback/2"].call_count == 1
+
+
+@failing_endpoint("metric_data", call_number=2)
+@override_generic_settings(settings, {"developer_mode": True})
+def test_split_payload_chunk_failure_not_rolled_back():
+    sent_metrics = []
+
+    @transient_function_wrapper("newrelic.core.agent_protocol", "AgentProtocol.send")
+    def send_request_wrapper(wrapped, instance, args, kwargs):
+        def _bind_params(method, payload=(), *args, **kwargs):
+            return method, payload
+
+        method, payload = _bind_params(*args, **kwargs)
+
+        if method == "metric_data" and len(payload[3]) > 150:
+            raise PayloadTooLarge()
+
+        result = wrapped(*args, **kwargs)
+
+        if method == "metric_data":
+            sent_metrics.extend(metric["name"] for metric, _ in payload[3])
+
+        return result
+
+    @send_request_wrapper
+    def _test():
+        app = Application("Python Agent Test (Harvest Loop)")
+        app.connect_to_data_collector(None)
+
+        for i in range(200):
+            app._stats_engine.record_custom_metric("Custom/test_split_payload_chunk_failure/%d" % i, i)
+
+        # The metric data is too large to send and is split into two chunks.
+        # The first chunk is sent, but sending the second fails with an
+        # error which would otherwise have the data rolled back.
+
+        app.harvest()
+        app.harvest()
+
+        custom_metrics = [name for name in sent_metrics if name.startswith("Custom/")]
+        assert 0 < len(custom_metrics) < 200
+        assert len(custom_metrics) == len(set(custom_metrics))
+
+    _test()
+
+
+@pytest.mark.parametrize("existing,merged", ((0, 5), (5, 5), (10, 50), (60, 50)))
+def test_sampled_data_set_merge(existing, merged):
+    priorities = list(range(existing + merged))
+    random.shuffle(priorities)
+
+    events = SampledDataSet(capacity=10)
+    for priority in priorities[:existing]:
+        events.add(priority, priority)
+
+    other = SampledDataSet(capacity=100)
+    for priority in priorities[existing:]:
+        other.add(priority, priority)
+    other.num_seen += 3
+
+    events.merge(other)
+
+    expected = sorted(priorities, reverse=True)[:10]
+    assert sorted(events, reverse=True) == expected
+    assert events.num_seen == existing + merged + 3
+    assert events.heap == (len(expected) == 10)
+
+    # The reservoir must still behave as a heap for subsequent adds.
+    events.add("late", 1000)
+    assert "late" in list(events)
+    assert events.num_samples == min(len(expected) + 1, 10)
+
+
+def test_metric_stats_array_table():
+    def record(metric_stats_table):
+        app_settings = finalize_application_settings({"metric_stats_table": metric_stats_table})
+        stats = StatsEngine()
+        stats.reset_stats(app_settings)
+
+        for duration in (0.5, 0.1, 0.3):
+            workarea = stats.create_workarea()
+            workarea.record_time_metric(TimeMetric("Function/a", "WebTransaction/Function/t", duration, duration / 2))
+            workarea.record_time_metric(TimeMetric("Function/a", "", duration, None))
+            workarea.record_apdex_metric(ApdexMetric("Apdex/t", 1, 0, 0, duration))
+            workarea.record_custom_metric("Custom/count", {"count": 2})
+            workarea.record_custom_metric("Custom/value", duration)
+            stats.merge(workarea)
+
+        return stats
+
+    expected = sorted((key["name"], key["scope"], stats) for key, stats in record("list").metric_data())
+
+    stats = record("array")
+    assert isinstance(stats.stats_table[("Custom/count", "")], CountStatsSlot)
+    assert stats.stats_table[("Function/a", "")].call_count == 3
+
+    metric_data = sorted((key["name"], key["scope"], stats) for key, stats in stats.metric_data())
+    assert metric_data == expected
+    assert all(type(value) is type(other) for (_, _, value), (_, _, other) in zip(metric_data, expected))
+
+
 @override_generic_settings(
     settings,
     {
@@ -0,0 +1,237 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import time
+
+import pytest
+from testing_support.fixtures import override_generic_settings
+
+from newrelic.common.object_wrapper import transient_function_wrapper
+from newrelic.core import harvest_spool as harvest_spool_module
+from newrelic.core.application import Application
+from newrelic.core.config import global_settings
+from newrelic.core.harvest_spool import HarvestSpool, harvest_spool
+from newrelic.core.internal_metrics import InternalTraceContext
+from newrelic.core.stats_engine import CustomMetrics
+from newrelic.network.exceptions import RetryDataForRequest
+
+settings = global_settings()
+
+
+@pytest.fixture
+def spool_directory():
+    directory = tempfile.mkdtemp()
+    yield directory
+
+    for key in list(harvest_spool_module._spools):
+        if key[0] == directory:
+            spool = harvest_spool_module._spools.pop(key)
+            if spool is not None:
+                spool.close()
+
+    shutil.rmtree(directory)
+
+
+def open_spool(directory, max_size=64 * 1024, max_age=3600.0):
+    path = os.path.join(directory, "test.spool")
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    return HarvestSpool(fd, path, max_size, max_age)
+
+
+def drain(spool):
+    payloads = []
+    record = spool.peek()
+    while record is not None:
+        token, method, run_id, payload = record
+        payloads.append((method, run_id, payload))
+        spool.pop(token)
+        record = spool.peek()
+    return payloads
+
+
+def test_spool_payloads_kept_in_order(spool_directory):
+    spool = open_spool(spool_directory)
+    spool.append("metric_data", "RUN1", ("RUN1", 1.0, 2.0, []))
+    spool.append("analytic_event_data", "RUN1", ("RUN1", {"events_seen": 1}, [{"a": 1}]))
+    spool.close()
+
+    # A payload is only removed once it has been popped, and what is in
+    # the spool survives it being closed and opened again.
+
+    spool = open_spool(spool_directory)
+    token, method, run_id, payload = spool.peek()
+    assert method == "metric_data"
+    assert spool.peek()[0] == token
+
+    assert drain(spool) == [
+        ("metric_data", "RUN1", ["RUN1", 1.0, 2.0, []]),
+        ("analytic_event_data", "RUN1", ["RUN1", {"events_seen": 1}, [{"a": 1}]]),
+    ]
+    assert spool.size == 0
+    spool.close()
+
+
+def test_spool_pop_after_payload_dropped(spool_directory):
+    spool = open_spool(spool_directory, max_size=1024)
+    spool.append("error_data", "RUN1", ("RUN1", [1]))
+
+    token = spool.peek()[0]
+
+    # The payload being sent is pushed out of the spool by newer payloads,
+    # so the pop must not remove the payload which is now the oldest.
+
+    for i in range(100):
+        spool.append("error_data", "RUN1", ("RUN1", ["error %d" % i]))
+
+    oldest = spool.peek()
+    spool.pop(token)
+    assert spool.peek() == oldest
+    spool.close()
+
+
+def test_spool_bounded_by_size(spool_directory):
+    metrics = CustomMetrics()
+    spool = open_spool(spool_directory, max_size=4096)
+
+    with InternalTraceContext(metrics):
+        for i in range(1000):
+            assert spool.append("span_event_data", "RUN1", ("RUN1", {}, [{"i": i, "name": "Function/%d" % i}]))
+
+        # A payload larger than the spool itself is never kept.
+        assert not spool.append("span_event_data", "RUN1", ("RUN1", {}, [os.urandom(8192).decode("latin-1")]))
+
+    assert spool.size <= 4096
+
+    # The oldest payloads were dropped to make room for newer payloads.
+
+    payloads = drain(spool)
+    assert len(payloads) < 1000
+    assert [payload[2][2][0]["i"] for payload in payloads] == list(range(1000 - len(payloads), 1000))
+
+    metrics = dict(metrics.metrics())
+    assert metrics["Supportability/Python/HarvestSpool/Spooled/span_event_data"][0] == 1000
+    assert metrics["Supportability/Python/HarvestSpool/Dropped/Size"][0] == 1000 - len(payloads) + 1
+    spool.close()
+
+
+def test_spool_bounded_by_age(spool_directory, monkeypatch):
+    metrics = CustomMetrics()
+    spool = open_spool(spool_directory, max_age=60.0)
+
+    now = time.time()
+
+    with InternalTraceContext(metrics):
+        monkeypatch.setattr(harvest_spool_module.time, "time", lambda: now - 120.0)
+        spool.append("error_data", "RUN1", ("RUN1", ["old"]))
+        monkeypatch.setattr(harvest_spool_module.time, "time", lambda: now)
+        spool.append("error_data", "RUN1", ("RUN1", ["new"]))
+
+        assert drain(spool) == [("error_data", "RUN1", ["RUN1", ["new"]])]
+
+    assert dict(metrics.metrics())["Supportability/Python/HarvestSpool/Dropped/Age"][0] == 1
+    spool.close()
+
+
+@pytest.mark.skipif(harvest_spool_module.fcntl is None, reason="Spool files are only locked where fcntl is available.")
+def test_spool_file_per_process(spool_directory):
+    first_fd, first_path = harvest_spool_module._open_spool_file(spool_directory, "Python Agent Test")
+    second_fd, second_path = harvest_spool_module._open_spool_file(spool_directory, "Python Agent Test")
+
+    # The first spool file is still locked, so the next one is used.
+
+    assert first_path != second_path
+    os.close(first_fd)
+
+    third_fd, third_path = harvest_spool_module._open_spool_file(spool_directory, "Python Agent Test")
+    assert third_path == first_path
+
+    os.close(second_fd)
+    os.close(third_fd)
+
+
+def test_spool_disabled(spool_directory):
+    @override_generic_settings(settings, {"harvest_spool.enabled": False, "harvest_spool.directory": spool_directory})
+    def _test():
+        assert harvest_spool("Python Agent Test", settings) is None
+
+    _test()
+
+
+def test_harvest_spooled_and_replayed(spool_directory):
+    endpoints_called = []
+    failing = [False]
+
+    @transient_function_wrapper("newrelic.core.agent_protocol", "AgentProtocol.send")
+    def send_request_wrapper(wrapped, instance, args, kwargs):
+        def _bind_params(method, payload=(), *args, **kwargs):
+            return method, payload
+
+        method, payload = _bind_params(*args, **kwargs)
+
+        if failing[0]:
+            raise RetryDataForRequest()
+
+        endpoints_called.append((method, payload))
+
+        return wrapped(*args, **kwargs)
+
+    @override_generic_settings(
+        settings,
+        {
+            "developer_mode": True,
+            "license_key": "**NOT A LICENSE KEY**",
+            "feature_flag": set(),
+            "harvest_spool.enabled": True,
+            "harvest_spool.directory": spool_directory,
+        },
+    )
+    @send_request_wrapper
+    def _test():
+        app = Application("Python Agent Test (Harvest Spool)")
+        app.connect_to_data_collector(None)
+        failing[0] = True
+        del endpoints_called[:]
+
+        app._stats_engine.transaction_events.add({"name": "spooled"})
+        app._stats_engine.record_custom_metric("Custom/spooled", 1)
+        app.harvest()
+
+        # The data which couldn't be sent went to the spool, rather than
+        # being rolled back into the next harvest.
+
+        assert not app._stats_engine.transaction_events.num_samples
+        assert ("Custom/spooled", "") not in app._stats_engine.stats_table
+
+        spool = app._active_session._spool
+        assert spool.size
+
+        # Once the data collector can be reached, what was spooled is sent
+        # after the first payload of the next harvest, oldest first.
+
+        failing[0] = False
+        app.harvest()
+
+        assert not spool.size
+
+        methods = [method for method, _ in endpoints_called]
+        assert methods[:3] == ["metric_data", "analytic_event_data", "metric_data"]
+
+        replayed_metrics = dict((metric["name"], stats) for metric, stats in endpoints_called[2][1][3])
+        assert replayed_metrics["Custom/spooled"][0] == 1
+        assert endpoints_called[2][1][0] == app._active_session.agent_run_id
+
+    _test()
@@ -32,7 +32,7 @@ from newrelic.common.agent_http import (
     InsecureHttpClient,
     ServerlessModeClient,
 )
-from newrelic.common.encoding_utils import ensure_str
+from newrelic.common.encoding_utils import ensure_str, json_encode
 from newrelic.common.object_names import callable_name
 from newrelic.core.internal_metrics import InternalTraceContext
 from newrelic.core.stats_engine import CustomMetrics
@@ -357,6 +357,50 @@ def test_http_payload_compression(server, client_cls, method, threshold):
     assert sent_payload == payload
 
 
+@pytest.mark.parametrize(
+    "method,threshold",
+    (
+        ("gzip", 0),
+        ("deflate", 1000),
+        ("gzip", 10 * 1000 * 1000),
+    ),
+)
+def test_http_json_payload_compression(server, method, threshold):
+    events = [[{"type": "Span", "guid": "%016x" % i, "name": "Function/span_%d" % i}, {}, {}] for i in range(2000)]
+    payload = ("run_id", {"reservoir_size": 2000, "events_seen": 2000}, events)
+    expected = json_encode(payload).encode("utf-8")
+
+    internal_metrics = CustomMetrics()
+
+    with ApplicationModeClient(
+        "localhost",
+        server.port,
+        disable_certificate_validation=True,
+        compression_method=method,
+        compression_threshold=threshold,
+    ) as client:
+        with InternalTraceContext(internal_metrics):
+            status, data = client.send_json_request(payload=payload, params={"method": "span_event_data"})
+
+    assert status == 200
+
+    headers = dict(
+        line.split(b": ", 1) for line in data.split(b"\n") if line.startswith((b"content-length", b"content-encoding"))
+    )
+    sent_payload = data[-int(headers[b"content-length"]) :]
+
+    if threshold < len(expected):
+        assert headers[b"content-encoding"] == method.encode("utf-8")
+        sent_payload = zlib.decompressobj(31 if method == "gzip" else 15).decompress(sent_payload)
+    else:
+        assert headers[b"content-encoding"] == b"Identity"
+
+    assert sent_payload == expected
+
+    internal_metrics = dict(internal_metrics.metrics())
+    assert internal_metrics["Supportability/Python/Collector/span_event_data/Output/Bytes"][:2] == [1, len(expected)]
+
+
 def test_cert_path(server):
     with HttpClient("localhost", server.port, ca_bundle_path=SERVER_CERT) as client:
         status, data = client.send_request()
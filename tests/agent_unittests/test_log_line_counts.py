@@ -0,0 +1,78 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+
+from newrelic.core.log_line_counts import LogLineCounts
+
+
+def test_log_line_counts_by_level():
+    counts = LogLineCounts()
+
+    for level_name in ("INFO", "INFO", "ERROR"):
+        counts.count("app", level_name)
+    counts.count("other app", "INFO")
+
+    assert sorted(counts.harvest("app")) == [
+        ("Logging/lines", 3),
+        ("Logging/lines/ERROR", 1),
+        ("Logging/lines/INFO", 2),
+    ]
+
+    # Only what was logged since the last harvest is reported.
+
+    assert counts.harvest("app") == []
+
+    counts.count("app", "INFO")
+    assert sorted(counts.harvest("app")) == [("Logging/lines", 1), ("Logging/lines/INFO", 1)]
+
+    assert sorted(counts.harvest("other app")) == [("Logging/lines", 1), ("Logging/lines/INFO", 1)]
+
+
+def test_log_line_counts_from_threads():
+    counts = LogLineCounts()
+    harvested = []
+    done = threading.Event()
+
+    def _harvest():
+        while not done.is_set():
+            harvested.extend(counts.harvest("app"))
+
+    def _log():
+        for _ in range(10000):
+            counts.count("app", "INFO")
+
+    harvester = threading.Thread(target=_harvest)
+    harvester.start()
+
+    threads = [threading.Thread(target=_log) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    done.set()
+    harvester.join()
+
+    harvested.extend(counts.harvest("app"))
+
+    # No line is lost or counted twice when harvesting while threads
+    # are logging, including the lines of threads which have exited.
+
+    assert sum(count for name, count in harvested if name == "Logging/lines") == 40000
+
+    # The counts for threads which have exited are discarded once all
+    # of their lines have been reported.
+
+    assert len(counts._threads) == 0
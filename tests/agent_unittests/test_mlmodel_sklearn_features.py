@@ -0,0 +1,89 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from newrelic.hooks.mlmodel_sklearn import _numeric_feature_columns
+
+np = pytest.importorskip("numpy")
+
+
+# How the numeric feature columns were chosen before being chosen by the
+# type of the array or of each column.
+
+
+def isnumeric(column):
+    try:
+        column.astype(np.float64)
+        return [True] * len(column)
+    except Exception:
+        pass
+    return [False] * len(column)
+
+
+def reference_numeric_feature_columns(prediction_input):
+    x = np.array(prediction_input)
+    mask = np.apply_along_axis(isnumeric, 0, x)[0]
+    return mask, x[:, mask].astype(np.float64)
+
+
+def assert_same_as_reference(prediction_input):
+    expected_mask, expected_features = reference_numeric_feature_columns(prediction_input)
+    mask, features = _numeric_feature_columns(prediction_input)
+
+    assert mask.tolist() == expected_mask.tolist()
+    if features is None:
+        assert not expected_mask.any()
+    else:
+        assert features.dtype == np.float64
+        assert features.tolist() == expected_features.tolist()
+
+
+@pytest.mark.parametrize(
+    "prediction_input",
+    (
+        [[1, 2], [3, 4]],
+        [[1.5, 2], [3, 4.25]],
+        [[True, False], [False, True]],
+        np.arange(12, dtype=np.int32).reshape(4, 3),
+    ),
+)
+def test_numeric_feature_columns(prediction_input):
+    assert_same_as_reference(prediction_input)
+
+
+@pytest.mark.parametrize(
+    "prediction_input",
+    (
+        np.array([[1, "a", 2.5], [3, "b", 4.5]], dtype=object),
+        np.array([["1", "a"], ["2", "b"]]),
+        np.array([["a", "b"], ["c", "d"]]),
+    ),
+)
+def test_mixed_feature_columns(prediction_input):
+    assert_same_as_reference(prediction_input)
+
+
+def test_dataframe_feature_columns():
+    pd = pytest.importorskip("pandas")
+
+    frames = (
+        pd.DataFrame({"a": [1, 2], "b": [2.5, 3.5]}),
+        pd.DataFrame({"a": [1, 2], "b": ["x", "y"], "c": [True, False]}),
+        pd.DataFrame({"a": ["x", "y"], "b": ["1", "2"]}),
+        pd.DataFrame({"a": [27.0, 24.0], "b": [23.0, 25.0]}, dtype="category"),
+    )
+
+    for frame in frames:
+        assert_same_as_reference(frame)
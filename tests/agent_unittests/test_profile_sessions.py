@@ -0,0 +1,235 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import base64
+import random
+import sys
+import threading
+import time
+import zlib
+
+import pytest
+from testing_support.fixtures import override_generic_settings
+
+from newrelic.common.encoding_utils import json_decode
+from newrelic.common.object_wrapper import FunctionWrapper
+from newrelic.core.config import global_settings
+from newrelic.core.profile_sessions import (
+    ProfileSession,
+    ProfileSessionManager,
+    SessionState,
+    format_stack_trace,
+)
+
+settings = global_settings()
+
+
+class CallTree(object):
+    # Call tree as built for each sample before nodes were held in lists,
+    # to compare against.
+
+    def __init__(self, method_data, depth):
+        self.method_data = method_data
+        self.call_count = 0
+        self.children = {}
+        self.depth = depth
+        self.ignore = False
+
+    def flatten(self):
+        filename, func_name, func_line, exec_line = self.method_data
+
+        if func_line == exec_line:
+            method_data = [filename, "@%s#%s" % (func_name, func_line), exec_line]
+        else:
+            method_data = [filename, "%s#%s" % (func_name, func_line), exec_line]
+
+        return [method_data, self.call_count, 0, [x.flatten() for x in self.children.values() if not x.ignore]]
+
+
+def _expected_call_tree(samples, limit):
+    buckets = {"REQUEST": {}, "AGENT": {}, "BACKGROUND": {}, "OTHER": {}}
+    nodes = []
+
+    for category, stack_trace in samples:
+        bucket = buckets[category]
+        for depth, method in enumerate(stack_trace, 1):
+            call_tree = bucket.get(method)
+            if call_tree is None:
+                call_tree = bucket[method] = CallTree(method, depth)
+                nodes.append(call_tree)
+            call_tree.call_count += 1
+            bucket = call_tree.children
+
+    nodes.sort(key=lambda x: (x.call_count, -x.depth), reverse=True)
+    for node in nodes[limit:]:
+        node.ignore = True
+
+    flat_tree = dict(
+        (category, [x.flatten() for x in bucket.values()]) for category, bucket in buckets.items() if bucket
+    )
+    thread_count = sum(len(bucket) for bucket in buckets.values())
+
+    return flat_tree, thread_count
+
+
+def _call_tree(session):
+    session.state = SessionState.FINISHED
+    profile = session.profile_data()[0]
+    flat_tree = json_decode(zlib.decompress(base64.standard_b64decode(profile[4])).decode("utf-8"))
+    return flat_tree, profile[5]
+
+
+@pytest.mark.parametrize("limit", (5, 50, 20000))
+def test_call_tree_matches_stack_traces(limit):
+    rng = random.Random(limit)
+    methods = [("file_%d.py" % (i % 3), "function_%d" % i, i, i + rng.choice((0, 1))) for i in range(8)]
+
+    samples = []
+    for _ in range(200):
+        category = rng.choice(("REQUEST", "BACKGROUND", "OTHER"))
+        samples.append((category, tuple(rng.choice(methods[:4]) for _ in range(rng.randint(1, 6)))))
+
+    session = ProfileSession(1, 0)
+    for category, stack_trace in samples:
+        session.update_call_tree(category, stack_trace)
+
+    @override_generic_settings(settings, {"agent_limits.thread_profiler_nodes": limit})
+    def _test():
+        assert _call_tree(session) == _expected_call_tree(samples, limit)
+
+    _test()
+
+
+def _sample_frames(depth, session, expected, category):
+    if depth:
+        return _sample_frames(depth - 1, session, expected, category)
+
+    _merge_frame(session, expected, category, sys._getframe())
+
+
+def _merge_frame(session, expected, category, frame, thread_id=None):
+    session.update_call_tree_from_frame(category, frame, thread_id=thread_id)
+    session.finish_sample()
+    expected.update_call_tree(category, format_stack_trace(frame, category))
+
+
+@pytest.mark.parametrize("category", ("REQUEST", "AGENT"))
+def test_call_tree_from_frames(category):
+    session = ProfileSession(1, 0)
+    expected = ProfileSession(1, 0)
+
+    # Calls made through a wrapper include stack frames for the agent,
+    # which are only kept for threads belonging to the agent.
+
+    wrapper = FunctionWrapper(_sample_frames, lambda wrapped, instance, args, kwargs: wrapped(*args, **kwargs))
+
+    for depth in (3, 3, 5):
+        wrapper(depth, session, expected, category)
+
+    assert _call_tree(session) == _call_tree(expected)
+
+
+def _blocked(depth, event):
+    if depth:
+        return _blocked(depth - 1, event)
+    event.wait()
+
+
+def test_call_tree_for_blocked_thread():
+    session = ProfileSession(1, 0)
+    expected = ProfileSession(1, 0)
+
+    event = threading.Event()
+    thread = threading.Thread(target=_blocked, args=(5, event))
+    thread.start()
+
+    try:
+        while sys._current_frames()[thread.ident].f_code.co_name != "wait":
+            time.sleep(0.01)
+
+        # The stack of a thread which hasn't moved on since the last
+        # sample is only walked for the first sample.
+
+        for _ in range(3):
+            _merge_frame(session, expected, "OTHER", sys._current_frames()[thread.ident], thread.ident)
+            assert thread.ident in session._thread_leaves
+
+    finally:
+        event.set()
+        thread.join()
+
+    assert _call_tree(session) == _call_tree(expected)
+
+
+def _resumed_generator(session, expected):
+    while True:
+        _merge_frame(session, expected, "REQUEST", sys._getframe(), 1)
+        yield
+
+
+def _first_caller(generator):
+    next(generator)
+
+
+def _second_caller(generator):
+    next(generator)
+
+
+def test_call_tree_for_resumed_generator():
+    session = ProfileSession(1, 0)
+    expected = ProfileSession(1, 0)
+
+    # The frame for a generator is the same each time it is resumed, but
+    # what it is called from can change.
+
+    generator = _resumed_generator(session, expected)
+    _first_caller(generator)
+    _second_caller(generator)
+
+    assert _call_tree(session) == _call_tree(expected)
+
+
+@override_generic_settings(settings, {"thread_profiler.cpu_budget": 0.01})
+def test_sample_period_within_cpu_budget():
+    manager = ProfileSessionManager()
+    manager.sample_period_s = 0.1
+
+    # Cheap samples are taken at the period asked for.
+
+    assert manager.next_sample_period(0.0001) == 0.1
+
+    # Where taking samples uses more than the budget, the time between
+    # samples is stretched out to keep within the budget.
+
+    manager = ProfileSessionManager()
+    manager.sample_period_s = 0.1
+
+    period = manager.next_sample_period(0.01)
+    assert period == pytest.approx(0.99)
+
+    for _ in range(50):
+        period = manager.next_sample_period(0.002)
+    assert period == pytest.approx(0.198, rel=0.01)
+
+
+def test_sample_period_without_cpu_budget():
+    # There is no CPU budget unless one is set, so the period asked for is
+    # always used.
+
+    assert settings.thread_profiler.cpu_budget == 0.0
+
+    manager = ProfileSessionManager()
+    manager.sample_period_s = 0.1
+
+    assert manager.next_sample_period(1.0) == 0.1
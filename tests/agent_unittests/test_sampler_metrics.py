@@ -19,6 +19,7 @@ import platform
 import pytest
 from testing_support.fixtures import override_generic_settings
 
+from newrelic.common.object_names import callable_name
 from newrelic.core.config import global_settings
 from newrelic.packages import six
 from newrelic.samplers.cpu_usage import cpu_usage_data_source
@@ -120,6 +121,40 @@ def test_gc_metrics_collection(gc_data_source, top_object_count_limit):
     _test()
 
 
+class CensusObject(object):
+    pass
+
+
+@pytest.mark.skipif(
+    platform.python_implementation() == "PyPy",
+    reason="GC Metrics are always disabled on PyPy",
+)
+@pytest.mark.parametrize("top_object_sample_limit", (0, 10000))
+def test_gc_metrics_top_object_sampling(gc_data_source, top_object_sample_limit):
+    heap = [CensusObject() for _ in range(200000)]
+
+    @override_generic_settings(
+        settings,
+        {
+            "gc_runtime_metrics.enabled": True,
+            "gc_runtime_metrics.top_object_count_limit": 1,
+            "gc_runtime_metrics.top_object_sample_limit": top_object_sample_limit,
+        },
+    )
+    def _test():
+        metrics_table = dict(gc_data_source() or ())
+
+        metric = "GC/objects/%d/type/%s" % (PID, callable_name(CensusObject))
+        count = metrics_table[metric]["count"]
+
+        if top_object_sample_limit:
+            assert abs(count - len(heap)) < len(heap) * 0.1, count
+        else:
+            assert count == len(heap)
+
+    _test()
+
+
 @pytest.mark.skipif(
     platform.python_implementation() == "PyPy",
     reason="GC Metrics are always disabled on PyPy",
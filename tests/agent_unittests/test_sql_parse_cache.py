@@ -0,0 +1,110 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+from testing_support.fixtures import override_generic_settings
+
+from newrelic.core.config import global_settings
+from newrelic.core.database_utils import SQLStatement, sql_parse_cache
+
+SQL = "SELECT * FROM users WHERE name = 'bob' AND id = 1"
+
+
+class DummyDatabase(object):
+    def __init__(self, product="Postgres", quoting_style="single"):
+        self.product = product
+        self.quoting_style = quoting_style
+
+
+@pytest.fixture(autouse=True)
+def clear_sql_parse_cache():
+    sql_parse_cache.clear()
+    sql_parse_cache.stats()
+    yield
+    sql_parse_cache.clear()
+
+
+def test_sql_parse_results_shared():
+    database = DummyDatabase()
+
+    first = SQLStatement(SQL, database)
+    assert first.obfuscated == "SELECT * FROM users WHERE name = ? AND id = ?"
+    assert first.operation == "select"
+    assert first.target == "users"
+
+    second = SQLStatement(SQL, database)
+    assert second.parsed is first.parsed
+    assert second.obfuscated is first.obfuscated
+    assert second.normalized is first.normalized
+
+    assert sql_parse_cache.stats() == (1, 1)
+    assert sql_parse_cache.stats() == (0, 0)
+
+
+def test_sql_parse_results_keyed_on_quoting_style():
+    sql = 'SELECT * FROM users WHERE name = "bob"'
+
+    single = SQLStatement(sql, DummyDatabase(quoting_style="single"))
+    double = SQLStatement(sql, DummyDatabase(quoting_style="single+double"))
+
+    assert single.parsed is not double.parsed
+    assert single.obfuscated == sql
+    assert double.obfuscated == "SELECT * FROM users WHERE name = ?"
+
+
+@override_generic_settings(global_settings(), {"agent_limits.sql_parse_cache_size": 2})
+def test_sql_parse_cache_bounded():
+    database = DummyDatabase()
+
+    statements = [SQLStatement("SELECT * FROM table_%d" % i, database) for i in range(3)]
+    for statement in statements:
+        statement.target
+
+    assert len(sql_parse_cache) == 2
+
+    # The least recently used entry was evicted.
+    assert SQLStatement("SELECT * FROM table_0", database).parsed is not statements[0].parsed
+    assert SQLStatement("SELECT * FROM table_2", database).parsed is statements[2].parsed
+
+
+@override_generic_settings(global_settings(), {"agent_limits.sql_parse_cache_size": 0})
+def test_sql_parse_cache_disabled():
+    database = DummyDatabase()
+
+    assert SQLStatement(SQL, database).obfuscated == SQLStatement(SQL, database).obfuscated
+    assert len(sql_parse_cache) == 0
+
+
+def test_sql_parse_cache_holds_no_literals():
+    database = DummyDatabase()
+
+    statement = SQLStatement(SQL, database)
+    assert statement.target == "users"
+    assert statement.obfuscated
+
+    assert len(sql_parse_cache) == 1
+    for key, result in sql_parse_cache._entries.items():
+        assert "bob" not in repr(key)
+        assert "bob" not in repr([getattr(result, name) for name in result.__slots__])
+
+
+@override_generic_settings(global_settings(), {"agent_limits.sql_query_length_maximum": len(SQL) - 1})
+def test_sql_parse_cache_skips_long_sql():
+    database = DummyDatabase()
+
+    first = SQLStatement(SQL, database)
+    assert first.obfuscated == "SELECT * FROM users WHERE name = ? AND id = ?"
+
+    assert SQLStatement(SQL, database).parsed is not first.parsed
+    assert len(sql_parse_cache) == 0
@@ -0,0 +1,41 @@
+# Copyright 2010 New Relic, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from newrelic.core.stack_trace import current_stack, current_stack_trace
+
+
+def _capture(depth, skip, limit):
+    if depth:
+        return _capture(depth - 1, skip, limit)
+
+    # Both stack traces are taken from the same line, so are expected to
+    # be the same.
+
+    return current_stack(skip, limit), current_stack_trace(skip, limit)
+
+
+@pytest.mark.parametrize("skip", (0, 2))
+@pytest.mark.parametrize("limit", (3, 1000))
+def test_current_stack_trace(skip, limit):
+    expected, stack_trace = _capture(5, skip, limit)
+
+    assert stack_trace._formatted is None
+    assert list(stack_trace) == expected
+    assert stack_trace.format() is stack_trace.format()
+
+
+def test_current_stack_trace_skip_beyond_stack():
+    assert list(current_stack_trace(skip=100000)) == ["Traceback (most recent call last):"]
@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import gc
+import sys
 import threading
 
 import pytest
@@ -127,3 +129,48 @@ def test_concurrent_iteration(iterate_trace_cache, change_weakref_dict_size):
     t2.join(timeout=1)
     assert not t1.is_alive(), "Thread failed to exit."
     assert not t2.is_alive(), "Thread failed to exit."
+
+
+def test_save_trace_does_not_inspect_thread_frames(trace_cache, monkeypatch):
+    """Saving a trace must not depend on the number of threads in the process."""
+
+    def _current_frames():
+        raise AssertionError("sys._current_frames() should not be called.")
+
+    monkeypatch.setattr(sys, "_current_frames", _current_frames)
+
+    trace = DummyTrace()
+    trace.thread_id = trace_cache.current_thread_id()
+    trace_cache.save_trace(trace)
+
+    assert not trace_cache.is_coroutine_id(trace.thread_id)
+    assert trace._greenlet is None
+    assert not hasattr(trace, "_task")
+
+
+def test_save_trace_in_task(trace_cache):
+    class FakeTask(object):
+        pass
+
+    class FakeAsyncio(object):
+        task = None
+
+        @classmethod
+        def current_task(cls):
+            return cls.task
+
+    trace_cache.asyncio = FakeAsyncio
+    FakeAsyncio.task = task = FakeTask()
+
+    trace = DummyTrace()
+    trace.thread_id = trace_cache.current_thread_id()
+    trace_cache.save_trace(trace)
+
+    assert trace.thread_id == id(task)
+    assert trace_cache.is_coroutine_id(trace.thread_id)
+    assert trace._task is task
+
+    # Once the task is gone its ID is no longer recorded as a coroutine.
+    FakeAsyncio.task = task = trace._task = None
+    gc.collect()
+    assert not trace_cache.is_coroutine_id(trace.thread_id)
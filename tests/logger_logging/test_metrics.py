@@ -13,6 +13,7 @@
 # limitations under the License.
 
 from newrelic.packages import six
+from newrelic.api.application import application_instance
 from newrelic.api.background_task import background_task
 from testing_support.fixtures import reset_core_stats_engine
 from testing_support.validators.validate_custom_metrics_outside_transaction import validate_custom_metrics_outside_transaction
@@ -56,4 +57,10 @@ def test_logging_metrics_outside_transaction(logger):
     def test():
         exercise_logging(logger)
 
+        # Lines logged outside of a transaction are only added to the
+        # custom metrics when the application is harvested.
+
+        api_application = application_instance()
+        api_application._agent.application(api_application.name).merge_log_line_counts()
+
     test()
@@ -58,6 +58,7 @@ from newrelic.core.attribute_filter import (
     AttributeFilter,
 )
 from newrelic.core.config import apply_config_setting, flatten_settings, global_settings
+from newrelic.core.log_line_counts import log_line_counts
 from newrelic.network.exceptions import RetryDataForRequest
 from newrelic.packages import six
 
@@ -1133,6 +1134,11 @@ def reset_core_stats_engine():
         custom_stats = core_application._stats_custom_engine
         custom_stats.reset_stats(custom_stats.settings)
 
+        # Discard the counts of log lines which are yet to be merged into
+        # the custom metrics.
+
+        log_line_counts.harvest(api_name)
+
         return wrapped(*args, **kwargs)
 
     return _reset_core_stats_engine
@@ -67,7 +67,9 @@ def validate_span_events(
                 raise
             else:
                 if not instance.settings.infinite_tracing.enabled:
-                    events = [event for priority, seen_at, event in instance.span_events.pq]
+                    # Span events are rendered lazily, so render them
+                    # while any settings overrides are still in place.
+                    events = [list(event) for priority, seen_at, event in instance.span_events.pq]
 
                 recorded_span_events.append(events)
 